@@ -0,0 +1,307 @@
+"""
+Measures every snowglobe command against a fake docker CLI: wall time, number of docker invocations and peak memory.
+
+Each command runs in a fresh python process, with its own config directory and fake container state, so the numbers
+include the cold start of the CLI. No image is local at the start of a command. Results can be written as json and
+compared against an earlier run.
+
+Usage: python benchmarks/commands.py [--repeat N] [--environments N] [--latency SUB_COMMAND=SECONDS ...]
+                                     [--output FILE] [--baseline FILE] [--threshold FRACTION]
+"""
+from collections import Counter
+from os import path
+import argparse
+import statistics
+import subprocess
+import tempfile
+import shutil
+import json
+import sys
+import os
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+sys.path.insert(1, ROOT)
+
+import fake_docker  # noqa: E402
+from snowglobe import config  # noqa: E402
+
+
+FAKE_DOCKER = path.abspath(fake_docker.__file__)
+
+# Runs snowglobe main in the benchmark process and writes its time and peak memory to the result file.
+DRIVER = '''
+import json, resource, sys, time
+started = time.perf_counter()
+argv, result_path = json.loads(sys.argv[1]), sys.argv[2]
+sys.argv = ['snowglobe'] + argv
+from snowglobe import __main__
+code = __main__.main()
+with open(result_path, 'w') as f:
+    json.dump({'exit_code': code, 'wall': time.perf_counter() - started,
+               'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}, f)
+'''
+
+# Benchmark name, snowglobe arguments and the state of the environment containers before the command.
+SCENARIOS = [
+    ('list', ['list'], None),
+    ('status', ['status'], 'running'),
+    ('template', ['template'], None),
+    ('inspect', ['inspect', 'bench-0'], None),
+    ('setup', ['setup', '{setup_file}'], None),
+    ('setup-build', ['setup', '{build_setup_file}'], None),
+    ('start', ['start', 'bench-0'], None),
+    ('start-existing', ['start', 'bench-0'], 'created'),
+    ('exec', ['exec', 'bench-0', 'shell'], 'running'),
+    ('exec-all', ['exec', '--all', 'shell'], 'running'),
+    ('stop', ['stop', 'bench-0'], 'running'),
+    ('reset', ['reset', 'bench-0'], 'running'),
+    ('reset-dry-run', ['--dry-run', 'reset', 'bench-0'], 'running'),
+    ('remove', ['remove', 'bench-0'], 'running'),
+    ('pull', ['pull', '--all'], None),
+    ('start-all', ['start', '--all'], None),
+    ('stop-all', ['stop', '--all'], 'running'),
+    ('reset-all', ['reset', '--all'], 'running'),
+    ('apply', ['apply'], None),
+    ('apply-unchanged', ['apply'], 'applied'),
+    ('export', ['export', '{export_directory}'], None),
+    ('import', ['import', '{import_directory}'], None),
+    ('snapshot', ['snapshot', 'bench-0', 'bench'], 'running'),
+    ('snapshots', ['snapshots'], 'snapshotted'),
+    ('snapshots-prune', ['snapshots', '--prune'], 'snapshotted'),
+    ('reset-snapshot', ['reset', 'bench-0', '--from-snapshot', '1'], 'snapshotted'),
+    ('pool', ['pool', 'bench-0'], 'running'),
+    ('pool-fill', ['pool', 'bench-0', '--size', '2'], 'running'),
+    ('top', ['top', '--count', '1'], 'running'),
+]
+
+# Snapshot tags of every environment in the snapshotted state, oldest first.
+SNAPSHOT_TAGS = ['1', '2']
+
+
+def environment_config(name: str) -> dict:
+    """
+    Builds the config of a benchmark environment.
+    :param name: Name of the environment.
+    :return: Config data.
+    """
+    return {
+        'image': 'alpine:latest',
+        'name': name,
+        'create': {'command': ['sleep', 'infinity'], 'envs': {'KEY': 'VALUE'}},
+        'start': '',
+        'execs': [{'name': 'shell', 'command': 'true', 'options': ''}],
+    }
+
+
+def fake_container(name: str, state: str) -> dict:
+    """
+    Builds a fake docker container in a given state.
+    :param name: Name of the container.
+    :param state: Either created, running, applied, i.e. running and labelled with the spec of its config, or
+    snapshotted, i.e. running with snapshots.
+    :return: Inspect dictionary.
+    """
+    container = fake_docker.new_container(name, 'alpine:latest')
+    if state == 'applied':
+        env = environment_config(name)
+        container['Config']['Labels'] = {config.MANAGED_LABEL: 'true',
+                                         config.SPEC_LABEL: config.spec_hash(env['image'], env['create'])}
+    if state in ('running', 'applied', 'snapshotted'):
+        container['State'].update(Status='running', Running=True, StartedAt='2020-01-01T00:00:00.000000000Z')
+    return container
+
+
+def fake_snapshots(names: list) -> dict:
+    """
+    Builds the fake snapshot images of environments, one for each of SNAPSHOT_TAGS.
+    :param names: Names of the environments.
+    :return: Images by name, as kept by the fake docker CLI.
+    """
+    return {
+        config.snapshot_image(name, tag): {'Labels': {config.SNAPSHOT_LABEL: name},
+                                           'CreatedAt': f'2020-01-0{day} 00:00:00 +0000 UTC', 'Size': '7.8MB'}
+        for name in names for day, tag in enumerate(SNAPSHOT_TAGS, 1)
+    }
+
+
+def write_configs(directory: str, names: list) -> None:
+    """
+    Writes the configs of benchmark environments.
+    :param directory: Path of the config directory.
+    :param names: Names of the environments.
+    :return: None.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in names:
+        with open(path.join(directory, f'{name}.json'), 'w') as f:
+            json.dump(environment_config(name), f)
+
+
+def run_scenario(work: str, args: list, state: str, environments: int, latency: dict) -> dict:
+    """
+    Runs a single snowglobe command from a fresh config directory and container state.
+    :param work: Working directory of the benchmark.
+    :param args: Snowglobe arguments.
+    :param state: State of every environment container, or None if they do not exist.
+    :param environments: Number of configured environments.
+    :param latency: Fake docker latency by sub command.
+    :return: Measurement.
+    """
+    names = [f'bench-{index}' for index in range(environments)]
+    config_directory = path.join(work, 'configs')
+    shutil.rmtree(config_directory, ignore_errors=True)
+    write_configs(config_directory, names)
+    with open(path.join(work, 'state.json'), 'w') as f:
+        json.dump({name: fake_container(name, state) for name in names} if state else {}, f)
+    with open(path.join(work, 'images.json'), 'w') as f:
+        json.dump(fake_snapshots(names) if state == 'snapshotted' else {}, f)
+    with open(path.join(work, 'docker.log'), 'w'):
+        pass
+
+    env = dict(
+        os.environ,
+        PATH=f'{path.join(work, "bin")}{os.pathsep}{os.environ.get("PATH", "")}',
+        SNOWGLOBE_CONFIG_DIR=config_directory,
+        SNOWGLOBE_SOCKET=path.join(work, 'no-daemon.sock'),
+        SNOWGLOBE_STORE='json',
+        FAKE_DOCKER_STATE=path.join(work, 'state.json'),
+        FAKE_DOCKER_LOG=path.join(work, 'docker.log'),
+        FAKE_DOCKER_IMAGES=path.join(work, 'images.json'),
+        FAKE_DOCKER_LATENCY=json.dumps(latency),
+    )
+    result_path = path.join(work, 'result.json')
+    subprocess.run([sys.executable, '-c', DRIVER, json.dumps(args), result_path], cwd=ROOT, env=env,
+                   stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True)
+
+    with open(result_path, 'r') as f:
+        result = json.load(f)
+    with open(path.join(work, 'docker.log'), 'r') as f:
+        calls = [json.loads(line) for line in f]
+    result['docker_calls'] = Counter(fake_docker.sub_command(call) for call in calls)
+    return result
+
+
+def run_benchmarks(repeat: int, environments: int, latency: dict) -> dict:
+    """
+    Runs every scenario.
+    :param repeat: Number of runs of each scenario. The median wall time is reported.
+    :param environments: Number of configured environments.
+    :param latency: Fake docker latency by sub command.
+    :return: Results by scenario name.
+    """
+    work = tempfile.mkdtemp(prefix='snowglobe-bench-')
+    try:
+        os.mkdir(path.join(work, 'bin'))
+        docker = path.join(work, 'bin', 'docker')
+        with open(docker, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_DOCKER}" "$@"\n')
+        os.chmod(docker, 0o755)
+        setup_file = path.join(work, 'setup.json')
+        with open(setup_file, 'w') as f:
+            json.dump(environment_config('bench-new'), f)
+        build_context = path.join(work, 'build')
+        os.mkdir(build_context)
+        for index in range(100):
+            with open(path.join(build_context, f'file-{index}.txt'), 'w') as f:
+                f.write(f'{index}\n' * 1000)
+        with open(path.join(build_context, 'Dockerfile'), 'w') as f:
+            f.write('FROM alpine:latest\nCOPY . /app\n')
+        build_setup_file = path.join(work, 'setup-build.json')
+        with open(build_setup_file, 'w') as f:
+            json.dump(dict(environment_config('bench-build'), build={'context': build_context}), f)
+        import_directory = path.join(work, 'import')
+        write_configs(import_directory, [f'bench-import-{index}' for index in range(environments)])
+        paths = {'setup_file': setup_file, 'build_setup_file': build_setup_file, 'import_directory': import_directory,
+                 'export_directory': path.join(work, 'export')}
+
+        results = {}
+        for name, args, state in SCENARIOS:
+            args = [arg.format(**paths) for arg in args]
+            runs = [run_scenario(work, args, state, environments, latency) for _ in range(repeat)]
+            results[name] = {
+                'args': args,
+                'exit_code': runs[-1]['exit_code'],
+                'wall_ms': round(statistics.median(run['wall'] for run in runs) * 1000, 2),
+                'docker_calls': sum(runs[-1]['docker_calls'].values()),
+                'docker_calls_by_command': dict(sorted(runs[-1]['docker_calls'].items())),
+                'peak_rss_kb': max(run['peak_rss_kb'] for run in runs),
+            }
+        return results
+    finally:
+        shutil.rmtree(work)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compares results against a baseline run.
+    :param results: Results by scenario name.
+    :param baseline: Baseline results by scenario name.
+    :param threshold: Allowed relative increase of wall time and peak memory.
+    :return: List of regression descriptions.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result['wall_ms'] > base['wall_ms'] * (1 + threshold):
+            regressions.append(f'{name}: wall time {base["wall_ms"]}ms -> {result["wall_ms"]}ms')
+        if result['docker_calls'] > base['docker_calls']:
+            regressions.append(f'{name}: docker calls {base["docker_calls"]} -> {result["docker_calls"]}')
+        if result['peak_rss_kb'] > base['peak_rss_kb'] * (1 + threshold):
+            regressions.append(f'{name}: peak rss {base["peak_rss_kb"]}kB -> {result["peak_rss_kb"]}kB')
+    return regressions
+
+
+def parse_latency(values: list) -> dict:
+    """
+    Parses latency arguments.
+    :param values: Arguments of the form SUB_COMMAND=SECONDS.
+    :return: Latency in seconds by sub command.
+    """
+    latency = {'default': 0.02}
+    for value in values:
+        command, _, seconds = value.partition('=')
+        latency[command] = float(seconds)
+    return latency
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks snowglobe commands against a fake docker CLI.')
+    parser.add_argument('--repeat', help='Runs of each command.', type=int, default=5)
+    parser.add_argument('--environments', help='Number of configured environments.', type=int, default=10)
+    parser.add_argument('--latency', help='Fake docker latency, e.g. inspect=0.05 or default=0.02.', nargs='*',
+                        default=[])
+    parser.add_argument('--output', help='Write the results as json to this file.', type=str)
+    parser.add_argument('--baseline', help='Compare against the json results of an earlier run.', type=str)
+    parser.add_argument('--threshold', help='Allowed relative increase over the baseline.', type=float, default=0.2)
+    args = parser.parse_args()
+
+    latency = parse_latency(args.latency)
+    results = run_benchmarks(args.repeat, args.environments, latency)
+
+    print(f'{"COMMAND":<16}{"WALL":>12}{"DOCKER":>8}{"PEAK RSS":>12}   CALLS')
+    for name, result in results.items():
+        calls = ', '.join(f'{command}={count}' for command, count in result['docker_calls_by_command'].items())
+        failed = '' if result['exit_code'] == 0 else '   (failed)'
+        print(f'{name:<16}{result["wall_ms"]:>10.1f}ms{result["docker_calls"]:>8}{result["peak_rss_kb"]:>10}kB   '
+              f'{calls}{failed}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environments': args.environments, 'repeat': args.repeat, 'latency': latency,
+                       'results': results}, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+Scriptable stand in for the docker CLI, used by the command benchmarks.
+
+Containers are kept in the json file at FAKE_DOCKER_STATE. Every invocation is appended to FAKE_DOCKER_LOG and sleeps
+for the latency configured for its sub command in FAKE_DOCKER_LATENCY, a json object of seconds by sub command with
+an optional default. Local images are kept as a json object by name in FAKE_DOCKER_IMAGES. Every image is local if it
+is not set, and committed images are not kept. docker stats prints STATS_FRAMES refreshes of the running containers
+and exits.
+"""
+from datetime import datetime, timezone
+import hashlib
+import fcntl
+import json
+import os
+import sys
+import time
+
+
+# Sub commands that read or change containers. Others only sleep and succeed.
+CONTAINER_COMMANDS = {'inspect', 'ls', 'create', 'start', 'stop', 'kill', 'restart', 'rm', 'rename', 'exec', 'commit',
+                      'stats'}
+
+# Labels printed by docker container ls, in the containers format of snowglobe.
+LABELS = ['snowglobe.managed', 'snowglobe.spec-hash', 'snowglobe.pool', 'snowglobe.store']
+
+# Fields of the inspect format used by snowglobe status.
+STATUS_FIELDS = ['{{.Name}}', '{{.State.Status}}', '{{.State.StartedAt}}', '{{.Image}}',
+                 '{{json .NetworkSettings.Ports}}']
+
+# Refreshes printed by docker stats before the stream ends.
+STATS_FRAMES = 2
+
+# Memory limit printed by docker stats.
+MEMORY_LIMIT = '1.944GiB'
+
+
+def sub_command(args: list) -> str:
+    """
+    Returns the sub command of a docker invocation, e.g. inspect for docker container inspect.
+    :param args: Docker arguments.
+    :return: Sub command.
+    """
+    words = [arg for arg in args if not arg.startswith('-')]
+    if words and words[0] in ('container', 'image') and len(words) > 1:
+        return words[1]
+    return words[0] if words else ''
+
+
+def image_command(args: list) -> str:
+    """
+    Returns the sub command of a docker image invocation.
+    :param args: Docker arguments.
+    :return: Sub command, or None if the invocation is not about images.
+    """
+    words = [arg for arg in args if not arg.startswith('-')]
+    return words[1] if len(words) > 1 and words[0] == 'image' else None
+
+
+def new_image(labels: dict = None) -> dict:
+    """
+    Builds a new local image.
+    :param labels: Labels of the image.
+    :return: Image dictionary.
+    """
+    created = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f +0000 UTC')
+    return {'Labels': labels or {}, 'CreatedAt': created, 'Size': '7.8MB'}
+
+
+def list_images(images: dict, args: list) -> int:
+    """
+    Prints images as docker image ls does with the snapshots format of snowglobe. Only label filters are understood.
+    :param images: Local images by name.
+    :param args: Arguments after the sub command.
+    :return: Exit code.
+    """
+    filters = [args[index + 1] for index, arg in enumerate(args) if arg in ('--filter', '-f')]
+    wanted = [label[len('label='):].partition('=') for label in filters if label.startswith('label=')]
+    for name, image in images.items():
+        labels = image['Labels']
+        if all(key in labels and (not separator or labels[key] == value) for key, separator, value in wanted):
+            print('\t'.join([name, image['CreatedAt'], image['Size']]))
+    return 0
+
+
+def run_image(images: dict, command: str, args: list) -> int:
+    """
+    Applies a docker image sub command to the fake images. Pulls and builds always succeed. Labels are only kept for
+    committed images.
+    :param images: Local images by name, or None if every image is local.
+    :param command: Sub command.
+    :param args: Arguments after the sub command.
+    :return: Exit code.
+    """
+    if command == 'ls':
+        return list_images(images or {}, args)
+    image = args[args.index('--tag') + 1] if command == 'build' else args[-1]
+    if command in ('inspect', 'rm') and images is not None and image not in images:
+        print(f'Error: No such image: {image}', file=sys.stderr)
+        return 1
+    if command == 'inspect' and 'Labels' in ' '.join(args):
+        print(json.dumps(images[image]['Labels'] or None) if images is not None else 'null')
+    elif command == 'inspect':
+        print(f'sha256:{hashlib.sha256(image.encode()).hexdigest()}')
+    elif command == 'rm':
+        images.pop(image, None)
+        print(f'Untagged: {image}')
+    elif images is not None and image not in images:
+        images[image] = new_image()
+    return 0
+
+
+def update(file_path: str, default, function):
+    """
+    Changes the json content of a file under an exclusive lock.
+    :param file_path: Path of the file.
+    :param default: Content of a missing or empty file.
+    :param function: Function changing the content in place and returning the exit code.
+    :return: Exit code.
+    """
+    with open(file_path, 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        content = f.read()
+        data = json.loads(content) if content else default
+        code = function(data)
+        f.seek(0)
+        f.truncate()
+        json.dump(data, f)
+    return code
+
+
+def new_container(name: str, image: str) -> dict:
+    """
+    Builds the inspect result of a new container.
+    :param name: Name of the container.
+    :param image: Name of the image.
+    :return: Inspect dictionary.
+    """
+    return {
+        'Id': hashlib.sha256(name.encode()).hexdigest(),
+        'Name': f'/{name}',
+        'Image': f'sha256:{hashlib.sha256(image.encode()).hexdigest()}',
+        'Config': {'Image': image, 'Labels': {}},
+        'State': {'Status': 'created', 'Running': False, 'StartedAt': '0001-01-01T00:00:00Z'},
+        'NetworkSettings': {'Ports': {}},
+    }
+
+
+def inspect(containers: dict, args: list) -> int:
+    """
+    Prints containers as docker container inspect does. Only the status format of snowglobe is understood.
+    :param containers: Containers by name.
+    :param args: Arguments after the sub command.
+    :return: Exit code.
+    """
+    names = []
+    fmt = None
+    index = 0
+    while index < len(args):
+        if args[index] in ('--format', '-f'):
+            fmt = args[index + 1]
+            index += 2
+            continue
+        names.append(args[index])
+        index += 1
+
+    found = [containers[name] for name in names if name in containers]
+    for name in names:
+        if name not in containers:
+            print(f'Error: No such container: {name}', file=sys.stderr)
+
+    if fmt is None:
+        print(json.dumps(found))
+    elif fmt.split('\t') == STATUS_FIELDS:
+        for container in found:
+            print('\t'.join([container['Name'], container['State']['Status'], container['State']['StartedAt'],
+                             container['Image'], json.dumps(container['NetworkSettings']['Ports'])]))
+    else:
+        for container in found:
+            print(container['Name'].lstrip('/'))
+    return 0 if len(found) == len(names) else 1
+
+
+def ls(containers: dict) -> int:
+    """
+    Prints all containers as docker container ls --all does with the containers format of snowglobe.
+    :param containers: Containers by name.
+    :return: Exit code.
+    """
+    for name, container in containers.items():
+        labels = container['Config']['Labels']
+        print('\t'.join([name, container['State']['Status']] + [labels.get(label, '') for label in LABELS]))
+    return 0
+
+
+def commit(containers: dict, images: dict, args: list) -> int:
+    """
+    Commits a fake container to an image, labelled by the --change LABEL instruction of snowglobe snapshots.
+    :param containers: Containers by name.
+    :param images: Local images by name, or None if images are not kept.
+    :param args: Arguments after the sub command.
+    :return: Exit code.
+    """
+    name, image = args[-2:]
+    if name not in containers:
+        print(f'Error: No such container: {name}', file=sys.stderr)
+        return 1
+    changes = [args[index + 1] for index, arg in enumerate(args) if arg in ('--change', '-c')]
+    labels = dict(change[len('LABEL '):].split('=', 1) for change in changes if change.startswith('LABEL '))
+    if images is not None:
+        images[image] = new_image(labels)
+    print(f'sha256:{hashlib.sha256(image.encode()).hexdigest()}')
+    return 0
+
+
+def stats(containers: dict) -> int:
+    """
+    Prints the resource usage of the running containers as docker stats does with the stats format of snowglobe,
+    clearing the screen before every refresh.
+    :param containers: Containers by name.
+    :return: Exit code.
+    """
+    for _ in range(STATS_FRAMES):
+        lines = [f'{name}\t0.50%\t{int(container["Id"][:2], 16) / 10:.1f}MiB / {MEMORY_LIMIT}'
+                 for name, container in containers.items() if container['State']['Running']]
+        print('\x1b[2J\x1b[H' + '\n'.join(lines), flush=True)
+    return 0
+
+
+def run(containers: dict, command: str, args: list) -> int:
+    """
+    Applies a docker sub command to the fake containers.
+    :param containers: Containers by name.
+    :param command: Sub command.
+    :param args: Arguments after the sub command.
+    :return: Exit code.
+    """
+    positional = [arg for arg in args if not arg.startswith('-')]
+    if command == 'inspect':
+        return inspect(containers, args)
+    if command == 'ls':
+        return ls(containers)
+    if command == 'stats':
+        return stats(containers)
+    if command == 'create':
+        name = args[args.index('--name') + 1]
+        if name in containers:
+            print(f'Error: Conflict. The container name "/{name}" is already in use', file=sys.stderr)
+            return 1
+        containers[name] = new_container(name, args[args.index('--name') + 2])
+        labels = [args[index + 1] for index, arg in enumerate(args) if arg in ('--label', '-l')]
+        containers[name]['Config']['Labels'] = dict(label.split('=', 1) for label in labels)
+        print(containers[name]['Id'])
+        return 0
+
+    if command == 'rename':
+        name, new_name = positional
+        if name not in containers or new_name in containers:
+            print(f'Error: Can not rename container {name} to {new_name}', file=sys.stderr)
+            return 1
+        containers[new_name] = containers.pop(name)
+        containers[new_name]['Name'] = f'/{new_name}'
+        return 0
+
+    name = positional[-1] if positional else ''
+    if command in ('start', 'stop', 'rm', 'kill', 'restart') and name not in containers:
+        print(f'Error: No such container: {name}', file=sys.stderr)
+        return 1
+    if command in ('start', 'restart'):
+        started_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        containers[name]['State'].update(Status='running', Running=True, StartedAt=started_at)
+    elif command in ('stop', 'kill'):
+        containers[name]['State'].update(Status='exited', Running=False)
+    elif command == 'rm':
+        if containers[name]['State']['Running'] and '-f' not in args and '--force' not in args:
+            print(f'Error: You cannot remove a running container {name}', file=sys.stderr)
+            return 1
+        del containers[name]
+    elif command == 'exec' and not any(containers.get(arg, {}).get('State', {}).get('Running') for arg in positional):
+        print('Error: container is not running', file=sys.stderr)
+        return 1
+    if command in ('start', 'stop', 'rm', 'kill', 'restart'):
+        print(name)
+    return 0
+
+
+def main() -> int:
+    """
+    Main function.
+    :return: Exit code.
+    """
+    args = sys.argv[1:]
+    command = sub_command(args)
+    with open(os.environ['FAKE_DOCKER_LOG'], 'a') as f:
+        f.write(json.dumps(args) + '\n')
+
+    latency = json.loads(os.environ.get('FAKE_DOCKER_LATENCY', '{}'))
+    time.sleep(latency.get(command, latency.get('default', 0)))
+
+    rest = args[args.index(command) + 1:] if command else []
+    images_path = os.environ.get('FAKE_DOCKER_IMAGES')
+    if image_command(args) is not None:
+        if images_path is None:
+            return run_image(None, command, rest)
+        return update(images_path, {}, lambda images: run_image(images, command, rest))
+
+    if command not in CONTAINER_COMMANDS:
+        return 0
+    if command == 'create' and images_path is not None:
+        # Docker pulls missing images on create.
+        update(images_path, {}, lambda images: run_image(images, 'pull', [args[args.index('--name') + 2]]))
+    if command == 'commit':
+        def commit_container(containers: dict) -> int:
+            if images_path is None:
+                return commit(containers, None, rest)
+            return update(images_path, {}, lambda images: commit(containers, images, rest))
+
+        return update(os.environ['FAKE_DOCKER_STATE'], {}, commit_container)
+    return update(os.environ['FAKE_DOCKER_STATE'], {}, lambda containers: run(containers, command, rest))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Compares config validation with the compiled validator against a Cerberus validator built per call.
+
+Usage: python benchmarks/validator.py
+"""
+from os import path
+import copy
+import sys
+import timeit
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from cerberus import Validator  # noqa: E402
+from snowglobe import config, validator  # noqa: E402
+
+
+def large_document(size: int) -> dict:
+    """
+    Builds a valid config with many env vars, ports and volumes.
+    :param size: Number of env vars. A tenth as many ports and volumes are added.
+    :return: Config data.
+    """
+    document = copy.deepcopy(config.TEMPLATE)
+    document['create']['envs'] = {f'KEY_{index}': f'VALUE_{index}' for index in range(size)}
+    document['create']['ports'] = [{'hostPort': 10000 + index, 'containerPort': index, 'protocol': 'tcp'}
+                                   for index in range(size // 10)]
+    document['create']['volumes'] = [{'hostPath': f'/HOST/{index}', 'containerPath': f'/CONTAINER/{index}'}
+                                     for index in range(size // 10)]
+    return document
+
+
+def cerberus_validate(document: dict) -> dict:
+    cerberus_validator = Validator(config.SCHEMA)
+    cerberus_validator.validate(document)
+    return cerberus_validator.errors
+
+
+def compiled_validate(document: dict) -> dict:
+    return validator.validate(config.SCHEMA, document)
+
+
+def main():
+    documents = [('small', config.TEMPLATE, 200), ('large', large_document(5000), 5)]
+    print(f'{"DOCUMENT":<10}{"CERBERUS":>14}{"COMPILED":>14}{"SPEEDUP":>10}')
+    for name, document, number in documents:
+        assert cerberus_validate(document) == compiled_validate(document)
+        cerberus = min(timeit.repeat(lambda: cerberus_validate(document), number=number, repeat=3)) / number
+        compiled = min(timeit.repeat(lambda: compiled_validate(document), number=number, repeat=3)) / number
+        print(f'{name:<10}{cerberus * 1000:>12.3f}ms{compiled * 1000:>12.3f}ms{cerberus / compiled:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,6 @@ setuptools.setup(
     entry_points={
         'console_scripts': ['snowglobe=snowglobe.__main__:main'],
     },
-    install_requires=['Cerberus==1.3.2'],
+    install_requires=[],
     platforms=['any'],
 )
@@ -1,7 +1,8 @@
-from snowglobe import environment
+from snowglobe import environment, config, daemon, trace
 import argparse
 import json
 import sys
+import os
 
 
 def parse_args(args: list) -> argparse.Namespace:
@@ -11,10 +12,29 @@ def parse_args(args: list) -> argparse.Namespace:
     :return: Parsed arguments.
     """
     snowglobe = argparse.ArgumentParser(prog='snowglobe')
+    snowglobe.add_argument('--runtime', help='Runtime backend used to talk to docker.', choices=['cli', 'api'],
+                           default=os.environ.get('SNOWGLOBE_RUNTIME', 'cli'))
+    snowglobe.add_argument('--store', help='Backend used to store environment configs.', choices=['json', 'sqlite'],
+                           default=os.environ.get('SNOWGLOBE_STORE', 'json'))
+    snowglobe.add_argument('--trace', help='Write a chrome trace of the command to this file.', type=str,
+                           metavar='FILE')
+    snowglobe.add_argument('--dry-run', help='Print the planned docker operations instead of running them.',
+                           action='store_true')
     subparsers = snowglobe.add_subparsers(help='Sub commands for snowglobe.', required=True)
 
     list_parser = subparsers.add_parser('list', help='Get list configured environments.')
     list_parser.set_defaults(command='list')
+    list_parser.add_argument('--image', help='Only list environments using this image.', type=str)
+
+    status_parser = subparsers.add_parser('status', help='Get the container status of configured environments.')
+    status_parser.set_defaults(command='status')
+
+    top_parser = subparsers.add_parser('top', help='Follow the cpu and memory usage of all environments.')
+    top_parser.set_defaults(command='top')
+    top_parser.add_argument('--window', help='Minutes of history used for averages and peaks. Defaults to 5.',
+                            type=float)
+    top_parser.add_argument('--count', help='Number of refreshes to print. Follows until interrupted by default.',
+                            type=int)
 
     template_parser = subparsers.add_parser('template', help='Prints out a config template.')
     template_parser.set_defaults(command='template')
@@ -29,26 +49,111 @@ def parse_args(args: list) -> argparse.Namespace:
 
     remove_parser = subparsers.add_parser('remove', help='Remove an existing environment.')
     remove_parser.set_defaults(command='remove')
-    remove_parser.add_argument('name', help='Name of the environment.', type=str)
+    add_batch_arguments(remove_parser)
 
     reset_parser = subparsers.add_parser('reset', help='Reset an existing environment.')
     reset_parser.set_defaults(command='reset')
-    reset_parser.add_argument('name', help='Name of the environment.', type=str)
+    add_batch_arguments(reset_parser)
+    reset_parser.add_argument('--force', help='Recreate the container even if its spec did not change.',
+                              action='store_true')
+    reset_parser.add_argument('--from-snapshot', help='Recreate the container from a snapshot.', type=str,
+                              metavar='TAG', dest='snapshot')
 
     start_parser = subparsers.add_parser('start', help='Start an existing environment.')
     start_parser.set_defaults(command='start')
-    start_parser.add_argument('name', help='Name of the environment.', type=str)
+    add_batch_arguments(start_parser)
+    start_parser.add_argument('--wait', help='Wait for the environments to be ready and print the time it took.',
+                              action='store_true')
+    start_parser.add_argument('--timeout', help='Seconds to wait for readiness. Defaults to the timeout of the ready '
+                                                'section, or 60.', type=int)
 
     exec_parser = subparsers.add_parser('exec', help='Exec commands on an existing environment.')
     exec_parser.set_defaults(command='exec')
-    exec_parser.add_argument('name', help='Name of the environment.', type=str)
+    add_batch_arguments(exec_parser)
     exec_parser.add_argument('exec_name', help='Exec name.', type=str)
 
     stop_parser = subparsers.add_parser('stop', help='Stop an existing environment.')
     stop_parser.set_defaults(command='stop')
-    stop_parser.add_argument('name', help='Name of the environment.', type=str)
+    add_batch_arguments(stop_parser)
+
+    pull_parser = subparsers.add_parser('pull', help='Pull the images of environments ahead of setup or reset.')
+    pull_parser.set_defaults(command='pull')
+    add_batch_arguments(pull_parser)
+
+    pool_parser = subparsers.add_parser('pool', help='Show or fill the pool of spare containers of an environment.')
+    pool_parser.set_defaults(command='pool')
+    pool_parser.add_argument('name', help='Name of the environment.', type=str)
+    pool_parser.add_argument('--size', help='Set the number of spare containers and fill the pool.', type=int)
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='Commit the container of an environment to a snapshot.')
+    snapshot_parser.set_defaults(command='snapshot')
+    snapshot_parser.add_argument('name', help='Name of the environment.', type=str)
+    snapshot_parser.add_argument('tag', help='Tag of the snapshot. Defaults to the current time.', type=str,
+                                 nargs='?')
+
+    snapshots_parser = subparsers.add_parser('snapshots', help='List or prune environment snapshots.')
+    snapshots_parser.set_defaults(command='snapshots')
+    snapshots_parser.add_argument('name', help='Name of the environment. Defaults to all environments.', type=str,
+                                  nargs='?')
+    snapshots_parser.add_argument('--prune', help='Remove all but the newest snapshots of each environment.',
+                                  action='store_true')
+    snapshots_parser.add_argument('--keep', help='Number of snapshots kept per environment when pruning.', type=int,
+                                  default=1)
+
+    apply_parser = subparsers.add_parser('apply', help='Make docker match the environment configs.')
+    apply_parser.set_defaults(command='apply')
+    apply_parser.add_argument('directory', help='Directory of json configs. Defaults to the config store.', type=str,
+                              nargs='?')
+    apply_parser.add_argument('--jobs', help='Number of containers handled at the same time.', type=int, default=4)
+
+    import_parser = subparsers.add_parser('import', help='Import the json configs of a directory.')
+    import_parser.set_defaults(command='import')
+    import_parser.add_argument('directory', help='Path to the config directory.', type=str)
+
+    export_parser = subparsers.add_parser('export', help='Export all configs to a directory of json files.')
+    export_parser.set_defaults(command='export')
+    export_parser.add_argument('directory', help='Path to the config directory.', type=str)
+
+    session_parser = subparsers.add_parser('session', help='Serve session execs of a container through a long lived '
+                                                           'agent. Started by exec when needed.')
+    session_parser.set_defaults(command='session')
+    session_parser.add_argument('name', help='Name of the docker container.', type=str)
+    session_parser.add_argument('--idle-timeout', help='Seconds without a request after which the agent stops. '
+                                                       'Defaults to 600.', type=int)
+
+    daemon_parser = subparsers.add_parser('daemon',
+                                          help='Serve list, status and inspect from a cache of docker events.')
+    daemon_parser.set_defaults(command='daemon')
 
-    return snowglobe.parse_args(args)
+    args = snowglobe.parse_args(args)
+    if getattr(args, 'all', False) and args.names:
+        snowglobe.error('environment names and --all can not be used together')
+    if hasattr(args, 'all') and not args.all and not args.names:
+        snowglobe.error('environment names or --all are required')
+    if getattr(args, 'jobs', 1) < 1:
+        snowglobe.error('--jobs must be at least 1')
+    if getattr(args, 'keep', 0) < 0:
+        snowglobe.error('--keep can not be negative')
+    if getattr(args, 'timeout', None) is not None and args.timeout < 0:
+        snowglobe.error('--timeout can not be negative')
+    if getattr(args, 'window', None) is not None and args.window <= 0:
+        snowglobe.error('--window must be positive')
+    if getattr(args, 'count', None) is not None and args.count < 1:
+        snowglobe.error('--count must be at least 1')
+    if (getattr(args, 'size', 0) or 0) < 0:
+        snowglobe.error('--size can not be negative')
+    return args
+
+
+def add_batch_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the arguments of commands that can run on many environments.
+    :param parser: Sub command parser.
+    :return: None.
+    """
+    parser.add_argument('names', help='Names of the environments.', type=str, nargs='*', metavar='name')
+    parser.add_argument('--all', help='Run on every configured environment.', action='store_true')
+    parser.add_argument('--jobs', help='Number of environments handled at the same time.', type=int, default=4)
 
 
 def main():
@@ -56,12 +161,43 @@ def main():
     Main function.
     :return: None.
     """
+    args = parse_args(sys.argv[1:])
+    if args.trace:
+        trace.start()
     try:
-        args = parse_args(sys.argv[1:])
-        snowglobe = environment.Environment()
+        return run(args)
+    finally:
+        if args.trace:
+            try:
+                trace.save(args.trace, f'snowglobe {args.command}')
+            except OSError as ose:
+                print(f'Error: Trace file {args.trace} can not be written: {ose}.')
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Runs a command.
+    :param args: Parsed arguments.
+    :return: Exit code.
+    """
+    try:
+        if args.command in daemon.COMMANDS:
+            output = daemon.query(args.command, getattr(args, 'name', None), getattr(args, 'image', None),
+                                  config.store_location(args.store))
+            if output is not None:
+                print(output, end='')
+                return 0
+
+        snowglobe = environment.Environment(args.runtime, args.dry_run, args.store)
 
         if args.command == 'list':
-            snowglobe.list()
+            snowglobe.list(args.image)
+
+        elif args.command == 'status':
+            snowglobe.status()
+
+        elif args.command == 'top':
+            snowglobe.top(args.window, args.count)
 
         elif args.command == 'template':
             snowglobe.template()
@@ -81,26 +217,72 @@ def main():
             except json.JSONDecodeError as jde:
                 raise RuntimeError(f'Invalid json format: {jde}')
 
-            snowglobe.setup(data['name'], data)
+            snowglobe.setup(data['name'], data, os.path.dirname(os.path.abspath(args.file)))
+
+        elif args.command == 'exec' and (args.all or len(args.names) > 1):
+            names = sorted(snowglobe.config.confs) if args.all else args.names
+            return 0 if snowglobe.exec_all(names, args.exec_name, args.jobs) else -1
+
+        elif args.command == 'exec':
+            return snowglobe.exec(args.names[0], args.exec_name, replace=True) or 0
+
+        elif args.command == 'pull':
+            names = sorted(snowglobe.config.confs) if args.all else args.names
+            return 0 if snowglobe.pull(names, args.jobs) else -1
+
+        elif args.command == 'pool':
+            snowglobe.pool(args.name, args.size)
+
+        elif args.command == 'snapshot':
+            snowglobe.snapshot(args.name, args.tag)
+
+        elif args.command == 'snapshots':
+            snowglobe.snapshots(args.name, args.prune, args.keep)
+
+        elif args.command == 'apply':
+            return 0 if snowglobe.reconcile(args.directory, args.jobs) else -1
+
+        elif args.command == 'import':
+            snowglobe.import_configs(args.directory)
+
+        elif args.command == 'export':
+            snowglobe.export_configs(args.directory)
+
+        elif args.command == 'session':
+            from snowglobe import session
+            session.Broker(args.name, args.idle_timeout or session.IDLE_TIMEOUT).serve()
+
+        elif args.command == 'daemon':
+            daemon.Daemon(snowglobe.runtime, snowglobe.runtime.events, args.store).serve()
+
+        elif args.all or len(args.names) > 1:
+            names = sorted(snowglobe.config.confs) if args.all else args.names
+            options = {'force': args.force, 'snapshot': args.snapshot} if args.command == 'reset' else {}
+            if args.command == 'start' and args.wait:
+                options = {'wait': True, 'timeout': args.timeout}
+            return 0 if snowglobe.batch(args.command, names, args.jobs, **options) else -1
 
         elif args.command == 'remove':
-            snowglobe.remove(args.name)
+            snowglobe.remove(args.names[0])
 
         elif args.command == 'reset':
-            snowglobe.reset(args.name)
+            snowglobe.reset(args.names[0], args.force, args.snapshot)
 
-        elif args.command == 'start':
-            snowglobe.start(args.name)
+        elif args.command == 'start' and args.wait:
+            snowglobe.start(args.names[0], wait=True, timeout=args.timeout)
 
-        elif args.command == 'exec':
-            snowglobe.exec(args.name, args.exec_name)
+        elif args.command == 'start':
+            snowglobe.start(args.names[0], replace=True)
 
         elif args.command == 'stop':
-            snowglobe.stop(args.name)
+            snowglobe.stop(args.names[0])
         return 0
 
+    except KeyboardInterrupt:
+        # Exit code of a command ended by SIGINT, so interrupted changes do not look successful.
+        return 130
     except RuntimeError as re:
-        print(f'Error: {re}.')
+        print(f'{getattr(re, "title", "Error")}: {re}.')
         return -1
     except Exception as e:
         print(f'Error: {e}.\nAn unknown exception occurred.')
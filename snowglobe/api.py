@@ -0,0 +1,592 @@
+from snowglobe.runtime import Runtime, LABELS, RETRIES, human_size, guarded, stop_grace
+from snowglobe import config, trace
+from urllib.parse import quote, urlencode, urlparse
+from datetime import datetime, timezone
+import http.client
+import threading
+import socket
+import json
+import sys
+import os
+import re
+
+
+DEFAULT_DOCKER_HOST = 'unix:///var/run/docker.sock'
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a unix domain socket.
+    """
+    def __init__(self, socket_path: str):
+        """
+        Sets up the connection.
+        :param socket_path: Path to the unix socket.
+        """
+        super().__init__('localhost', timeout=None)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        """
+        Opens the unix socket.
+        :return: None.
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ApiRuntime(Runtime):
+    """
+    ApiRuntime class. Handles docker commands through the docker engine api over a single keep-alive connection
+    per thread. Exec and attached starts need the docker client's terminal handling and are passed on to the docker CLI.
+    """
+    def __init__(self, host: str = None):
+        """
+        Sets up the docker host. The connection is opened on the first request.
+        :param host: Docker host url. Defaults to DOCKER_HOST or the local docker socket.
+        """
+        self.host = host or os.environ.get('DOCKER_HOST') or DEFAULT_DOCKER_HOST
+        self.local = threading.local()
+
+    @property
+    def connection(self) -> http.client.HTTPConnection:
+        """
+        Returns the connection of the current thread.
+        :return: HTTP connection.
+        """
+        return getattr(self.local, 'connection', None)
+
+    @connection.setter
+    def connection(self, connection: http.client.HTTPConnection) -> None:
+        """
+        Sets the connection of the current thread.
+        :param connection: HTTP connection.
+        :return: None.
+        """
+        self.local.connection = connection
+
+    def connect(self) -> http.client.HTTPConnection:
+        """
+        Returns the open connection to the docker host, creating it if needed.
+        :return: HTTP connection.
+        """
+        if self.connection is None:
+            url = urlparse(self.host)
+            if url.scheme == 'unix':
+                self.connection = UnixHTTPConnection(url.path)
+            elif url.scheme in ('tcp', 'http'):
+                self.connection = http.client.HTTPConnection(url.hostname, url.port or 2375)
+            else:
+                raise RuntimeError(f'Docker host: {self.host} is not supported by the api runtime')
+
+        return self.connection
+
+    def close(self) -> None:
+        """
+        Closes the connection to the docker host.
+        :return: None.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def send(self, method: str, url: str, payload: bytes, timeout: float = None) -> tuple:
+        """
+        Sends a single request over the connection and reads the full response.
+        :param method: HTTP method.
+        :param url: Request url.
+        :param payload: Encoded json body.
+        :param timeout: Seconds the connection may block, or None to wait forever.
+        :return: Response status and body.
+        """
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        connection = self.connect()
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        connection.request(method, url, body=payload, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def request(self, method: str, url: str, body: dict = None, operation: str = 'default', retries: int = 0,
+                grace: float = 0) -> tuple:
+        """
+        Sends a request to the docker engine api within the deadline of its operation, through the circuit breaker.
+        :param method: HTTP method.
+        :param url: Request url.
+        :param body: Json body.
+        :param operation: Docker sub command whose deadline applies, e.g. inspect.
+        :param retries: Number of retries after a timeout. Only idempotent requests are retried.
+        :param grace: Seconds added to the deadline.
+        :return: Response status and body.
+        """
+        payload = json.dumps(body).encode() if body is not None else None
+
+        def attempt(timeout: float) -> tuple:
+            reused = self.connection is not None and self.connection.sock is not None
+            with trace.span(f'{method} {url.split("?")[0]}', 'runtime', url=url) as span:
+                try:
+                    try:
+                        response = self.send(method, url, payload, timeout)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # The daemon may drop an idle keep-alive connection. Reconnect once.
+                        if not reused:
+                            raise
+                        self.close()
+                        response = self.send(method, url, payload, timeout)
+                except socket.timeout:
+                    # The rest of a late response must not be read as the answer to the next request.
+                    self.close()
+                    raise
+                except OSError as ose:
+                    self.close()
+                    raise RuntimeError(f'Cannot connect to the docker daemon at {self.host}: {ose}')
+                span.set(status=response[0])
+            return response
+
+        return guarded(operation, attempt, retries, grace)
+
+    @staticmethod
+    def error_message(data: bytes) -> str:
+        """
+        Returns the error message of a docker engine api response.
+        :param data: Response body.
+        :return: Error message.
+        """
+        try:
+            return json.loads(data.decode())['message']
+        except (ValueError, KeyError, TypeError):
+            return data.decode().strip()
+
+    def report(self, data: bytes) -> None:
+        """
+        Prints a docker engine api error the way the docker CLI does.
+        :param data: Response body.
+        :return: None.
+        """
+        print(f'Error response from daemon: {self.error_message(data)}', file=sys.stderr)
+
+    def inspect(self, name: str) -> dict:
+        """
+        Gets the container inspect result.
+        :param name: Name of the container.
+        :return: Inspect dictionary.
+        """
+        status, data = self.request('GET', f'/containers/{quote(name, safe="")}/json', operation='inspect',
+                                    retries=RETRIES)
+        if status == 404:
+            raise RuntimeError(f'Container: {name} not found')
+        if status != 200:
+            raise RuntimeError(f'Error response from daemon: {self.error_message(data)}')
+
+        try:
+            return json.loads(data.decode())
+        except json.JSONDecodeError as jde:
+            raise RuntimeError(f'Invalid json format: {jde}')
+
+    def states(self, names: list) -> dict:
+        """
+        Inspects many containers over the single connection and returns the fields their status is built from. The
+        api has no batch inspect. Containers that do not exist are left out.
+        :param names: Names of the containers.
+        :return: Dictionary of the state, start time, image id and port bindings for each container name.
+        """
+        states = {}
+        for name in names:
+            status, data = self.request('GET', f'/containers/{quote(name, safe="")}/json', operation='inspect',
+                                        retries=RETRIES)
+            if status == 404:
+                continue
+            if status != 200:
+                raise RuntimeError(f'Error response from daemon: {self.error_message(data)}')
+            try:
+                container = json.loads(data.decode())
+            except json.JSONDecodeError as jde:
+                raise RuntimeError(f'Invalid json format: {jde}')
+            states[name] = {'state': container['State']['Status'], 'started_at': container['State']['StartedAt'],
+                            'image': container['Image'], 'ports': container['NetworkSettings']['Ports']}
+        return states
+
+    def status(self, names: list) -> dict:
+        """
+        Lists many containers in a single request and returns their status. Containers that do not exist are left out.
+        :param names: Names of the containers.
+        :return: Status dictionary for each container name.
+        """
+        filters = json.dumps({'name': [f'^/{re.escape(name)}$' for name in names]})
+        status, data = self.request('GET', f'/containers/json?{urlencode({"all": 1, "filters": filters})}',
+                                    operation='inspect', retries=RETRIES)
+        if status != 200:
+            raise RuntimeError(f'Error response from daemon: {self.error_message(data)}')
+
+        statuses = {}
+        for container in json.loads(data.decode()):
+            uptime = ''
+            if container['State'] == 'running':
+                # The api only reports the humanised status, e.g. "Up 5 minutes (healthy)".
+                uptime = re.sub(r' \(.*\)$', '', container['Status'])[len('Up '):]
+            for name in container['Names']:
+                statuses[name.lstrip('/')] = {
+                    'state': container['State'],
+                    'uptime': uptime,
+                    'image': container['ImageID'],
+                    'ports': ', '.join(
+                        f'{port["IP"]}:{port["PublicPort"]}->{port["PrivatePort"]}/{port["Type"]}'
+                        if 'PublicPort' in port else f'{port["PrivatePort"]}/{port["Type"]}'
+                        for port in container['Ports']
+                    ),
+                }
+
+        return {name: statuses[name] for name in names if name in statuses}
+
+    def containers(self) -> dict:
+        """
+        Lists all containers in a single request.
+        :return: State and snowglobe labels of each container by name.
+        """
+        status, data = self.request('GET', '/containers/json?all=1', operation='ls', retries=RETRIES)
+        if status != 200:
+            raise RuntimeError(f'Error response from daemon: {self.error_message(data)}')
+
+        containers = {}
+        for container in json.loads(data.decode()):
+            labels = container.get('Labels') or {}
+            labels = {key: labels[key] for key in LABELS if labels.get(key)}
+            for name in container['Names']:
+                containers[name.lstrip('/')] = {'running': container['State'] == 'running', 'labels': labels}
+
+        return containers
+
+    def create(self, name: str, image: str, create: dict, spec: str = None, labels: dict = None,
+               store: str = None) -> None:
+        """
+        Creates a container. Pulls the image first if it is not available locally.
+        :param name: Name of the docker container.
+        :param image: Name of the docker image.
+        :param create: Create options.
+        :param spec: Spec hash of the container. Defaults to the hash of the image and create options.
+        :param labels: Additional labels of the container.
+        :param store: Id of the config store. Defaults to the store of the current settings.
+        :return: None.
+        """
+        url = f'/containers/create?{urlencode({"name": name})}'
+        body = self.create_body(image, create, spec, store)
+        body['Labels'].update(labels or {})
+        status, data = self.request('POST', url, body, operation='create')
+        if status == 404:
+            print(f'Unable to find image \'{image}\' locally', file=sys.stderr)
+            self.pull(image)
+            status, data = self.request('POST', url, body, operation='create')
+
+        if status not in (200, 201):
+            self.report(data)
+
+    def has_image(self, image: str) -> bool:
+        """
+        Checks if an image is available locally.
+        :param image: Name of the docker image.
+        :return: True if the image does not need to be pulled.
+        """
+        status, data = self.request('GET', f'/images/{quote(image, safe="")}/json', operation='inspect',
+                                    retries=RETRIES)
+        if status not in (200, 404):
+            raise RuntimeError(f'Error response from daemon: {self.error_message(data)}')
+        return status == 200
+
+    def image_labels(self, image: str) -> dict:
+        """
+        Returns the labels of a local image. Images are built with the docker CLI, which sends the build context.
+        :param image: Name of the docker image.
+        :return: Dictionary of labels, or None if the image is not available locally.
+        """
+        status, data = self.request('GET', f'/images/{quote(image, safe="")}/json', operation='inspect',
+                                    retries=RETRIES)
+        if status == 404:
+            return None
+        if status != 200:
+            raise RuntimeError(f'Error response from daemon: {self.error_message(data)}')
+        return json.loads(data.decode()).get('Config', {}).get('Labels') or {}
+
+    def pull(self, image: str) -> None:
+        """
+        Pulls an image.
+        :param image: Name of the docker image.
+        :return: None.
+        """
+        status, data = self.request('POST', f'/images/create?{urlencode(split_image(image))}', operation='pull')
+        if status != 200:
+            raise RuntimeError(f'Image: {image} can not be pulled: {self.error_message(data)}')
+
+        for line in data.decode().splitlines():
+            if line.strip() and 'error' in json.loads(line):
+                raise RuntimeError(f'Image: {image} can not be pulled: {json.loads(line)["error"]}')
+
+    def start(self, name: str, start: str, replace: bool = False) -> None:
+        """
+        Starts a container. Start options attach to the container and are passed on to the docker CLI.
+        :param name: Name of the docker container
+        :param start: Start options.
+        :param replace: Replace the snowglobe process with docker if the options attach the terminal.
+        :return: None.
+        """
+        if start.split():
+            return super().start(name, start, replace)
+
+        status, data = self.request('POST', f'/containers/{quote(name, safe="")}/start', operation='start')
+        if status in (204, 304):
+            print(name)
+        else:
+            self.report(data)
+
+    def restart(self, name: str, timeout: int = None, signal: str = None) -> None:
+        """
+        Restarts a container.
+        :param name: Name of the docker container.
+        :param timeout: Seconds to wait for the container to stop before it is killed. Docker's default if None.
+        :param signal: Signal sent to stop the container. The signal of the image if None.
+        :return: None.
+        """
+        status, data = self.request('POST', f'/containers/{quote(name, safe="")}/restart{stop_query(timeout, signal)}',
+                                    operation='restart', grace=stop_grace(timeout))
+        if status != 204:
+            self.report(data)
+
+    def stop(self, name: str, timeout: int = None, signal: str = None) -> None:
+        """
+        Stops a container.
+        :param name: Name of the docker container.
+        :param timeout: Seconds to wait for the container to stop before it is killed. Docker's default if None.
+        :param signal: Signal sent to stop the container. The signal of the image if None.
+        :return: None.
+        """
+        status, data = self.request('POST', f'/containers/{quote(name, safe="")}/stop{stop_query(timeout, signal)}',
+                                    operation='stop', retries=RETRIES, grace=stop_grace(timeout))
+        if status not in (204, 304):
+            self.report(data)
+
+    def remove(self, name: str, force: bool = False) -> None:
+        """
+        Removes a container.
+        :param name: Name of the docker container.
+        :param force: Kill the container if it is running and remove it in the same request.
+        :return: None.
+        """
+        status, data = self.request('DELETE', f'/containers/{quote(name, safe="")}{"?force=true" if force else ""}',
+                                    operation='rm', retries=RETRIES)
+        if status != 204:
+            self.report(data)
+
+    def rename(self, name: str, new_name: str) -> None:
+        """
+        Renames a container.
+        :param name: Name of the docker container.
+        :param new_name: New name of the docker container.
+        :return: None.
+        """
+        url = f'/containers/{quote(name, safe="")}/rename?{urlencode({"name": new_name})}'
+        status, data = self.request('POST', url, operation='rename')
+        if status != 204:
+            raise RuntimeError(f'Container: {name} can not be renamed: {self.error_message(data)}')
+
+    def commit(self, name: str, image: str, environment: str) -> None:
+        """
+        Commits a container to an image labelled with the environment it was committed from.
+        :param name: Name of the docker container.
+        :param image: Name of the new image.
+        :param environment: Name of the environment.
+        :return: None.
+        """
+        query = split_image(image)
+        query = {'container': name, 'repo': query['fromImage'], 'tag': query['tag'],
+                 'changes': f'LABEL {config.SNAPSHOT_LABEL}={environment}'}
+        status, data = self.request('POST', f'/commit?{urlencode(query)}', operation='commit')
+        if status != 201:
+            raise RuntimeError(f'Container: {name} can not be committed: {self.error_message(data)}')
+
+    def snapshots(self, environment: str = None) -> list:
+        """
+        Lists snapshot images in a single request.
+        :param environment: Name of the environment. Snapshots of all environments are listed if not given.
+        :return: List of dictionaries with the image, creation time and size of each snapshot.
+        """
+        label = config.SNAPSHOT_LABEL if environment is None else f'{config.SNAPSHOT_LABEL}={environment}'
+        status, data = self.request('GET', f'/images/json?{urlencode({"filters": json.dumps({"label": [label]})})}',
+                                    operation='ls', retries=RETRIES)
+        if status != 200:
+            raise RuntimeError(f'Snapshots can not be listed: {self.error_message(data)}')
+
+        snapshots = []
+        for image in json.loads(data.decode()):
+            created = datetime.fromtimestamp(image['Created'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            for tag in image.get('RepoTags') or []:
+                snapshots.append({'image': tag, 'created': created, 'size': human_size(image['Size'])})
+        return snapshots
+
+    def remove_image(self, image: str) -> None:
+        """
+        Removes an image.
+        :param image: Name of the image.
+        :return: None.
+        """
+        status, data = self.request('DELETE', f'/images/{quote(image, safe="")}', operation='rm')
+        if status != 200:
+            raise RuntimeError(f'Image: {image} can not be removed: {self.error_message(data)}')
+
+    @staticmethod
+    def create_body(image: str, create: dict, spec: str = None, store: str = None) -> dict:
+        """
+        Builds the container create request equivalent to the docker container create command of the CLI runtime.
+        :param image: Name of the docker image.
+        :param create: Create options.
+        :param spec: Spec hash of the container. Defaults to the hash of the image and create options.
+        :param store: Id of the config store. Defaults to the store of the current settings.
+        :return: Create request body.
+        """
+        body = {'Image': image, 'AttachStdout': True, 'AttachStderr': True, 'HostConfig': {}}
+
+        if create.get('entrypoint'):
+            body['Entrypoint'] = [create['entrypoint']]
+        if create.get('envs'):
+            body['Env'] = [f'{key}={value}' for key, value in create['envs'].items()]
+        if create.get('ports'):
+            for port in create['ports']:
+                add_port(body, port.get('hostIP', ''), port['hostPort'], port['containerPort'],
+                         port.get('protocol', 'tcp'))
+        if create.get('volumes'):
+            for volume in create['volumes']:
+                body['HostConfig'].setdefault('Binds', []).append(
+                    f'{volume["hostPath"]}:{volume["containerPath"]}:{volume.get("mode", "rw")}')
+        body['Labels'] = {config.MANAGED_LABEL: 'true', config.SPEC_LABEL: spec or config.spec_hash(image, create),
+                          config.STORE_LABEL: store or config.store_id()}
+        if create.get('options'):
+            apply_options(body, create['options'].split())
+        if create['command']:
+            body['Cmd'] = create['command']
+
+        return body
+
+
+# Short create options that take a value. Other short options are flags and can be grouped, e.g. -it.
+SHORT_VALUE_OPTIONS = {'-h', '-w', '-u', '-l', '-e', '-v', '-p'}
+
+
+def stop_query(timeout: int = None, signal: str = None) -> str:
+    """
+    Builds the query string of the container stop and restart requests.
+    :param timeout: Seconds to wait for the container to stop before it is killed.
+    :param signal: Signal sent to stop the container.
+    :return: Query string, empty if neither is set.
+    """
+    query = {key: value for key, value in (('t', timeout), ('signal', signal)) if value is not None}
+    return f'?{urlencode(query)}' if query else ''
+
+
+def split_image(image: str) -> dict:
+    """
+    Splits an image reference into the repository and tag query of the image create api.
+    :param image: Name of the docker image.
+    :return: Pull query.
+    """
+    if '@' in image:
+        repository, tag = image.split('@', 1)
+    elif ':' in image.rsplit('/', 1)[-1]:
+        repository, tag = image.rsplit(':', 1)
+    else:
+        repository, tag = image, 'latest'
+
+    return {'fromImage': repository, 'tag': tag}
+
+
+def add_port(body: dict, host_ip: str, host_port, container_port, protocol: str) -> None:
+    """
+    Adds a port binding to a container create request.
+    :param body: Create request body.
+    :param host_ip: Host ip to bind to.
+    :param host_port: Port on the host.
+    :param container_port: Port on the container.
+    :param protocol: Port protocol.
+    :return: None.
+    """
+    key = f'{container_port}/{protocol}'
+    body.setdefault('ExposedPorts', {})[key] = {}
+    body['HostConfig'].setdefault('PortBindings', {}).setdefault(key, []).append(
+        {'HostIp': host_ip, 'HostPort': str(host_port)})
+
+
+def apply_options(body: dict, options: list) -> None:
+    """
+    Applies docker container create CLI options to a container create request.
+    :param body: Create request body.
+    :param options: List of CLI options.
+    :return: None.
+    """
+    options = list(options)
+    while options:
+        option = options.pop(0)
+        value = None
+        if option.startswith('--') and '=' in option:
+            option, value = option.split('=', 1)
+        elif option[:1] == '-' and option[:2] != '--' and len(option) > 2:
+            if option[:2] in SHORT_VALUE_OPTIONS:
+                option, value = option[:2], option[2:]
+            else:
+                options = [f'-{flag}' for flag in option[2:]] + options
+                option = option[:2]
+
+        if option in ('-i', '--interactive'):
+            body.update({'AttachStdin': True, 'OpenStdin': True, 'StdinOnce': True})
+        elif option in ('-t', '--tty'):
+            body['Tty'] = True
+        elif option == '--privileged':
+            body['HostConfig']['Privileged'] = True
+        elif option == '--init':
+            body['HostConfig']['Init'] = True
+        elif option == '--rm':
+            body['HostConfig']['AutoRemove'] = True
+        elif option in SHORT_VALUE_OPTIONS or option in ('--hostname', '--workdir', '--user', '--label', '--env',
+                                                         '--volume', '--publish', '--network', '--net', '--restart'):
+            if value is None:
+                if not options:
+                    raise RuntimeError(f'Option: {option} needs a value')
+                value = options.pop(0)
+            apply_value_option(body, option, value)
+        else:
+            raise RuntimeError(f'Option: {option} is not supported by the api runtime')
+
+
+def apply_value_option(body: dict, option: str, value: str) -> None:
+    """
+    Applies a docker container create CLI option that takes a value.
+    :param body: Create request body.
+    :param option: CLI option.
+    :param value: Option value.
+    :return: None.
+    """
+    if option in ('-h', '--hostname'):
+        body['Hostname'] = value
+    elif option in ('-w', '--workdir'):
+        body['WorkingDir'] = value
+    elif option in ('-u', '--user'):
+        body['User'] = value
+    elif option in ('-l', '--label'):
+        key, _, label = value.partition('=')
+        body.setdefault('Labels', {})[key] = label
+    elif option in ('-e', '--env'):
+        if '=' in value:
+            body.setdefault('Env', []).append(value)
+        elif value in os.environ:
+            body.setdefault('Env', []).append(f'{value}={os.environ[value]}')
+    elif option in ('-v', '--volume'):
+        body['HostConfig'].setdefault('Binds', []).append(value)
+    elif option in ('-p', '--publish'):
+        value, _, protocol = value.partition('/')
+        parts = value.split(':')
+        host_ip = parts[-3] if len(parts) > 2 else ''
+        host_port = parts[-2] if len(parts) > 1 else ''
+        add_port(body, host_ip, host_port, parts[-1], protocol or 'tcp')
+    elif option in ('--network', '--net'):
+        body['HostConfig']['NetworkMode'] = value
+    elif option == '--restart':
+        policy, _, retries = value.partition(':')
+        body['HostConfig']['RestartPolicy'] = {'Name': policy, 'MaximumRetryCount': int(retries or 0)}
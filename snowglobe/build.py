@@ -0,0 +1,226 @@
+from snowglobe import config, trace
+import threading
+import fnmatch
+import hashlib
+import json
+import stat
+import os
+from os import path
+
+
+# Version of the build hash cache format. Caches of other versions are dropped.
+CACHE_VERSION = 1
+
+# Number of files of a build context hashed at the same time.
+HASH_JOBS = 8
+
+# Bytes read at a time while hashing a file.
+CHUNK_SIZE = 1024 * 1024
+
+
+def ignore_patterns(context: str) -> list:
+    """
+    Reads the .dockerignore file of a build context.
+    :param context: Path of the build context.
+    :return: List of (pattern, excluded) tuples in file order. Patterns starting with ! include files again.
+    """
+    try:
+        with open(path.join(context, '.dockerignore'), 'r') as f:
+            lines = [line.strip() for line in f]
+    except OSError:
+        return []
+
+    patterns = []
+    for line in lines:
+        if not line or line.startswith('#'):
+            continue
+        include = line.startswith('!')
+        pattern = path.normpath(line.lstrip('!').strip().lstrip('/'))
+        patterns.append((pattern, not include))
+    return patterns
+
+
+def match_segments(parts: list, pattern_parts: list) -> bool:
+    """
+    Matches the segments of a path against the segments of a .dockerignore pattern like docker does. Wildcards only
+    match within a segment, and a ** segment matches zero or more directories.
+    :param parts: Segments of the path.
+    :param pattern_parts: Segments of the pattern.
+    :return: True if the path matches.
+    """
+    if not pattern_parts:
+        return not parts
+    if pattern_parts[0] == '**':
+        return any(match_segments(parts[index:], pattern_parts[1:]) for index in range(len(parts) + 1))
+    return bool(parts) and fnmatch.fnmatchcase(parts[0], pattern_parts[0]) and \
+        match_segments(parts[1:], pattern_parts[1:])
+
+
+def is_ignored(relative_path: str, patterns: list) -> bool:
+    """
+    Checks if a path of a build context is left out by .dockerignore patterns. A path is left out if the last pattern
+    matching it or one of its parent directories excludes it.
+    :param relative_path: Path relative to the build context.
+    :param patterns: Patterns as returned by ignore_patterns.
+    :return: True if the path is left out.
+    """
+    parts = relative_path.split(os.sep)
+    prefixes = [parts[:index] for index in range(1, len(parts) + 1)]
+    ignored = False
+    for pattern, excluded in patterns:
+        pattern_parts = pattern.split(os.sep)
+        if any(match_segments(prefix, pattern_parts) for prefix in prefixes):
+            ignored = excluded
+    return ignored
+
+
+def context_files(context: str, patterns: list) -> list:
+    """
+    Lists the files of a build context that are sent to docker. Symbolic links are listed, not followed.
+    Directories are only skipped as a whole if no pattern includes files again.
+    :param context: Path of the build context.
+    :param patterns: Patterns as returned by ignore_patterns.
+    :return: Sorted list of paths relative to the build context.
+    """
+    prune = not any(not excluded for _, excluded in patterns)
+    files = []
+    for directory, directories, names in os.walk(context):
+        relative_directory = path.relpath(directory, context)
+        relative_directory = '' if relative_directory == '.' else relative_directory
+        kept = []
+        for name in directories:
+            relative_path = path.join(relative_directory, name)
+            if path.islink(path.join(directory, name)):
+                names.append(name)
+            elif not (prune and is_ignored(relative_path, patterns)):
+                kept.append(name)
+        directories[:] = kept
+        files.extend(path.join(relative_directory, name) for name in names
+                     if not is_ignored(path.join(relative_directory, name), patterns))
+    return sorted(files)
+
+
+def file_digest(file_path: str, file_stat: os.stat_result) -> str:
+    """
+    Hashes a file of a build context. Symbolic links are hashed by their target.
+    :param file_path: Path of the file.
+    :param file_stat: Stat result of the file, not following links.
+    :return: Hex digest.
+    """
+    digest = hashlib.sha256()
+    if stat.S_ISLNK(file_stat.st_mode):
+        digest.update(f'link:{os.readlink(file_path)}'.encode())
+        return digest.hexdigest()
+
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    HashCache class. Keeps the digests of build context files by their modification time and size, so that only files
+    that changed since the last build are read again.
+    """
+    def __init__(self, file_path: str = None):
+        """
+        Loads the cache.
+        :param file_path: Path of the cache file. The cache is only kept in memory if not given.
+        """
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.contexts = {}
+        self.changed = False
+        if file_path is None:
+            return
+        try:
+            with open(file_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == CACHE_VERSION:
+            self.contexts = data['contexts']
+
+    def digests(self, context: str, files: list, jobs: int = HASH_JOBS) -> list:
+        """
+        Returns the digests of files of a build context, hashed in parallel. Entries of files no longer in the context
+        are dropped.
+        :param context: Path of the build context.
+        :param files: Paths relative to the build context.
+        :param jobs: Maximum number of files hashed at the same time.
+        :return: List of digests, in the order of the files.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        cached = self.contexts.get(context, {})
+        entries = {}
+
+        def digest(relative_path: str) -> str:
+            file_path = path.join(context, relative_path)
+            file_stat = os.lstat(file_path)
+            entry = cached.get(relative_path)
+            if entry is None or entry[0] != file_stat.st_mtime_ns or entry[1] != file_stat.st_size:
+                entry = [file_stat.st_mtime_ns, file_stat.st_size, file_digest(file_path, file_stat)]
+            # The executable bit is part of the image, so it is part of the digest.
+            entries[relative_path] = entry
+            return f'{entry[2]}:{file_stat.st_mode & 0o111:o}'
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            digests = list(pool.map(digest, files))
+
+        with self.lock:
+            if entries != cached:
+                self.contexts[context] = entries
+                self.changed = True
+        return digests
+
+    def save(self) -> None:
+        """
+        Writes the cache if it changed. The cache can be rebuilt, so a file that can not be written is fine.
+        :return: None.
+        """
+        with self.lock:
+            if self.file_path is None or not self.changed:
+                return
+            try:
+                config.write_json(self.file_path, {'version': CACHE_VERSION, 'contexts': self.contexts})
+            except OSError:
+                return
+            self.changed = False
+
+
+@trace.traced('build')
+def context_hash(context: str, dockerfile: str = None, args: dict = None, cache: HashCache = None,
+                 jobs: int = HASH_JOBS) -> str:
+    """
+    Hashes everything a docker build depends on: the files of the build context left after .dockerignore, the
+    Dockerfile and the build arguments.
+    :param context: Path of the build context.
+    :param dockerfile: Path of the Dockerfile relative to the build context. Defaults to Dockerfile.
+    :param args: Build arguments.
+    :param cache: Cache of file digests.
+    :param jobs: Maximum number of files hashed at the same time.
+    :return: Hex digest.
+    """
+    context = path.abspath(context)
+    dockerfile_path = path.join(context, dockerfile or 'Dockerfile')
+    if not path.isdir(context):
+        raise RuntimeError(f'Build context: {context} not found')
+    if not path.isfile(dockerfile_path):
+        raise RuntimeError(f'Dockerfile: {dockerfile_path} not found')
+
+    cache = cache or HashCache()
+    files = context_files(context, ignore_patterns(context))
+    # Docker reads the Dockerfile even if it is left out of the context or outside of it.
+    dockerfile = path.relpath(dockerfile_path, context)
+    hashed = files if dockerfile in files else files + [dockerfile]
+    digests = cache.digests(context, hashed, jobs)
+    cache.save()
+
+    build = {
+        'dockerfile': [dockerfile, digests[hashed.index(dockerfile)]],
+        'args': {key: str(value) for key, value in (args or {}).items()},
+        'files': [[relative_path, digest] for relative_path, digest in zip(files, digests)],
+    }
+    return hashlib.sha256(json.dumps(build, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
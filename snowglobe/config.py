@@ -1,6 +1,45 @@
+from snowglobe import trace
+import threading
 import json
-from os import path, listdir, remove
-from cerberus import Validator
+import os
+from os import path, remove, scandir, stat, fstat
+
+
+# Name of the config index file in the config directory.
+INDEX_FILE = '.index.json'
+
+# Version of the config index format. Indexes of other versions are rebuilt.
+INDEX_VERSION = 1
+
+# Name of the sqlite database in the config directory, unless SNOWGLOBE_DB is set.
+DATABASE_FILE = 'snowglobe.db'
+
+# Config store backends.
+STORES = ['json', 'sqlite']
+
+# Container label holding the hash of the image and create spec the container was created from.
+SPEC_LABEL = 'snowglobe.spec-hash'
+
+# Container label marking containers created by snowglobe.
+MANAGED_LABEL = 'snowglobe.managed'
+
+# Container label holding the id of the config store that created the container, see store_id.
+STORE_LABEL = 'snowglobe.store'
+
+# Container label holding the environment a spare container was created for.
+POOL_LABEL = 'snowglobe.pool'
+
+# Image label holding the hash of the build context an image was built from.
+BUILD_LABEL = 'snowglobe.build-hash'
+
+# Name of the cache of build context file digests in the config directory.
+BUILD_CACHE_FILE = '.build-cache.json'
+
+# Image label holding the environment a snapshot was committed from.
+SNAPSHOT_LABEL = 'snowglobe.snapshot'
+
+# Repository of the snapshot images of an environment.
+SNAPSHOT_REPOSITORY = 'snowglobe/{name}'
 
 
 SCHEMA = {
@@ -12,6 +51,17 @@ SCHEMA = {
         'type': 'string',
         'required': True,
     },
+    'build': {
+        'type': 'dict',
+        'schema': {
+            'context': {'type': 'string', 'required': True},
+            'dockerfile': {'type': 'string'},
+            'args': {
+                'type': 'dict',
+                'allow_unknown': True,
+            },
+        }
+    },
     'create': {
         'type': 'dict',
         'required': True,
@@ -63,14 +113,47 @@ SCHEMA = {
             'schema': {
                 'name': {'type': 'string', 'required': True},
                 'command': {'type': 'string', 'required': True},
-                'options': {'type': 'string'}
+                'options': {'type': 'string'},
+                'session': {'type': 'boolean'},
             }
         },
     },
     'start': {
         'type': 'string',
         'required': True,
-    }
+    },
+    'depends_on': {
+        'type': 'list',
+        'schema': {
+            'type': 'dict',
+            'schema': {
+                'name': {'type': 'string', 'required': True},
+                'condition': {'type': 'string', 'allowed': ['started', 'healthy', 'ready']},
+                'timeout': {'type': 'integer'},
+            }
+        },
+    },
+    'pool': {
+        'type': 'integer',
+        'min': 0,
+    },
+    'ready': {
+        'type': 'dict',
+        'schema': {
+            'port': {'type': 'integer', 'min': 1},
+            'exec': {'type': 'string'},
+            'log': {'type': 'string'},
+            'timeout': {'type': 'integer', 'min': 0},
+        }
+    },
+    'stop': {
+        'type': 'dict',
+        'schema': {
+            'timeout': {'type': 'integer', 'min': 0},
+            'signal': {'type': 'string'},
+            'force': {'type': 'boolean'},
+        }
+    },
 }
 
 
@@ -99,6 +182,11 @@ TEMPLATE = {
         'options': '-it --hostname HOSTNAME',
     },
     'start': '',
+    'stop': {
+        'timeout': 10,
+        'signal': 'SIGTERM',
+    },
+    'depends_on': [],
     'execs': [
         {
             'name': 'EXEC-NAME',
@@ -109,17 +197,313 @@ TEMPLATE = {
 }
 
 
+def spec_hash(image: str, create: dict, build: str = None) -> str:
+    """
+    Hashes the image and create spec of a config. The spec is normalised first, so that defaults and the order of ports
+    and volumes do not change the hash.
+    :param image: Name of the image.
+    :param create: Create options.
+    :param build: Hash of the build context of the image, for configs that build their image.
+    :return: Hex digest.
+    """
+    import hashlib
+
+    create = create or {}
+    spec = {
+        'image': image,
+        'entrypoint': create.get('entrypoint') or '',
+        'command': create.get('command') or [],
+        'envs': {key: str(value) for key, value in (create.get('envs') or {}).items()},
+        'ports': sorted(f'{port.get("hostIP", "")}:{port["hostPort"]}:{port["containerPort"]}/'
+                        f'{port.get("protocol", "tcp")}' for port in create.get('ports') or []),
+        'volumes': sorted(f'{volume["hostPath"]}:{volume["containerPath"]}:{volume.get("mode", "rw")}'
+                          for volume in create.get('volumes') or []),
+        'options': (create.get('options') or '').split(),
+    }
+    if build is not None:
+        spec['build'] = build
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def resolve_build_context(data: dict, directory: str) -> dict:
+    """
+    Makes a relative build context of a config absolute, so that it does not depend on the directory later commands
+    run in.
+    :param data: Validated environment config.
+    :param directory: Directory relative build contexts are resolved against, usually the one of the config file.
+    :return: Config with an absolute build context.
+    """
+    build = data.get('build')
+    if not build or path.isabs(build['context']):
+        return data
+    context = path.normpath(path.join(path.abspath(directory), build['context']))
+    return dict(data, build=dict(build, context=context))
+
+
+def snapshot_image(name: str, tag: str) -> str:
+    """
+    Returns the image name of an environment snapshot. Docker repositories are lower case.
+    :param name: Name of the environment.
+    :param tag: Tag of the snapshot.
+    :return: Image name.
+    """
+    return f'{SNAPSHOT_REPOSITORY.format(name=name.lower())}:{tag}'
+
+
+def write_json(file_path: str, data: dict):
+    """
+    Writes a json file atomically. The data is written to a hidden file next to it, which then replaces the file.
+    :param file_path: Path of the file.
+    :param data: Data to write.
+    :return: Stat result of the written file.
+    """
+    temp_path = path.join(path.dirname(file_path), f'.{path.basename(file_path)}.tmp')
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            file_stat = fstat(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if path.exists(temp_path):
+            remove(temp_path)
+        raise
+    return file_stat
+
+
+def config_dir() -> str:
+    """
+    Returns the path of the config directory. The config directory inside the package can be replaced with
+    SNOWGLOBE_CONFIG_DIR.
+    :return: Config directory path.
+    """
+    return os.environ.get('SNOWGLOBE_CONFIG_DIR') or path.join(path.dirname(path.abspath(__file__)), 'configs')
+
+
+def store_location(store_name: str = None) -> dict:
+    """
+    Describes the config store a command reads, so that a daemon started with other settings is not asked.
+    :param store_name: Name of the store backend. Read from SNOWGLOBE_STORE if not given, json by default.
+    :return: Dictionary with the store name, the absolute config directory and, for sqlite, the database path.
+    """
+    name = store_name or os.environ.get('SNOWGLOBE_STORE', 'json')
+    config_path = path.abspath(config_dir())
+    location = {'store': name, 'config_dir': config_path}
+    if name == 'sqlite':
+        location['database'] = path.abspath(os.environ.get('SNOWGLOBE_DB') or path.join(config_path, DATABASE_FILE))
+    return location
+
+
+def store_id(store_name: str = None) -> str:
+    """
+    Identifies a config store on the host, so that containers of other stores sharing the docker daemon are told
+    apart.
+    :param store_name: Name of the store backend. Read from SNOWGLOBE_STORE if not given, json by default.
+    :return: Short hex digest of the store location.
+    """
+    import hashlib
+
+    location = json.dumps(store_location(store_name), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(location.encode()).hexdigest()[:16]
+
+
+def get_store(name: str, config_path: str):
+    """
+    Returns a config store backend.
+    :param name: Name of the backend. Either json or sqlite.
+    :param config_path: Path of the config directory.
+    :return: Store object.
+    """
+    if name == 'json':
+        return JsonStore(config_path)
+    if name == 'sqlite':
+        from snowglobe import sqlite_store
+        return sqlite_store.SqliteStore(os.environ.get('SNOWGLOBE_DB') or path.join(config_path, DATABASE_FILE))
+    raise RuntimeError(f'Config store: {name} not supported. Use one of {", ".join(STORES)}')
+
+
+class JsonStore:
+    """
+    JsonStore class. Stores one json file per config. Configs are loaded from an index file kept next to them, which
+    is only rebuilt for the configs that changed since it was written.
+    """
+    def __init__(self, config_path: str):
+        """
+        Loads the index of the config directory.
+        :param config_path: Path of the config directory.
+        """
+        self.CONFIG_PATH = config_path
+        self.INDEX_PATH = path.join(self.CONFIG_PATH, INDEX_FILE)
+        # Held while the index is changed and written, since batch commands use the store from many threads.
+        self.lock = threading.RLock()
+        self.checked = set()
+        self.index = self.load_index()
+
+    @trace.traced('config')
+    def load_index(self) -> dict:
+        """
+        Loads the config index. The index is trusted as long as no config was added, replaced or removed since it was
+        written, which is seen from the modification time of the config directory.
+        :return: Config index.
+        """
+        try:
+            with open(self.INDEX_PATH, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        if index.get('version') != INDEX_VERSION:
+            index = {'version': INDEX_VERSION, 'mtime': None, 'configs': {}}
+        if index['mtime'] != stat(self.CONFIG_PATH).st_mtime_ns:
+            index = self.update_index(index)
+
+        return index
+
+    @trace.traced('config')
+    def update_index(self, index: dict) -> dict:
+        """
+        Rebuilds the config index. Only configs whose modification time or size changed are read again.
+        :param index: Current config index.
+        :return: Updated config index.
+        """
+        # Creating the index file changes the directory, so it has to exist before the directory is looked at.
+        if not path.exists(self.INDEX_PATH):
+            self.write_index(index)
+        mtime = stat(self.CONFIG_PATH).st_mtime_ns
+        configs = {}
+        for entry in scandir(self.CONFIG_PATH):
+            if entry.name.startswith('.') or not entry.name.endswith('.json'):
+                continue
+            conf = entry.name[:-len('.json')]
+            configs[conf] = index['configs'].get(conf)
+            if not self.is_current(configs[conf], entry.stat()):
+                configs[conf] = self.read_config(conf)
+
+        index = {'version': INDEX_VERSION, 'mtime': mtime, 'configs': configs}
+        self.write_index(index)
+        return index
+
+    @trace.traced('config')
+    def write_index(self, index: dict) -> None:
+        """
+        Writes the config index. The index is only a cache, so a config directory that can not be written to is fine.
+        The file is written in place, since replacing it would change the config directory.
+        :param index: Config index.
+        :return: None.
+        """
+        with self.lock:
+            try:
+                with open(self.INDEX_PATH, 'w') as f:
+                    json.dump(index, f)
+            except OSError:
+                pass
+
+    @staticmethod
+    def is_current(entry: dict, file_stat) -> bool:
+        """
+        Checks if an index entry matches the config file.
+        :param entry: Index entry.
+        :param file_stat: Stat result of the config file.
+        :return: True if the entry is up to date.
+        """
+        return entry is not None and entry['mtime'] == file_stat.st_mtime_ns and entry['size'] == file_stat.st_size
+
+    @trace.traced('config')
+    def read_config(self, conf: str) -> dict:
+        """
+        Reads a config file into an index entry.
+        :param conf: Name of the config.
+        :return: Index entry.
+        """
+        with open(path.join(self.CONFIG_PATH, f'{conf}.json'), 'r') as f:
+            file_stat = fstat(f.fileno())
+            return {'mtime': file_stat.st_mtime_ns, 'size': file_stat.st_size, 'data': json.load(f)}
+
+    def names(self) -> set:
+        """
+        Returns the names of all configs.
+        :return: Set of config names.
+        """
+        with self.lock:
+            return set(self.index['configs'])
+
+    def get(self, conf: str) -> dict:
+        """
+        Returns a config. The config file is checked against the index once per process.
+        :param conf: Name of the config.
+        :return: Config data.
+        """
+        with self.lock:
+            if conf not in self.checked:
+                if not self.is_current(self.index['configs'][conf], stat(path.join(self.CONFIG_PATH, f'{conf}.json'))):
+                    self.index['configs'][conf] = self.read_config(conf)
+                    self.write_index(self.index)
+                self.checked.add(conf)
+
+            return self.index['configs'][conf]['data']
+
+    def find(self, image: str) -> set:
+        """
+        Returns the names of the configs using an image.
+        :param image: Name of the image.
+        :return: Set of config names.
+        """
+        with self.lock:
+            return {conf for conf, entry in self.index['configs'].items() if entry['data'].get('image') == image}
+
+    def put(self, conf: str, data: dict) -> None:
+        """
+        Writes a config.
+        :param conf: Name of the config.
+        :param data: Config data.
+        :return: None.
+        """
+        self.put_many({conf: data})
+
+    @trace.traced('config')
+    def put_many(self, configs: dict) -> None:
+        """
+        Writes many configs and updates the index once. Each file is replaced atomically.
+        :param configs: Config data by name.
+        :return: None.
+        """
+        with self.lock:
+            for conf, data in configs.items():
+                file_stat = write_json(path.join(self.CONFIG_PATH, f'{conf}.json'), data)
+                self.index['configs'][conf] = {'mtime': file_stat.st_mtime_ns, 'size': file_stat.st_size, 'data': data}
+                self.checked.add(conf)
+
+            self.index['mtime'] = stat(self.CONFIG_PATH).st_mtime_ns
+            self.write_index(self.index)
+
+    @trace.traced('config')
+    def delete(self, conf: str) -> None:
+        """
+        Deletes a config.
+        :param conf: Name of the config.
+        :return: None.
+        """
+        with self.lock:
+            remove(path.join(self.CONFIG_PATH, f'{conf}.json'))
+
+            del self.index['configs'][conf]
+            self.index['mtime'] = stat(self.CONFIG_PATH).st_mtime_ns
+            self.write_index(self.index)
+
+
 class Config:
     """
-    Config class.
+    Config class. Validates configs and keeps them in a store backend, the json config directory by default.
     """
-    def __init__(self):
+    def __init__(self, store_name: str = None):
         """
-        Sets up the config path and gets the list of installed configs.
+        Sets up the config path and loads the list of installed configs from the store. The config directory inside
+        the package can be replaced with SNOWGLOBE_CONFIG_DIR.
+        :param store_name: Name of the store backend. Read from SNOWGLOBE_STORE if not given, json by default.
         """
-        self.CONFIG_PATH = path.join(path.dirname(path.abspath(__file__)), 'configs')
-        self.confs = {ele.replace('.json', '') for ele in listdir(self.CONFIG_PATH)}
-        self.confs.remove('README')
+        self.CONFIG_PATH = config_dir()
+        self.store = get_store(store_name or os.environ.get('SNOWGLOBE_STORE', 'json'), self.CONFIG_PATH)
+        self.confs = self.store.names()
 
     @staticmethod
     def get_template() -> dict:
@@ -138,8 +522,31 @@ class Config:
         if conf not in self.confs:
             raise RuntimeError('Environment not found')
 
-        with open(path.join(self.CONFIG_PATH, f'{conf}.json'), 'r') as f:
-            return json.load(f)
+        return self.store.get(conf)
+
+    def find_configs(self, image: str) -> list:
+        """
+        Returns the names of the configs using an image.
+        :param image: Name of the image.
+        :return: Sorted list of config names.
+        """
+        return sorted(self.store.find(image))
+
+    @staticmethod
+    @trace.traced('validation')
+    def validate(data: dict) -> dict:
+        """
+        Validates a config.
+        :param data: Config data.
+        :return: Validated config data.
+        """
+        from snowglobe import validator
+
+        errors = validator.validate(SCHEMA, data)
+        if errors:
+            raise RuntimeError(f'Error in config format. Error: {errors}')
+
+        return data
 
     def set_config(self, conf: str, data: dict) -> None:
         """
@@ -148,15 +555,8 @@ class Config:
         :param data: Config data.
         :return: None.
         """
-        validator = Validator(SCHEMA)
-        if not validator.validate(data):
-            raise RuntimeError(f'Error in config format. Error: {validator.errors}')
-
-        with open(path.join(self.CONFIG_PATH, f'{conf}.json'), 'w') as f:
-            json.dump(validator.document, f, indent=4)
-
-        self.confs = [ele.replace('.json', '') for ele in listdir(self.CONFIG_PATH)]
-        self.confs.remove('README')
+        self.store.put(conf, self.validate(data))
+        self.confs.add(conf)
 
     def del_config(self, conf) -> None:
         """
@@ -167,4 +567,53 @@ class Config:
         if conf not in self.confs:
             raise RuntimeError('Environment not found')
 
-        remove(path.join(self.CONFIG_PATH, f'{conf}.json'))
+        self.store.delete(conf)
+        self.confs.discard(conf)
+
+    def load_directory(self, directory: str) -> dict:
+        """
+        Reads and validates every json config of a directory.
+        :param directory: Path of the directory.
+        :return: Config data by name.
+        """
+        configs = {}
+        try:
+            entries = sorted(scandir(directory), key=lambda entry: entry.name)
+        except OSError as ose:
+            raise RuntimeError(f'Config directory: {directory} can not be read. {ose}')
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    data = json.load(f)
+                configs[entry.name[:-len('.json')]] = resolve_build_context(self.validate(data), directory)
+            except (ValueError, RuntimeError) as e:
+                raise RuntimeError(f'Config: {entry.path} can not be imported. {e}')
+        return configs
+
+    def import_configs(self, directory: str, check=None) -> list:
+        """
+        Imports every json config of a directory. All configs are validated and checked before any of them is written.
+        :param directory: Path of the directory.
+        :param check: Function called with the config data by name before anything is written, e.g. to check their
+        dependencies. Raises to stop the import.
+        :return: Sorted list of imported config names.
+        """
+        configs = self.load_directory(directory)
+        if check is not None:
+            check(configs)
+        self.store.put_many(configs)
+        self.confs.update(configs)
+        return sorted(configs)
+
+    def export_configs(self, directory: str) -> list:
+        """
+        Exports every config to a json file in a directory.
+        :param directory: Path of the directory.
+        :return: Sorted list of exported config names.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for conf in sorted(self.confs):
+            write_json(path.join(directory, f'{conf}.json'), self.store.get(conf))
+        return sorted(self.confs)
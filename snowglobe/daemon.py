@@ -0,0 +1,275 @@
+from snowglobe import environment, config, trace
+import contextlib
+import threading
+import socket
+import json
+import stat
+import time
+import io
+import os
+
+
+# Read only commands served by the daemon.
+COMMANDS = {'list', 'status', 'inspect'}
+
+# Seconds the CLI waits for an answer of the daemon before running the command itself.
+QUERY_TIMEOUT = 2
+
+# Seconds between attempts to follow the docker events stream again after it ended.
+RECONNECT_INTERVAL = 1
+
+# Container events that change the state shown by the status command.
+STATE_ACTIONS = {'create', 'start', 'restart', 'die', 'stop', 'kill', 'pause', 'unpause', 'update', 'destroy',
+                 'rename'}
+
+
+def socket_directory() -> str:
+    """
+    Returns the private directory of the snowglobe sockets, snowglobe-UID in $XDG_RUNTIME_DIR or the temp directory.
+    It is created with mode 0700 so that other users can not put their own sockets in it.
+    :return: Directory path.
+    """
+    parent = os.environ.get('XDG_RUNTIME_DIR')
+    if not parent:
+        import tempfile
+        parent = tempfile.gettempdir()
+    directory = os.path.join(parent, f'snowglobe-{os.getuid()}')
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    directory_stat = os.lstat(directory)
+    if not stat.S_ISDIR(directory_stat.st_mode) or directory_stat.st_uid != os.getuid() or \
+            directory_stat.st_mode & 0o077:
+        raise RuntimeError(f'Socket directory: {directory} is not a private directory of the current user')
+    return directory
+
+
+def socket_path() -> str:
+    """
+    Returns the path of the unix socket of the daemon. Set SNOWGLOBE_SOCKET to use another path.
+    :return: Socket path.
+    """
+    if 'SNOWGLOBE_SOCKET' in os.environ:
+        return os.environ['SNOWGLOBE_SOCKET']
+    return os.path.join(socket_directory(), 'daemon.sock')
+
+
+def connect(connection: socket.socket, path: str) -> None:
+    """
+    Connects to a snowglobe unix socket. Sockets of other users are not trusted, since they could answer anything.
+    :param connection: Unix socket.
+    :param path: Socket path.
+    :return: None.
+    """
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f'Socket: {path} is not owned by the current user')
+    connection.connect(path)
+
+
+def send(request: dict) -> dict:
+    """
+    Sends a request to a running daemon.
+    :param request: Request dictionary.
+    :return: Response dictionary, or None if no daemon is running.
+    """
+    try:
+        with trace.span('daemon query', 'daemon', command=request.get('command')), \
+                socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(QUERY_TIMEOUT)
+            connect(connection, socket_path())
+            connection.sendall(json.dumps(request).encode() + b'\n')
+            data = b''
+            while not data.endswith(b'\n'):
+                chunk = connection.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data.decode())
+    except (OSError, ValueError, RuntimeError):
+        return None
+
+
+def query(command: str, name: str = None, image: str = None, store: dict = None) -> str:
+    """
+    Asks a running daemon for the output of a read only command.
+    :param command: Name of the command. One of list, status or inspect.
+    :param name: Name of the environment, for the inspect command.
+    :param image: Image filter, for the list command.
+    :param store: Location of the config store the command reads, as returned by config.store_location. The current
+    settings are used if not given.
+    :return: Output of the command, or None if no daemon is running or the daemon serves another config store.
+    """
+    response = send({'command': command, 'name': name, 'image': image,
+                     'store': store or config.store_location()})
+    if response is None or 'refused' in response:
+        return None
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+    return response['output']
+
+
+class StateCache:
+    """
+    StateCache class. Keeps the state of docker containers up to date from the docker events stream.
+    """
+    def __init__(self, runtime):
+        """
+        Initialises the cache. Containers are inspected the first time they are asked for, and again on every event
+        that changes their state.
+        :param runtime: Runtime object.
+        """
+        self.runtime = runtime
+        self.containers = {}
+        self.lock = threading.Lock()
+
+    def watch(self, events) -> None:
+        """
+        Applies a stream of docker events to the cache. Once the stream ends changes can be missed, so the cache is
+        emptied.
+        :param events: Iterable of docker event dictionaries.
+        :return: None.
+        """
+        for event in events:
+            self.handle(event)
+        with self.lock:
+            self.containers.clear()
+
+    def handle(self, event: dict) -> None:
+        """
+        Applies a single docker event to the cache. The container is inspected without holding the lock.
+        :param event: Docker event dictionary.
+        :return: None.
+        """
+        if event.get('Type') != 'container' or event.get('Action') not in STATE_ACTIONS:
+            return
+
+        attributes = event.get('Actor', {}).get('Attributes', {})
+        name = attributes.get('name')
+        if event['Action'] == 'destroy':
+            with self.lock:
+                self.containers[name] = None
+            return
+        try:
+            states = self.runtime.states([name])
+        except RuntimeError:
+            states = None
+        with self.lock:
+            if event['Action'] == 'rename':
+                self.containers[attributes.get('oldName', '').lstrip('/')] = None
+            if states is None:
+                # Inspected again the next time it is asked for.
+                self.containers.pop(name, None)
+            else:
+                self.containers[name] = states.get(name)
+
+    def status(self, names: list) -> dict:
+        """
+        Returns the status of containers from the cache. Same format as Runtime.status. Containers missing from the
+        cache are inspected with a single call, without holding the lock.
+        :param names: Names of the containers.
+        :return: Status dictionary for each container name.
+        """
+        from snowglobe import runtime
+
+        with self.lock:
+            missing = [name for name in names if name not in self.containers]
+        states = self.runtime.states(missing) if missing else {}
+        with self.lock:
+            for name in missing:
+                # An event handled in the meantime has the newer state.
+                self.containers.setdefault(name, states.get(name))
+            containers = {name: self.containers.get(name) for name in names}
+        return {name: runtime.make_status(**container) for name, container in containers.items() if container}
+
+
+class Daemon:
+    """
+    Daemon class. Serves the read only commands of snowglobe over a unix socket.
+    """
+    def __init__(self, runtime, events, store_name: str = None):
+        """
+        Initialises the daemon.
+        :param runtime: Runtime object.
+        :param events: Function returning an iterable of docker events. Called again whenever the iterable ends.
+        :param store_name: Name of the config store backend.
+        """
+        self.cache = StateCache(runtime)
+        self.events = events
+        self.store_name = store_name
+        self.location = config.store_location(store_name)
+
+    def follow(self) -> None:
+        """
+        Follows the docker events stream for as long as the daemon runs.
+        :return: None.
+        """
+        while True:
+            try:
+                self.cache.watch(self.events())
+            except Exception:
+                with self.cache.lock:
+                    self.cache.containers.clear()
+            time.sleep(RECONNECT_INTERVAL)
+
+    def answer(self, request: dict) -> dict:
+        """
+        Runs a read only command against the cache and captures its output.
+        :param request: Request with the command and the environment name.
+        :return: Response with the output or the error of the command.
+        """
+        if request.get('command') not in COMMANDS:
+            return {'error': f'Command: {request.get("command")} is not served by the daemon'}
+        if request.get('store') != self.location:
+            # The client reads another config store, so it runs the command itself.
+            return {'refused': f'The daemon serves the config store in: {self.location["config_dir"]}'}
+
+        snowglobe = environment.Environment(store_name=self.store_name)
+        snowglobe.runtime = self.cache
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                if request['command'] == 'inspect':
+                    snowglobe.inspect(request['name'])
+                elif request['command'] == 'list':
+                    snowglobe.list(request.get('image'))
+                else:
+                    snowglobe.status()
+        except RuntimeError as re:
+            return {'error': str(re)}
+        return {'output': output.getvalue()}
+
+    def serve(self) -> None:
+        """
+        Follows docker events in the background and answers requests on the unix socket until interrupted.
+        Requests are answered one at a time.
+        :return: None.
+        """
+        import socketserver
+
+        path = socket_path()
+        if send({'command': 'list', 'store': self.location}) is not None:
+            raise RuntimeError(f'A daemon is already listening on {path}')
+        if os.path.exists(path):
+            os.remove(path)
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    response = daemon.answer(json.loads(self.rfile.readline().decode()))
+                except ValueError:
+                    response = {'error': 'Invalid request'}
+                self.wfile.write(json.dumps(response).encode() + b'\n')
+
+        threading.Thread(target=self.follow, daemon=True).start()
+        with socketserver.UnixStreamServer(path, Handler) as server:
+            os.chmod(path, 0o600)
+            print(f'Listening on: {path}')
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(path)
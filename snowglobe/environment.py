@@ -1,33 +1,227 @@
-from snowglobe import config, runtime
+from snowglobe import config, planner, trace
+import threading
 import json
+import time
+import sys
+import os
+
+
+# Seconds to wait for a dependency to meet its condition.
+DEPENDENCY_TIMEOUT = 60
+
+
+def dependency_levels(names: list, get_dependencies) -> list:
+    """
+    Groups environments and all of their dependencies into levels, each environment once. Environments only depend on
+    environments of earlier levels, so all environments of a level can be started together. A single environment is
+    alone in the last level.
+    :param names: Names of the environments.
+    :param get_dependencies: Function returning the names of the direct dependencies of an environment.
+    :return: List of levels.
+    """
+    depths = {}
+
+    def depth(conf: str, path: list) -> int:
+        if conf in path:
+            raise RuntimeError(f'Dependency cycle: {" -> ".join(path[path.index(conf):] + [conf])}')
+        if conf not in depths:
+            depths[conf] = 1 + max((depth(dependency, path + [conf]) for dependency in get_dependencies(conf)),
+                                   default=-1)
+        return depths[conf]
+
+    levels = [[] for _ in range(max((depth(name, []) for name in names), default=-1) + 1)]
+    for conf, level in sorted(depths.items()):
+        levels[level].append(conf)
+    return levels
+
+
+def spare_containers(name: str, containers: dict, spec: str = None) -> list:
+    """
+    Returns the spare containers of an environment, i.e. containers created for its pool that are not in use.
+    :param name: Name of the environment container.
+    :param containers: Container list by name, as returned by Runtime.containers.
+    :param spec: Only return spares with this spec hash.
+    :return: Sorted list of container names.
+    """
+    return sorted(
+        container for container, details in containers.items()
+        if container != name and not details['running'] and details['labels'].get(config.POOL_LABEL) == name and
+        (spec is None or details['labels'].get(config.SPEC_LABEL) == spec)
+    )
+
+
+def stop_settings(env: dict) -> dict:
+    """
+    Returns the stop settings of an environment config as arguments of Runtime.stop and Runtime.restart.
+    :param env: Environment config.
+    :return: Dictionary of the timeout and signal.
+    """
+    stop = (env or {}).get('stop') or {}
+    return {'timeout': stop.get('timeout'), 'signal': stop.get('signal')}
+
+
+def error_message(error: Exception) -> str:
+    """
+    Describes an error for the summary of a command on many environments, with the kind of docker error if it is one,
+    e.g. a timeout.
+    :param error: Exception.
+    :return: Error message.
+    """
+    title = getattr(error, 'title', None)
+    return f'{title}: {error}' if title else str(error)
+
+
+def format_table(header: list, rows: list) -> str:
+    """
+    Formats rows into left aligned columns.
+    :param header: Column titles.
+    :param rows: List of rows.
+    :return: Table.
+    """
+    rows = [header] + [[str(cell) for cell in row] for row in rows]
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    return '\n'.join('   '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows)
 
 
 class Environment:
     """
     Environment class. Holds functions for all snowglobe commands.
     """
-    def __init__(self):
+    def __init__(self, runtime_name: str = 'cli', dry_run: bool = False, store_name: str = None):
         """
-        Initialises environment and config objects
+        Initialises the environment. The runtime and config objects are created when they are first used.
+        :param runtime_name: Name of the runtime backend. Either cli or api.
+        :param dry_run: Print the planned operations of commands instead of running them.
+        :param store_name: Name of the config store backend. Either json or sqlite.
         """
-        self.runtime = runtime.Runtime()
-        self.config = config.Config()
+        self.runtime_name = runtime_name
+        self.dry_run = dry_run
+        self.store_name = store_name
+        self._runtime = None
+        self._config = None
+        self._store = None
+        self._pulls = {}
+        self._pulls_lock = threading.Lock()
+        self._build_hashes = {}
+        self._build_locks = {}
+        self._build_locks_lock = threading.Lock()
 
-    def list(self) -> None:
+    @property
+    def runtime(self):
+        """
+        Returns the runtime object. The runtime module is only imported by commands that talk to docker.
+        :return: Runtime object.
+        """
+        if self._runtime is None:
+            from snowglobe import runtime
+            self._runtime = runtime.get_runtime(self.runtime_name)
+        return self._runtime
+
+    @runtime.setter
+    def runtime(self, runtime) -> None:
+        """
+        Replaces the runtime object, e.g. with the state cache of the snowglobe daemon.
+        :param runtime: Runtime object.
+        :return: None.
+        """
+        self._runtime = runtime
+
+    @property
+    def config(self) -> config.Config:
+        """
+        Returns the config object.
+        :return: Config object.
+        """
+        if self._config is None:
+            self._config = config.Config(self.store_name)
+        return self._config
+
+    @property
+    def store(self) -> str:
+        """
+        Returns the id of the config store, which labels the containers created from it.
+        :return: Store id.
+        """
+        if self._store is None:
+            self._store = config.store_id(self.store_name)
+        return self._store
+
+    @trace.traced('environment')
+    def list(self, image: str = None) -> None:
         """
         Prints the list of existing environments.
+        :param image: Only list the environments using this image.
         :return: None.
         """
         print('Environments:')
-        print('\n'.join(self.config.confs))
+        print('\n'.join(self.config.find_configs(image) if image else self.config.confs))
+
+    @trace.traced('environment')
+    def status(self) -> None:
+        """
+        Prints the container status of every environment, fetched from docker in a single call.
+        :return: None.
+        """
+        names = sorted(self.config.confs)
+        statuses = self.runtime.status(names) if names else {}
+
+        rows = []
+        for name in names:
+            status = statuses.get(name, {'state': 'missing', 'uptime': '', 'image': '', 'ports': ''})
+            image = status['image'].replace('sha256:', '')[:12]
+            rows.append([name, status['state'], status['uptime'], image, status['ports']])
+        print(format_table(['NAME', 'STATE', 'UPTIME', 'IMAGE', 'PORTS'], rows))
+
+    def top(self, window: float = None, count: int = None) -> None:
+        """
+        Prints the cpu and memory usage of every environment, with averages and peaks over a window, after every
+        refresh of a single docker stats stream.
+        :param window: Minutes of history used for averages and peaks.
+        :param count: Number of refreshes printed. Follows the stream until interrupted if None.
+        :return: None.
+        """
+        from snowglobe import monitor, runtime
+
+        names = sorted(self.config.confs)
+        histories = {name: monitor.History(window or monitor.WINDOW) for name in names}
+        clear = '\x1b[H\x1b[2J' if sys.stdout.isatty() else ''
+        header = ['NAME', 'CPU', 'AVG CPU', 'PEAK CPU', 'MEMORY', 'AVG MEMORY', 'PEAK MEMORY', 'LIMIT']
+
+        printed = 0
+        try:
+            for frame in self.runtime.stats():
+                now = time.monotonic()
+                for name, usage in frame.items():
+                    if name in histories:
+                        histories[name].add(now, usage['cpu'], usage['memory'], usage['limit'])
+
+                rows = []
+                for name in names:
+                    summary = histories[name].summary(now)
+                    if summary is None:
+                        rows.append([name] + ['-'] * (len(header) - 1))
+                        continue
+                    rows.append([name] + [f'{summary[key]:.2f}%' for key in ('cpu', 'cpu_average', 'cpu_peak')] +
+                                [runtime.human_size(summary[key])
+                                 for key in ('memory', 'memory_average', 'memory_peak', 'limit')])
+                print(clear + format_table(header, rows), flush=True)
 
+                printed += 1
+                if count is not None and printed >= count:
+                    break
+        except KeyboardInterrupt:
+            # Following the stream until interrupted is the normal way to end the command.
+            return
+
+    @trace.traced('environment')
     def template(self) -> None:
         """
         Prints the template config.
         :return: None.
         """
-        print(json.dumps(self.config.get_template(), indent=4))
+        print(json.dumps(config.Config.get_template(), indent=4))
 
+    @trace.traced('environment')
     def inspect(self, name: str) -> None:
         """
         Prints the config of a specific environment.
@@ -36,101 +230,819 @@ class Environment:
         """
         print(json.dumps(self.config.get_config(name), indent=4))
 
-    def setup(self, name: str, data: dict) -> None:
+    @trace.traced('environment')
+    def import_configs(self, directory: str) -> None:
+        """
+        Imports every json config of a directory into the config store.
+        :param directory: Path of the directory.
+        :return: None.
+        """
+        names = self.config.import_configs(directory, self.check_dependencies)
+        print(f'Imported {len(names)} environments from: {directory}')
+
+    @trace.traced('environment')
+    def export_configs(self, directory: str) -> None:
+        """
+        Exports every config of the config store to json files in a directory.
+        :param directory: Path of the directory.
+        :return: None.
+        """
+        names = self.config.export_configs(directory)
+        print(f'Exported {len(names)} environments to: {directory}')
+
+    @trace.traced('environment')
+    def setup(self, name: str, data: dict, directory: str = None) -> None:
         """
         Creates a new environment.
         :param name: Name of the environment.
         :param data: Environment config.
+        :param directory: Directory of the config file. A relative build context is resolved against it, or against
+        the current directory if not given, and stored as an absolute path.
         :return: None.
         """
         print(f'Setting up environment: {name}')
-        self.config.set_config(name, data)
-        self.create(name)
+        self.config.validate(data)
+        data = config.resolve_build_context(data, directory or os.getcwd())
+        if not data.get('build'):
+            self.warm_up(data.get('image'))
+        self.check_dependencies({name: data})
+        self.run('setup', name, env=data)
+
+    def check_dependencies(self, configs: dict, stored: bool = True) -> None:
+        """
+        Checks that new environment configs do not add a dependency cycle, among themselves or with the configs of the
+        config store. Dependencies that are not set up yet are allowed.
+        :param configs: Environment configs by name.
+        :param stored: The new configs are added to the config store instead of replacing it.
+        :return: None.
+        """
+        def get_dependencies(conf: str) -> list:
+            if conf in configs:
+                env = configs[conf]
+            elif stored and conf in self.config.confs:
+                env = self.config.get_config(conf)
+            else:
+                return []
+            return [dependency['name'] for dependency in env.get('depends_on', [])]
 
+        dependency_levels(sorted(configs), get_dependencies)
+
+    @trace.traced('environment')
     def remove(self, name: str) -> None:
         """
-        Deletes an environment.
+        Deletes an environment, together with the spare containers of its pool.
         :param name: Name of the environment.
         :return: None.
         """
         print(f'Removing environment: {name}')
-        self.stop(name)
-        self.delete(name)
-        self.config.del_config(name)
+        env = self.config.get_config(name)
+        self.run('remove', name, env=env)
+        if env.get('pool'):
+            self.fill_pool(env, 0)
 
-    def reset(self, name: str) -> None:
+    @trace.traced('environment')
+    def reset(self, name: str, force: bool = False, snapshot: str = None) -> None:
         """
-        Resets an environment.
+        Resets an environment. The container is only recreated if its spec changed, otherwise it is restarted.
+        A container reset from a snapshot is always recreated, from the snapshot image with the create options of the
+        config.
         :param name: Name of the environment.
+        :param force: Always recreate the container.
+        :param snapshot: Tag of the snapshot to reset to.
         :return: None.
         """
+        image = None
+        if snapshot is not None:
+            image = config.snapshot_image(name, snapshot)
+            if image not in {item['image'] for item in self.runtime.snapshots(name)}:
+                raise RuntimeError(f'Snapshot: {snapshot} of environment: {name} not found')
+
         print(f'Resetting environment: {name}')
-        self.stop(name)
-        self.delete(name)
-        self.create(name)
+        self.run('reset', name, force=force, image=image)
 
-    def create(self, name: str) -> None:
+    @trace.traced('environment')
+    def pool(self, name: str, size: int = None) -> None:
         """
-        Creates the docker container for an environment.
+        Prints how many spare containers of an environment are ready. With a size, the size is written to the config
+        and the pool is filled up to it first.
         :param name: Name of the environment.
+        :param size: New pool size. The pool is only shown if not given.
         :return: None.
         """
         env = self.config.get_config(name)
-        try:
-            self.runtime.inspect(env['name'])
-        except RuntimeError:
-            print(f'Creating container: {env["name"]}')
-            self.runtime.create(env['name'], env['image'], env['create'])
-        else:
-            raise RuntimeError(f'Container: {env["name"]} already exists. Reset if needed.')
+        if size is None:
+            self.print_pool(env, env.get('pool', 0), self.spec(env))
+            return
+        if size != env.get('pool', 0) and not self.dry_run:
+            env['pool'] = size
+            self.config.set_config(name, env)
+        self.fill_pool(env, size)
 
-    def start(self, name: str) -> None:
+    def print_pool(self, env: dict, size: int, spec: str) -> None:
         """
-        Starts the docker container.
+        Counts the spare containers of an environment with the current spec by their labels and prints the count.
+        :param env: Environment config.
+        :param size: Pool size.
+        :param spec: Current spec hash of the environment.
+        :return: None.
+        """
+        spares = spare_containers(env['name'], self.runtime.containers(), spec)
+        print(f'Pool of environment: {env["name"]}: {len(spares)} of {size} spare containers ready')
+
+    def fill_pool(self, env: dict, size: int) -> None:
+        """
+        Creates stopped spare containers of an environment until the given number of them have the current spec.
+        Spares with an old spec and spares beyond the size are removed.
+        :param env: Environment config.
+        :param size: Number of spare containers.
+        :return: None.
+        """
+        import secrets
+
+        spec = self.spec(env)
+        containers = self.runtime.containers()
+        spares = spare_containers(env['name'], containers)
+        ready = [spare for spare in spares if containers[spare]['labels'].get(config.SPEC_LABEL) == spec][:size]
+        removed = [spare for spare in spares if spare not in ready]
+        created = [f'{env["name"]}-spare-{secrets.token_hex(4)}' for _ in range(size - len(ready))]
+
+        if self.dry_run:
+            print(f'Plan for pool: {env["name"]}')
+            steps = [f'  remove {spare}' for spare in removed] + [f'  create spare {spare}' for spare in created]
+            print('\n'.join(steps) or '  nothing to do')
+            return
+
+        for spare in removed:
+            print(f'Deleting spare container: {spare}')
+            self.runtime.remove(spare)
+        options = {}
+        if env.get('build') and created:
+            self.build_image(env)
+            options['spec'] = spec
+        for spare in created:
+            print(f'Creating spare container: {spare}')
+            self.runtime.create(spare, env['image'], env['create'], labels={config.POOL_LABEL: env['name']},
+                                store=self.store, **options)
+        self.print_pool(env, size, spec)
+
+    def refill_pool(self, name: str, size: int) -> None:
+        """
+        Refills the pool of an environment in a detached snowglobe process, so that the calling command does not wait
+        for the containers to be created.
         :param name: Name of the environment.
+        :param size: Pool size.
         :return: None.
         """
-        env = self.config.get_config(name)
-        try:
-            self.runtime.inspect(env['name'])
-        except RuntimeError:
-            self.create(name)
+        import subprocess
 
-        print(f'Starting container: {env["name"]}')
-        self.runtime.start(env['name'], env['start'])
+        cmd = [sys.executable, '-m', 'snowglobe', '--runtime', self.runtime_name]
+        if self.store_name is not None:
+            cmd.extend(['--store', self.store_name])
+        cmd.extend(['pool', name, '--size', str(size)])
+        subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        print(f'Refilling pool of environment: {name} in the background')
 
-    def exec(self, name: str, exec_name: str) -> None:
+    @trace.traced('environment')
+    def snapshot(self, name: str, tag: str = None) -> None:
         """
-        Executes a command on the docker container.
+        Commits the container of an environment to a snapshot image, to reset the environment to later.
         :param name: Name of the environment.
-        :param exec_name: Name of the exec profile.
+        :param tag: Tag of the snapshot. Defaults to the current time.
         :return: None.
         """
+        from datetime import datetime, timezone
+
         env = self.config.get_config(name)
+        tag = tag or datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        image = config.snapshot_image(name, tag)
+        if self.dry_run:
+            print(f'Plan for snapshot: {name}')
+            print(f'  commit {env["name"]} to {image}')
+            return
+
+        print(f'Committing container: {env["name"]}')
+        self.runtime.commit(env['name'], image, name)
+        print(f'Created snapshot: {tag} of environment: {name}')
+
+    @trace.traced('environment')
+    def snapshots(self, name: str = None, prune: bool = False, keep: int = 1) -> None:
+        """
+        Prints the snapshots of an environment, or of all environments, newest first. Pruning removes all but the newest
+        snapshots of each environment.
+        :param name: Name of the environment. Snapshots of all environments are listed if not given.
+        :param prune: Remove old snapshots.
+        :param keep: Number of snapshots kept per environment when pruning.
+        :return: None.
+        """
+        snapshots = sorted(self.runtime.snapshots(name), key=lambda snapshot: snapshot['created'], reverse=True)
+        if not prune:
+            rows = [[snapshot['image'], snapshot['created'], snapshot['size']] for snapshot in snapshots]
+            print(format_table(['IMAGE', 'CREATED', 'SIZE'], rows))
+            return
+
+        kept = {}
+        images = []
+        for snapshot in snapshots:
+            repository = snapshot['image'].rsplit(':', 1)[0]
+            kept[repository] = kept.get(repository, 0) + 1
+            if kept[repository] > keep:
+                images.append(snapshot['image'])
+
+        if self.dry_run:
+            print('Plan for snapshot prune:')
+            print('\n'.join(f'  remove image {image}' for image in images) or '  nothing to do')
+            return
+
+        for image in images:
+            print(f'Removing snapshot: {image}')
+            self.runtime.remove_image(image)
+
+    @trace.traced('environment')
+    def batch(self, command: str, names: list, jobs: int, **options) -> bool:
+        """
+        Runs a command on many environments on a pool of workers and prints a summary.
+        Errors are collected per environment instead of stopping the other environments. Start is run by start_all, so
+        that shared dependencies are started once.
+        :param command: Name of the command. One of start, stop, reset or remove.
+        :param names: Names of the environments.
+        :param jobs: Maximum number of environments handled at the same time.
+        :param options: Options of the command, e.g. force for reset.
+        :return: True if the command succeeded on every environment.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if command == 'start':
+            return self.start_all(names, jobs, **options)
+        action = getattr(self, command)
+
+        def run(name: str) -> list:
+            started = time.monotonic()
+            try:
+                action(name, **options)
+            except Exception as e:
+                return [name, 'failed', f'{time.monotonic() - started:.1f}s', error_message(e)]
+            return [name, 'ok', f'{time.monotonic() - started:.1f}s', '']
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            rows = list(pool.map(run, names))
+
+        print(format_table(['NAME', 'RESULT', 'TIME', 'ERROR'], rows))
+        return all(row[1] == 'ok' for row in rows)
+
+    @trace.traced('environment')
+    def exec_all(self, names: list, exec_name: str, jobs: int) -> bool:
+        """
+        Runs an exec profile on many environments on a pool of workers. The output is streamed line by line, prefixed
+        with the environment name, and a summary with the exit code and duration of each environment is printed at the
+        end. Interactive options of the profile are dropped.
+        :param names: Names of the environments.
+        :param exec_name: Name of the exec profile.
+        :param jobs: Maximum number of environments handled at the same time.
+        :return: True if the profile exited with 0 on every environment.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if self.dry_run:
+            print(f'Plan for exec: {exec_name}')
+            print('\n'.join(f'  exec {name} {exec_name}' for name in names))
+            return True
+
+        width = max(len(name) for name in names)
+        lock = threading.Lock()
+
+        def output(name: str, line: str) -> None:
+            with lock:
+                print(f'{name:<{width}} | {line}', flush=True)
+
+        def run(name: str) -> list:
+            started = time.monotonic()
+            try:
+                env = self.config.get_config(name)
+                code = self.runtime.exec_stream(env['name'], exec_name, env['execs'],
+                                                lambda line: output(name, line))
+            except Exception as e:
+                return [name, 'failed', '', f'{time.monotonic() - started:.1f}s', error_message(e)]
+            return [name, 'ok' if code == 0 else 'failed', str(code), f'{time.monotonic() - started:.1f}s', '']
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            rows = list(pool.map(run, names))
+
+        print(format_table(['NAME', 'RESULT', 'EXIT', 'TIME', 'ERROR'], rows))
+        return all(row[1] == 'ok' for row in rows)
+
+    @trace.traced('environment')
+    def pull(self, names: list, jobs: int) -> bool:
+        """
+        Pulls the images of many environments on a pool of workers and prints a summary. Every image is pulled once,
+        however many environments use it.
+        :param names: Names of the environments.
+        :param jobs: Maximum number of images pulled at the same time.
+        :return: True if every image was pulled.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        images = {}
+        for name in names:
+            env = self.config.get_config(name)
+            # Images of a build section are built on create.
+            if not env.get('build'):
+                images.setdefault(env['image'], []).append(name)
+
+        if self.dry_run:
+            print('Plan for pull:')
+            print('\n'.join(f'  pull image {image}' for image in images) or '  nothing to do')
+            return True
+
+        def run(image: str) -> list:
+            started = time.monotonic()
+            try:
+                print(f'Pulling image: {image}')
+                self.runtime.pull(image)
+            except Exception as e:
+                return [image, ', '.join(images[image]), 'failed', f'{time.monotonic() - started:.1f}s',
+                        error_message(e)]
+            return [image, ', '.join(images[image]), 'ok', f'{time.monotonic() - started:.1f}s', '']
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            rows = list(pool.map(run, images))
+
+        print(format_table(['IMAGE', 'ENVIRONMENTS', 'RESULT', 'TIME', 'ERROR'], rows))
+        return all(row[2] == 'ok' for row in rows)
+
+    @trace.traced('environment')
+    def reconcile(self, directory: str = None, jobs: int = 4) -> bool:
+        """
+        Makes docker match the environment configs from a single list of all containers. Missing containers are
+        created, changed ones recreated and orphaned snowglobe containers removed, in parallel. With a directory, the
+        config store is first made to match the json configs in it.
+        In dry run mode the plan is printed instead.
+        :param directory: Path of a directory of json configs. The config store is used if not given.
+        :param jobs: Maximum number of containers handled at the same time.
+        :return: True if every container was reconciled.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        config_steps = []
+        if directory is None:
+            configs = {conf: self.config.get_config(conf) for conf in sorted(self.config.confs)}
+        else:
+            configs = self.config.load_directory(directory)
+            self.check_dependencies(configs, stored=False)
+            config_steps = [('write_config', conf) for conf, env in configs.items()
+                            if conf not in self.config.confs or self.config.get_config(conf) != env]
+            config_steps += [('delete_config', conf) for conf in sorted(self.config.confs - set(configs))]
+
+        envs = {env['name']: env for env in configs.values()}
+        specs = {name: self.spec(env) for name, env in envs.items()}
+        plans = planner.reconcile(envs, self.runtime.containers(), specs, self.store)
+
+        if self.dry_run:
+            steps = config_steps + [step for steps in plans.values() for step in steps]
+            print('Plan for apply:')
+            print('\n'.join(f'  {planner.describe(step)}' for step in steps) or '  nothing to do')
+            return True
+
+        for step in config_steps:
+            self.apply(step, configs.get(step[1]))
+
+        def run(name: str) -> list:
+            started = time.monotonic()
+            try:
+                for step in plans[name]:
+                    self.apply(step, envs.get(name, {'name': name}))
+            except Exception as e:
+                return [name, 'failed', f'{time.monotonic() - started:.1f}s', error_message(e)]
+            return [name, 'ok', f'{time.monotonic() - started:.1f}s', '']
+
+        if not plans:
+            print('Nothing to do')
+            return True
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            rows = list(pool.map(run, plans))
+
+        print(format_table(['NAME', 'RESULT', 'TIME', 'ERROR'], rows))
+        return all(row[1] == 'ok' for row in rows)
+
+    @trace.traced('environment')
+    def run(self, command: str, name: str, args: tuple = (), env: dict = None, replace: bool = False,
+            force: bool = False, image: str = None) -> None:
+        """
+        Plans a command from a single snapshot of the container state and runs the planned steps.
+        In dry run mode the plan is printed instead.
+        :param command: Name of the command.
+        :param name: Name of the environment.
+        :param args: Command arguments.
+        :param env: Environment config. Read from the config store if not given.
+        :param replace: Let an interactive last step replace the snowglobe process.
+        :param force: Always recreate the container on reset.
+        :param image: Image to recreate the container from on reset, e.g. a snapshot.
+        :return: None.
+        """
+        env = env if env is not None else self.config.get_config(name)
+        # Only start and reset compare specs, which hashes the build context of configs with a build section.
+        spec = self.spec(env) if command in ('start', 'reset') else None
+        spare = None
+        if command == 'reset' and image is None and env.get('pool'):
+            spares = spare_containers(env['name'], self.runtime.containers(), spec)
+            spare = spares[0] if spares else None
+        steps = planner.plan(command, name, self.container_state(env['name']), *args, spec=spec, force=force,
+                             image=image, spare=spare, kill=planner.kills(env))
+
+        if self.dry_run:
+            print(f'Plan for {command}: {name}')
+            print('\n'.join(f'  {planner.describe(step)}' for step in steps) or '  nothing to do')
+            return
+
+        if ('create', name) in steps[1:] and not env.get('build'):
+            # The image is pulled while the old container is taken down.
+            self.warm_up(env.get('image'))
+        for index, step in enumerate(steps):
+            self.apply(step, env, replace and index == len(steps) - 1)
+        if any(step[0] == 'swap' for step in steps):
+            self.refill_pool(name, env.get('pool', 0))
+
+    def container_state(self, name: str) -> dict:
+        """
+        Returns the current state of a docker container.
+        :param name: Name of the docker container.
+        :return: Inspect dictionary, or None if the container does not exist.
+        """
+        from snowglobe import runtime
+
         try:
-            self.runtime.inspect(env['name'])
+            return self.runtime.inspect(name)
+        except runtime.DockerError:
+            # A daemon that does not answer says nothing about the container.
+            raise
         except RuntimeError:
-            self.create(name)
+            return None
+
+    def spec(self, env: dict) -> str:
+        """
+        Returns the spec hash of an environment config. The spec of a config with a build section includes the hash of
+        its build context, so that containers are recreated when the image has to be built again.
+        :param env: Environment config.
+        :return: Hex digest.
+        """
+        if not env.get('build'):
+            return config.spec_hash(env.get('image'), env.get('create'))
+        return config.spec_hash(env.get('image'), env.get('create'), self.build_hash(env))
+
+    def build_hash(self, env: dict) -> str:
+        """
+        Hashes the build context of an environment config, once per command. Digests of unchanged files are read from
+        the build cache in the config directory.
+        :param env: Environment config.
+        :return: Hex digest.
+        """
+        from snowglobe import build
+
+        if env['name'] not in self._build_hashes:
+            cache = build.HashCache(os.path.join(self.config.CONFIG_PATH, config.BUILD_CACHE_FILE))
+            self._build_hashes[env['name']] = build.context_hash(
+                env['build']['context'], env['build'].get('dockerfile'), env['build'].get('args'), cache)
+        return self._build_hashes[env['name']]
+
+    def build_image(self, env: dict) -> None:
+        """
+        Builds the image of an environment config with a build section, unless the image was already built from the
+        same build context. Builds of the same image run one at a time, so environments sharing an image build it once.
+        Different images build in parallel.
+        :param env: Environment config.
+        :return: None.
+        """
+        build_hash = self.build_hash(env)
+        with self._build_locks_lock:
+            lock = self._build_locks.setdefault(env['image'], threading.Lock())
+        with lock:
+            labels = self.runtime.image_labels(env['image'])
+            if labels is not None and labels.get(config.BUILD_LABEL) == build_hash:
+                return
+            print(f'Building image: {env["image"]}')
+            dockerfile = env['build'].get('dockerfile')
+            context = env['build']['context']
+            self.runtime.build(env['image'], context, os.path.join(context, dockerfile) if dockerfile else None,
+                               env['build'].get('args'), {config.MANAGED_LABEL: 'true', config.BUILD_LABEL: build_hash})
+
+    def warm_up(self, image: str) -> None:
+        """
+        Pulls an image in the background if it is not available locally, so that the pull overlaps with the work done
+        before the container is created. Every image is pulled once at a time. Errors are left to the create, which
+        pulls missing images itself.
+        :param image: Name of the image.
+        :return: None.
+        """
+        if self.dry_run or not image:
+            return
+        runtime = self.runtime
+        with self._pulls_lock:
+            if image in self._pulls and not self._pulls[image].is_set():
+                return
+            done = self._pulls[image] = threading.Event()
+
+        def pull() -> None:
+            try:
+                with trace.span('warm up', 'environment', image=image):
+                    if not runtime.has_image(image):
+                        runtime.pull(image)
+            except RuntimeError:
+                pass
+            finally:
+                done.set()
+
+        threading.Thread(target=pull, daemon=True).start()
+
+    def wait_for_image(self, image: str) -> None:
+        """
+        Waits for the warm up of an image to finish.
+        :param image: Name of the image.
+        :return: None.
+        """
+        with self._pulls_lock:
+            done = self._pulls.get(image)
+        if done is not None:
+            done.wait()
+
+    @trace.traced('environment')
+    def apply(self, step: tuple, env: dict, replace: bool = False) -> None:
+        """
+        Runs a single step of a plan.
+        :param step: Plan step.
+        :param env: Environment config.
+        :param replace: Let an interactive start or exec step replace the snowglobe process.
+        :return: None.
+        """
+        action = step[0]
+        if action == 'write_config':
+            self.config.set_config(step[1], env)
+        elif action == 'create' and len(step) > 2:
+            # Containers created from another image, e.g. a snapshot, keep the spec hash of their config.
+            print(f'Creating container: {env["name"]} from image: {step[2]}')
+            self.runtime.create(env['name'], step[2], env['create'], spec=self.spec(env), store=self.store)
+        elif action == 'create' and env.get('build'):
+            self.build_image(env)
+            print(f'Creating container: {env["name"]}')
+            self.runtime.create(env['name'], env['image'], env['create'], spec=self.spec(env), store=self.store)
+        elif action == 'create':
+            self.wait_for_image(env['image'])
+            print(f'Creating container: {env["name"]}')
+            self.runtime.create(env['name'], env['image'], env['create'], store=self.store)
+        elif action == 'swap':
+            print(f'Swapping in spare container: {step[2]}')
+            try:
+                self.runtime.rename(step[2], env['name'])
+            except RuntimeError as e:
+                # Another command may have taken the spare in the meantime.
+                print(f'Spare container: {step[2]} can not be used. {e}')
+                self.apply(('create', step[1]), env)
+        elif action == 'start':
+            print(f'Starting container: {env["name"]}')
+            self.runtime.start(env['name'], env['start'], replace=replace)
+        elif action == 'exec':
+            print(f'Executing container: {env["name"]}. Exec name: {step[2]}')
+            self.runtime.exec(env['name'], step[2], env['execs'], replace=replace)
+        elif action == 'restart':
+            print(f'Restarting container: {env["name"]}')
+            self.runtime.restart(env['name'], **stop_settings(env))
+        elif action == 'stop':
+            print(f'Stopping container: {env["name"]}')
+            self.runtime.stop(env['name'], **stop_settings(env))
+        elif action == 'remove':
+            print(f'Deleting container: {env["name"]}')
+            self.runtime.remove(env['name'])
+        elif action == 'force_remove':
+            print(f'Killing and deleting container: {env["name"]}')
+            self.runtime.remove(env['name'], force=True)
+        elif action == 'delete_config':
+            self.config.del_config(step[1])
 
-        print(f'Executing container: {env["name"]}. Exec name: {exec_name}')
-        self.runtime.exec(env['name'], exec_name, env['execs'])
+    @trace.traced('environment')
+    def create(self, name: str) -> None:
+        """
+        Creates the docker container for an environment.
+        :param name: Name of the environment.
+        :return: None.
+        """
+        self.run('create', name)
 
-    def stop(self, name):
+    def dependency_plan(self, names: list) -> tuple:
         """
-        Stops the docker container.
+        Reads the configs of environments and of all their dependencies and groups them into dependency levels.
+        :param names: Names of the environments.
+        :return: Tuple of the levels, the configs by name and the (condition, timeout) tuples other environments set
+        on each dependency.
+        """
+        envs = {}
+        conditions = {}
+
+        def get_dependencies(conf: str) -> list:
+            envs[conf] = self.config.get_config(conf)
+            dependencies = envs[conf].get('depends_on', [])
+            for dependency in dependencies:
+                conditions.setdefault(dependency['name'], []).append(
+                    (dependency.get('condition', 'started'), dependency.get('timeout', DEPENDENCY_TIMEOUT)))
+            return [dependency['name'] for dependency in dependencies]
+
+        return dependency_levels(names, get_dependencies), envs, conditions
+
+    def start_dependency(self, name: str, env: dict, conditions: list) -> None:
+        """
+        Starts the docker container of an environment other environments depend on, and waits for the conditions
+        they set.
         :param name: Name of the environment.
+        :param env: Environment config.
+        :param conditions: List of (condition, timeout) tuples.
+        :return: None.
+        """
+        self.start_container(name, env)
+        healthy = [timeout for condition, timeout in conditions if condition == 'healthy']
+        if healthy and not self.dry_run:
+            self.wait_healthy(name, max(healthy))
+        ready = [timeout for condition, timeout in conditions if condition == 'ready']
+        if ready and not self.dry_run:
+            self.wait_ready(name, env, max(ready))
+
+    @trace.traced('environment')
+    def start(self, name: str, replace: bool = False, wait: bool = False, timeout: int = None) -> None:
+        """
+        Starts the docker containers of an environment and its dependencies, one dependency level after another.
+        The environments of a level are started in parallel.
+        :param name: Name of the environment.
+        :param replace: Let an attached start of the environment replace the snowglobe process.
+        :param wait: Wait for the environment to be ready after starting it.
+        :param timeout: Seconds to wait for the environment to be ready. Defaults to the timeout of its ready section.
+        :return: None.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        started = time.monotonic()
+        levels, envs, conditions = self.dependency_plan([name])
+
+        for level in levels[:-1]:
+            with ThreadPoolExecutor(max_workers=len(level)) as pool:
+                list(pool.map(lambda conf: self.start_dependency(conf, envs[conf], conditions[conf]), level))
+
+        self.start_container(name, envs[name], replace and not wait)
+        if wait and not self.dry_run:
+            self.wait_ready(name, envs[name], timeout, started)
+
+    @trace.traced('environment')
+    def start_all(self, names: list, jobs: int, wait: bool = False, timeout: int = None) -> bool:
+        """
+        Starts many environments and the union of their dependencies, one dependency level after another on a pool of
+        workers, and prints a summary. Every environment is started once, even if several environments depend on it.
+        Environments whose dependencies failed are not started.
+        :param names: Names of the environments.
+        :param jobs: Maximum number of environments started at the same time.
+        :param wait: Wait for the environments to be ready after starting them.
+        :param timeout: Seconds to wait for each environment to be ready. Defaults to the timeout of its ready section.
+        :return: True if every environment and dependency started.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        started = time.monotonic()
+        levels, envs, conditions = self.dependency_plan(names)
+        results = {}
+
+        def run(conf: str) -> list:
+            begin = time.monotonic()
+            failed = [dependency['name'] for dependency in envs[conf].get('depends_on', [])
+                      if results[dependency['name']][1] != 'ok']
+            if failed:
+                return [conf, 'failed', '0.0s', f'Dependency: {", ".join(failed)} failed']
+            try:
+                self.start_dependency(conf, envs[conf], conditions.get(conf, []))
+                if wait and conf in names and not self.dry_run:
+                    self.wait_ready(conf, envs[conf], timeout, started)
+            except Exception as e:
+                return [conf, 'failed', f'{time.monotonic() - begin:.1f}s', error_message(e)]
+            return [conf, 'ok', f'{time.monotonic() - begin:.1f}s', '']
+
+        rows = []
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for level in levels:
+                level_rows = list(pool.map(run, level))
+                results.update((row[0], row) for row in level_rows)
+                rows.extend(level_rows)
+
+        print(format_table(['NAME', 'RESULT', 'TIME', 'ERROR'], rows))
+        return all(row[1] == 'ok' for row in rows)
+
+    @trace.traced('environment')
+    def wait_healthy(self, name: str, timeout: int) -> None:
+        """
+        Waits for the docker container of an environment to pass its healthcheck. The health status is read once and
+        then followed through docker events, which are read from before that, so no change is missed.
+        :param name: Name of the environment.
+        :param timeout: Seconds to wait.
         :return: None.
         """
         env = self.config.get_config(name)
-        print(f'Stopping container: {env["name"]}')
-        self.runtime.stop(env['name'])
+        print(f'Waiting for container: {env["name"]} to be healthy')
+        deadline = time.monotonic() + timeout
+        with self.runtime.health_events(env['name'], f'{time.time():.3f}') as stream:
+            state = self.runtime.inspect(env['name'])['State']
+            if 'Health' not in state:
+                raise RuntimeError(f'Container: {env["name"]} has no healthcheck')
+            if state['Health']['Status'] == 'healthy':
+                return
+            if not state['Running']:
+                raise RuntimeError(f'Container: {env["name"]} stopped before it was healthy')
+
+            actions = []
+            done = threading.Event()
+
+            def follow() -> None:
+                for line in stream:
+                    try:
+                        action = json.loads(line).get('Action')
+                    except ValueError:
+                        continue
+                    if action in ('health_status: healthy', 'die'):
+                        actions.append(action)
+                        break
+                done.set()
+
+            threading.Thread(target=follow, daemon=True).start()
+            if not done.wait(max(deadline - time.monotonic(), 0)):
+                raise RuntimeError(f'Container: {env["name"]} not healthy after {timeout} seconds')
+        if not actions:
+            raise RuntimeError(f'Docker events of container: {env["name"]} ended before it was healthy')
+        if actions[0] == 'die':
+            raise RuntimeError(f'Container: {env["name"]} stopped before it was healthy')
+
+    @trace.traced('environment')
+    def wait_ready(self, name: str, env: dict = None, timeout: int = None, started: float = None) -> None:
+        """
+        Waits for the docker container of an environment to pass the checks of its ready section and prints the time
+        it took. Environments without a ready section are ready once started.
+        :param name: Name of the environment.
+        :param env: Environment config. Read from the config store if not given.
+        :param timeout: Seconds to wait. Defaults to the timeout of the ready section.
+        :param started: Monotonic time the time to ready is measured from. Defaults to now.
+        :return: None.
+        """
+        from snowglobe import ready
+
+        env = env if env is not None else self.config.get_config(name)
+        started = started if started is not None else time.monotonic()
+        if timeout is None:
+            timeout = (env.get('ready') or {}).get('timeout', ready.READY_TIMEOUT)
 
-    def delete(self, name):
+        print(f'Waiting for container: {env["name"]} to be ready')
+        state = self.runtime.inspect(env['name'])['State']
+        if not state['Running']:
+            raise RuntimeError(f'Container: {env["name"]} stopped before it was ready')
+        ready.Waiter(self.runtime, env).wait(state['StartedAt'], timeout)
+        print(f'Container: {env["name"]} ready in {time.monotonic() - started:.1f}s')
+
+    def start_container(self, name: str, env: dict = None, replace: bool = False) -> None:
         """
-        Deletes the docker container
+        Starts the docker container. Creates it first if needed.
         :param name: Name of the environment.
+        :param env: Environment config. Read from the config store if not given.
+        :param replace: Let an attached start replace the snowglobe process.
         :return: None.
         """
+        self.run('start', name, env=env, replace=replace)
+
+    @trace.traced('environment')
+    def exec(self, name: str, exec_name: str, replace: bool = False) -> int:
+        """
+        Executes a command on the docker container. Creates it first if needed.
+        Non-interactive profiles with session set run through a session agent kept alive in the container, without a
+        new docker exec. If the session can not be used, the command runs with docker exec.
+        :param name: Name of the environment.
+        :param exec_name: Name of the exec profile.
+        :param replace: Let an interactive exec profile replace the snowglobe process.
+        :return: Exit code of the command if it ran in a session, otherwise None.
+        """
         env = self.config.get_config(name)
-        print(f'Deleting container: {env["name"]}')
-        self.runtime.remove(env['name'])
+        profile = {ele['name']: ele for ele in env.get('execs', [])}.get(exec_name, {})
+        if profile.get('session') and not self.dry_run:
+            from snowglobe import session
+
+            code = session.execute(env['name'], profile.get('options', '').split(), profile['command'].split())
+            if code is not None:
+                return code
+        self.run('exec', name, (exec_name,), env=env, replace=replace)
+
+    @trace.traced('environment')
+    def stop(self, name: str) -> None:
+        """
+        Stops the docker container if it is running.
+        :param name: Name of the environment.
+        :return: None.
+        """
+        self.run('stop', name)
+
+    @trace.traced('environment')
+    def delete(self, name: str) -> None:
+        """
+        Deletes the docker container if it exists.
+        :param name: Name of the environment.
+        :return: None.
+        """
+        self.run('delete', name)
@@ -0,0 +1,77 @@
+from array import array
+
+
+# Minutes of resource usage history kept per environment.
+WINDOW = 5
+
+# Minimum seconds between kept samples. docker stats refreshes about once a second, but may redraw more often.
+SAMPLE_INTERVAL = 1
+
+
+class History:
+    """
+    History class. Keeps the latest resource usage samples of a container in a fixed size ring buffer, so memory stays
+    bounded however long it is followed. Samples closer together than the interval are dropped, so the buffer covers
+    the whole window however often docker stats redraws.
+    """
+    def __init__(self, window: float = WINDOW, interval: float = SAMPLE_INTERVAL):
+        """
+        Initialises the history with room for a window of samples.
+        :param window: Minutes of samples kept.
+        :param interval: Seconds between samples.
+        """
+        self.window = window * 60
+        self.interval = interval
+        self.size = max(1, int(self.window / interval))
+        self.times = array('d', bytes(8 * self.size))
+        self.cpu = array('d', bytes(8 * self.size))
+        self.memory = array('d', bytes(8 * self.size))
+        self.limit = 0
+        self.next = 0
+        self.count = 0
+
+    def add(self, timestamp: float, cpu: float, memory: int, limit: int = 0) -> None:
+        """
+        Adds a sample, overwriting the oldest one once the buffer is full. Samples less than the interval after the
+        latest kept sample are dropped.
+        :param timestamp: Time of the sample in seconds.
+        :param cpu: Cpu usage in percent.
+        :param memory: Memory usage in bytes.
+        :param limit: Memory limit in bytes.
+        :return: None.
+        """
+        if self.count and timestamp - self.times[(self.next - 1) % self.size] < self.interval:
+            return
+        self.times[self.next] = timestamp
+        self.cpu[self.next] = cpu
+        self.memory[self.next] = memory
+        self.limit = limit
+        self.next = (self.next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def samples(self, now: float) -> list:
+        """
+        Returns the samples of the window, oldest first.
+        :param now: Current time in seconds.
+        :return: List of (timestamp, cpu, memory) tuples.
+        """
+        indexes = ((self.next - self.count + offset) % self.size for offset in range(self.count))
+        return [(self.times[index], self.cpu[index], self.memory[index]) for index in indexes
+                if now - self.times[index] <= self.window]
+
+    def summary(self, now: float) -> dict:
+        """
+        Summarises the samples of the window.
+        :param now: Current time in seconds.
+        :return: Latest, average and peak cpu and memory usage, and the memory limit. None if there are no samples.
+        """
+        samples = self.samples(now)
+        if not samples:
+            return None
+        cpu = [sample[1] for sample in samples]
+        memory = [sample[2] for sample in samples]
+        return {
+            'cpu': cpu[-1], 'cpu_average': sum(cpu) / len(cpu), 'cpu_peak': max(cpu),
+            'memory': int(memory[-1]), 'memory_average': int(sum(memory) / len(memory)),
+            'memory_peak': int(max(memory)), 'limit': self.limit,
+        }
@@ -0,0 +1,148 @@
+from snowglobe import config
+
+
+def plan(command: str, name: str, state: dict, *args, spec: str = None, force: bool = False, image: str = None,
+         spare: str = None, kill: bool = False) -> list:
+    """
+    Plans the runtime operations of a command. Each step is a tuple of an action and the environment name, followed by
+    the arguments of the action. Actions are write_config, create, swap, start, restart, exec, stop, remove,
+    force_remove and delete_config.
+    Reset and remove stop running containers with their stop settings before removing them. With kill, they are torn
+    down with a single force_remove instead, which kills and removes the container without waiting for it to stop.
+    Containers labelled with a spec hash other than the current one are recreated on start. On reset, containers with
+    the current spec hash are only restarted, unless forced or reset from an image. The create step of a reset from an
+    image carries the image as its argument. Given a spare container, a reset swaps it in instead of creating one.
+    :param command: Name of the command.
+    :param name: Name of the environment.
+    :param state: Container inspect result, or None if the container does not exist.
+    :param args: Command arguments.
+    :param spec: Spec hash of the environment config.
+    :param force: Always recreate the container on reset.
+    :param image: Image to recreate the container from on reset, e.g. a snapshot. Defaults to the config image.
+    :param spare: Name of a spare container with the current spec, swapped in on reset.
+    :param kill: Kill running containers on teardown instead of stopping them.
+    :return: List of steps.
+    """
+    exists = state is not None
+    running = exists and state['State']['Running']
+    label = ((state.get('Config') or {}).get('Labels') or {}).get(config.SPEC_LABEL) if exists else None
+
+    if command in ('setup', 'create') and exists:
+        raise RuntimeError(f'Container: {name} already exists. Reset if needed.')
+
+    if command == 'setup':
+        return [('write_config', name), ('create', name)]
+    if command == 'create':
+        return [('create', name)]
+    if command == 'start':
+        if label is not None and spec is not None and label != spec:
+            return plan('reset', name, state, force=True, kill=kill) + [('start', name)]
+        return ([] if exists else [('create', name)]) + [('start', name)]
+    if command == 'exec':
+        return ([] if exists else [('create', name)]) + [('exec', name) + args]
+    if command == 'stop':
+        return [('stop', name)] if running else []
+    if command == 'delete':
+        return [('remove', name)] if exists else []
+    if command == 'reset':
+        if image is not None:
+            return teardown(name, state, kill) + [('create', name, image)]
+        if not force and label is not None and label == spec:
+            return [('restart', name)] if running else []
+        create = ('swap', name, spare) if spare is not None else ('create', name)
+        return teardown(name, state, kill) + [create]
+    if command == 'remove':
+        return teardown(name, state, kill) + [('delete_config', name)]
+
+    raise RuntimeError(f'Command: {command} can not be planned')
+
+
+def kills(env: dict) -> bool:
+    """
+    Checks if running containers of an environment are killed on teardown instead of stopped. Set by the force key of
+    the stop section, or by a stop timeout of 0, where a stop would kill the container anyway.
+    :param env: Environment config.
+    :return: True if running containers are killed and removed in one step.
+    """
+    stop = (env or {}).get('stop') or {}
+    return bool(stop.get('force')) or stop.get('timeout') == 0
+
+
+def teardown(name: str, state: dict, kill: bool = False) -> list:
+    """
+    Plans the removal of a container that is replaced or no longer needed. Running containers are stopped first, or
+    killed and removed in one step with kill.
+    :param name: Name of the environment.
+    :param state: Container inspect result, or None if the container does not exist.
+    :param kill: Kill a running container instead of stopping it.
+    :return: List of steps.
+    """
+    return teardown_steps(name, state is not None, state is not None and state['State']['Running'], kill)
+
+
+def teardown_steps(name: str, exists: bool, running: bool, kill: bool = False) -> list:
+    """
+    Plans the removal of a container from its existence and running state.
+    :param name: Name of the environment.
+    :param exists: The container exists.
+    :param running: The container is running.
+    :param kill: Kill a running container instead of stopping it.
+    :return: List of steps.
+    """
+    if not exists:
+        return []
+    if not running:
+        return [('remove', name)]
+    return [('force_remove', name)] if kill else [('stop', name), ('remove', name)]
+
+
+def reconcile(envs: dict, containers: dict, specs: dict = None, store: str = None) -> dict:
+    """
+    Plans the runtime operations that make the containers match the environment configs. Missing containers are
+    created, containers whose spec changed or that were created without a spec label are recreated, keeping them
+    running if they were, and containers created from the same config store without a config are removed. Containers
+    of other stores sharing the docker daemon, e.g. of other users, are left alone. Spare containers of configured
+    environments are left to their pool.
+    :param envs: Environment configs by container name.
+    :param containers: Container list by name, as returned by Runtime.containers.
+    :param specs: Spec hashes by container name. Hashed from the image and create spec of the configs if not given.
+    :param store: Id of the config store. Defaults to the store of the current settings.
+    :return: Steps by container name. Containers without steps are left out.
+    """
+    specs = specs or {name: config.spec_hash(env.get('image'), env.get('create')) for name, env in envs.items()}
+    store = store or config.store_id()
+    plans = {}
+    for name, env in envs.items():
+        container = containers.get(name)
+        if container is None:
+            plans[name] = [('create', name)]
+        elif container['labels'].get(config.SPEC_LABEL) != specs[name]:
+            running = container['running']
+            plans[name] = teardown_steps(name, True, running, kills(env)) + [('create', name)] + \
+                ([('start', name)] if running else [])
+
+    for name, container in containers.items():
+        pool = container['labels'].get(config.POOL_LABEL)
+        if pool is not None and pool in envs:
+            continue
+        if name not in envs and container['labels'].get(config.MANAGED_LABEL) and \
+                container['labels'].get(config.STORE_LABEL) == store:
+            plans[name] = teardown_steps(name, True, container['running'])
+
+    return dict(sorted(plans.items()))
+
+
+def describe(step: tuple) -> str:
+    """
+    Describes a step of a plan.
+    :param step: Plan step.
+    :return: Description.
+    """
+    action, name = step[:2]
+    if action == 'exec':
+        return f'exec {name} {step[2]}'
+    if action == 'create' and len(step) > 2:
+        return f'create {name} from {step[2]}'
+    if action == 'swap':
+        return f'swap in {step[2]} as {name}'
+    return f'{action.replace("_", " ")} {name}'
@@ -0,0 +1,159 @@
+from snowglobe import trace
+import threading
+import socket
+import re
+
+
+# Seconds to wait for an environment to be ready, unless its ready section or the command sets another timeout.
+READY_TIMEOUT = 60
+
+# First and largest delay between probes of a port or exec profile in seconds. The delay doubles after every probe.
+PROBE_DELAY = 0.05
+PROBE_MAX_DELAY = 1
+
+# Seconds a port probe waits for the connection and then for the server to close it.
+CONNECT_TIMEOUT = 1
+CLOSE_TIMEOUT = 0.1
+
+
+def published_port(env: dict, port: int) -> tuple:
+    """
+    Returns the host address a tcp port of the container of an environment is published on.
+    :param env: Environment config.
+    :param port: Container port.
+    :return: Tuple of the host and the host port.
+    """
+    for item in env['create'].get('ports') or []:
+        if item['containerPort'] == port and item.get('protocol', 'tcp') == 'tcp':
+            return item.get('hostIP') or '127.0.0.1', item['hostPort']
+    raise RuntimeError(f'Port: {port} of environment: {env["name"]} is not published')
+
+
+def port_open(host: str, port: int) -> bool:
+    """
+    Checks if a server accepts connections on a port. The docker proxy accepts connections to published ports even if
+    nothing listens in the container, and closes them at once, so a connection that is closed right away does not
+    count.
+    :param host: Host address.
+    :param port: Port number.
+    :return: True if the server accepted the connection and kept it open.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=CONNECT_TIMEOUT) as connection:
+            connection.settimeout(CLOSE_TIMEOUT)
+            try:
+                return connection.recv(1) != b''
+            except socket.timeout:
+                return True
+    except OSError:
+        return False
+
+
+class Waiter:
+    """
+    Waiter class. Waits for all checks of the ready section of an environment to pass. Log patterns are matched
+    against the log stream of the container as lines arrive, and the end of the stream tells that the container
+    stopped. Ports and exec profiles are probed with a growing delay.
+    """
+    def __init__(self, runtime, env: dict):
+        """
+        Initialises the waiter.
+        :param runtime: Runtime object.
+        :param env: Environment config.
+        """
+        self.runtime = runtime
+        self.env = env
+        self.ready = env.get('ready') or {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.pending = {check for check in ('port', 'exec', 'log') if check in self.ready}
+        self.error = None
+
+    def passed(self, check: str) -> None:
+        """
+        Records a passed check.
+        :param check: Name of the check.
+        :return: None.
+        """
+        with self.lock:
+            self.pending.discard(check)
+            if not self.pending:
+                self.done.set()
+
+    def failed(self, error: str) -> None:
+        """
+        Records an error that ends the wait.
+        :param error: Error message.
+        :return: None.
+        """
+        with self.lock:
+            if not self.done.is_set():
+                self.error = error
+                self.done.set()
+
+    def follow(self, stream, pattern) -> None:
+        """
+        Reads the log stream of the container until the wait ends.
+        :param stream: Log stream, as returned by Runtime.logs.
+        :param pattern: Compiled log pattern, or None if logs are only followed to see the container stop.
+        :return: None.
+        """
+        for line in stream:
+            if pattern is not None and pattern.search(line):
+                self.passed('log')
+                pattern = None
+        self.failed(f'Container: {self.env["name"]} stopped before it was ready')
+
+    def probe(self, check: str, function) -> None:
+        """
+        Runs a probe until it passes or the wait ends.
+        :param check: Name of the check.
+        :param function: Function returning True once the check passes.
+        :return: None.
+        """
+        delay = PROBE_DELAY
+        while not self.done.is_set():
+            try:
+                if function():
+                    self.passed(check)
+                    return
+            except RuntimeError as e:
+                self.failed(str(e))
+                return
+            self.done.wait(delay)
+            delay = min(delay * 2, PROBE_MAX_DELAY)
+
+    @trace.traced('ready')
+    def wait(self, since: str, timeout: float) -> None:
+        """
+        Waits for the environment to be ready.
+        :param since: Start time of the container. Logs written before it are not matched.
+        :param timeout: Seconds to wait.
+        :return: None.
+        """
+        if not self.pending:
+            return
+        try:
+            pattern = re.compile(self.ready['log']) if 'log' in self.ready else None
+        except re.error as e:
+            raise RuntimeError(f'Invalid log pattern of environment: {self.env["name"]}: {e}')
+
+        threads = []
+        if 'port' in self.ready:
+            host, port = published_port(self.env, self.ready['port'])
+            threads.append(threading.Thread(target=self.probe, args=('port', lambda: port_open(host, port))))
+        if 'exec' in self.ready:
+            def exec_passes() -> bool:
+                return self.runtime.exec_stream(self.env['name'], self.ready['exec'], self.env['execs'],
+                                                lambda line: None) == 0
+            threads.append(threading.Thread(target=self.probe, args=('exec', exec_passes)))
+
+        with self.runtime.logs(self.env['name'], since) as stream:
+            threads.append(threading.Thread(target=self.follow, args=(stream, pattern)))
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            if not self.done.wait(timeout):
+                self.failed(f'Container: {self.env["name"]} not ready after {timeout} seconds')
+        if self.error is not None:
+            raise RuntimeError(self.error)
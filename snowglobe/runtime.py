@@ -1,5 +1,347 @@
+from snowglobe import config, trace
 import subprocess
+import threading
 import json
+import time
+import re
+import sys
+import os
+from datetime import datetime, timezone
+
+
+# Only the fields needed by the status command are rendered by docker, one tab separated line per container.
+STATUS_FORMAT = '{{.Name}}\t{{.State.Status}}\t{{.State.StartedAt}}\t{{.Image}}\t{{json .NetworkSettings.Ports}}'
+
+# Labels of containers used by snowglobe.
+LABELS = (config.MANAGED_LABEL, config.SPEC_LABEL, config.POOL_LABEL, config.STORE_LABEL)
+
+# Names, states and snowglobe labels of all containers, one tab separated line per container.
+CONTAINERS_FORMAT = '\t'.join(['{{.Names}}', '{{.State}}'] + [f'{{{{.Label "{label}"}}}}' for label in LABELS])
+
+# Longest line read at once from the output of a streamed command. Longer lines are split.
+MAX_LINE = 65536
+
+# Snapshot images, one tab separated line per image.
+SNAPSHOTS_FORMAT = '{{.Repository}}:{{.Tag}}\t{{.CreatedAt}}\t{{.Size}}'
+
+# Resource usage of a container in the docker stats stream, one tab separated line per running container.
+STATS_FORMAT = '{{.Name}}\t{{.CPUPerc}}\t{{.MemUsage}}'
+
+# Escape sequence moving the cursor home, written by docker stats at the start of every refresh.
+CURSOR_HOME = '\x1b[H'
+
+# Terminal escape sequences, e.g. the ones docker stats writes to redraw its table.
+ESCAPES = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+# Deadlines of docker operations in seconds by sub command. Pulls, creates that pull missing images and commits of
+# whole containers get longer ones. SNOWGLOBE_TIMEOUTS overrides them.
+DEADLINES = {'default': 30, 'start': 120, 'create': 600, 'commit': 600, 'pull': 1800, 'build': 1800}
+
+# Retries of idempotent docker operations that timed out, and the base and maximum delay between them in seconds.
+RETRIES = 2
+RETRY_DELAY = 0.5
+RETRY_MAX_DELAY = 5
+
+# Docker operations timing out in a row before later ones fail fast, and seconds until docker is tried again.
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 30
+
+# Seconds docker waits for a container to stop before killing it, unless told otherwise.
+DOCKER_STOP_TIMEOUT = 10
+
+# Multipliers of the size units used by docker.
+SIZE_UNITS = {'B': 1, 'kB': 1000, 'KB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3, 'TB': 1000 ** 4,
+              'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3, 'TiB': 1024 ** 4}
+
+
+class DockerError(RuntimeError):
+    """
+    DockerError class. Base of the errors raised when the docker daemon does not answer in time.
+    """
+    title = 'Docker error'
+
+
+class DockerTimeout(DockerError):
+    """
+    DockerTimeout class. Raised when a docker operation does not finish within its deadline.
+    """
+    title = 'Docker timeout'
+
+
+class RetriesExhausted(DockerError):
+    """
+    RetriesExhausted class. Raised when every attempt of an idempotent docker operation timed out.
+    """
+    title = 'Docker retries exhausted'
+
+
+class DockerUnavailable(DockerError):
+    """
+    DockerUnavailable class. Raised without calling docker while the circuit breaker is open.
+    """
+    title = 'Docker unavailable'
+
+
+class CircuitBreaker:
+    """
+    CircuitBreaker class. Counts docker operations that timed out in a row and, once there are too many, fails later
+    operations of the process fast instead of letting each of them wait for its deadline. After a cool down a single
+    operation is let through again to probe the daemon.
+    """
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        """
+        Initialises a closed circuit breaker.
+        :param threshold: Number of timeouts in a row that open the breaker.
+        :param cooldown: Seconds the breaker stays open.
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def check(self) -> None:
+        """
+        Fails fast while the breaker is open.
+        :return: None.
+        """
+        with self.lock:
+            if self.opened is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self.opened)
+            if remaining <= 0:
+                # Half open: let this operation probe the daemon. Another timeout opens the breaker again.
+                self.opened = None
+                return
+            raise DockerUnavailable(f'The docker daemon did not answer {self.failures} times in a row. Not calling '
+                                    f'it again for {remaining:.0f}s')
+
+    def failure(self) -> None:
+        """
+        Records an operation that timed out.
+        :return: None.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened = time.monotonic()
+
+    def success(self) -> None:
+        """
+        Records an operation that finished in time and closes the breaker.
+        :return: None.
+        """
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+
+
+BREAKER = CircuitBreaker()
+
+
+class Stream:
+    """
+    Stream class. Lines written by a docker command that follows a container, e.g. docker container logs --follow.
+    The stream can be closed from another thread, which ends the iteration.
+    """
+    def __init__(self, cmd: list):
+        """
+        Starts the docker command.
+        :param cmd: Command arguments.
+        """
+        self.process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT)
+
+    def __iter__(self):
+        try:
+            for line in iter(lambda: self.process.stdout.readline(MAX_LINE), b''):
+                yield line.decode(errors='replace').rstrip('\n')
+        finally:
+            self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the docker command.
+        :return: None.
+        """
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+def deadline(operation: str, grace: float = 0) -> float:
+    """
+    Returns the deadline of a docker operation. SNOWGLOBE_TIMEOUTS overrides deadlines by operation, e.g.
+    inspect=5,create=300,default=60.
+    :param operation: Docker sub command, e.g. inspect.
+    :param grace: Seconds added to the deadline, e.g. the time docker waits for a container to stop.
+    :return: Deadline in seconds.
+    """
+    deadlines = dict(DEADLINES)
+    for item in os.environ.get('SNOWGLOBE_TIMEOUTS', '').split(','):
+        key, _, seconds = item.partition('=')
+        try:
+            deadlines[key.strip()] = float(seconds)
+        except ValueError:
+            continue
+    return deadlines.get(operation, deadlines['default']) + grace
+
+
+def backoff(attempt: int) -> float:
+    """
+    Returns the delay before retrying an operation, exponential in the attempt with full jitter, so that parallel
+    commands do not retry in lock step.
+    :param attempt: Number of the failed attempt, starting at 0.
+    :return: Delay in seconds.
+    """
+    import random
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** attempt))
+
+
+def guarded(operation: str, attempt, retries: int = 0, grace: float = 0):
+    """
+    Runs an attempt of a docker operation within its deadline through the circuit breaker. Attempts that time out are
+    retried with a jittered backoff.
+    :param operation: Docker sub command, e.g. inspect.
+    :param attempt: Function called with the deadline in seconds. Raises subprocess.TimeoutExpired or socket.timeout
+    if the deadline passes.
+    :param retries: Number of retries. Only idempotent operations are retried.
+    :param grace: Seconds added to the deadline.
+    :return: Result of the attempt.
+    """
+    import socket
+
+    timeout = deadline(operation, grace)
+    for number in range(retries + 1):
+        BREAKER.check()
+        try:
+            result = attempt(timeout)
+        except (subprocess.TimeoutExpired, socket.timeout):
+            BREAKER.failure()
+            if number < retries:
+                time.sleep(backoff(number))
+                continue
+            if retries:
+                raise RetriesExhausted(f'docker {operation} did not finish within {timeout:g}s in {retries + 1} '
+                                       f'attempts')
+            raise DockerTimeout(f'docker {operation} did not finish within {timeout:g}s')
+        BREAKER.success()
+        return result
+
+
+def run(cmd: list, operation: str = None, retries: int = 0, grace: float = 0,
+        **kwargs) -> subprocess.CompletedProcess:
+    """
+    Runs a docker command. The command is traced with its arguments and exit code. Given an operation, the command
+    runs within the deadline of the operation, through the circuit breaker.
+    :param cmd: Command arguments.
+    :param operation: Docker sub command whose deadline applies, e.g. inspect. Interactive commands have none.
+    :param retries: Number of retries after a timeout. Only idempotent operations are retried.
+    :param grace: Seconds added to the deadline.
+    :param kwargs: Arguments of subprocess.run.
+    :return: Completed process.
+    """
+    def attempt(**timeout) -> subprocess.CompletedProcess:
+        with trace.span(' '.join(cmd[:3]), 'runtime', argv=cmd) as span:
+            response = subprocess.run(cmd, **kwargs, **timeout)
+            span.set(exit_code=response.returncode)
+        return response
+
+    if operation is None:
+        return attempt()
+    return guarded(operation, lambda timeout: attempt(timeout=timeout), retries, grace)
+
+
+def attaches(options: list) -> bool:
+    """
+    Checks if docker exec or start options attach the terminal to the container, e.g. -it or --attach.
+    :param options: Command options.
+    :return: True if the command is interactive.
+    """
+    flags = set()
+    for option in options:
+        if option.startswith('--'):
+            if not option.endswith('=false'):
+                flags.add(option.split('=')[0][2:])
+        elif option.startswith('-') and set(option[1:]) <= set('aitd'):
+            flags.update({'a': 'attach', 'i': 'interactive', 't': 'tty', 'd': 'detach'}[flag] for flag in option[1:])
+    return 'detach' not in flags and bool(flags & {'attach', 'interactive'})
+
+
+def stop_options(timeout: int = None, signal: str = None) -> list:
+    """
+    Builds the options of the docker container stop and restart commands.
+    :param timeout: Seconds to wait for the container to stop before it is killed.
+    :param signal: Signal sent to stop the container.
+    :return: List of options.
+    """
+    options = []
+    if timeout is not None:
+        options.extend(['--time', str(timeout)])
+    if signal is not None:
+        options.extend(['--signal', signal])
+    return options
+
+
+def stop_grace(timeout: int = None) -> float:
+    """
+    Returns the seconds docker may wait for a container to stop, added to the deadline of stop and restart.
+    :param timeout: Stop timeout of the environment. Docker's default if None.
+    :return: Seconds.
+    """
+    return DOCKER_STOP_TIMEOUT if timeout is None else timeout
+
+
+def without_terminal(options: list) -> list:
+    """
+    Removes the options that attach stdin or allocate a tty, e.g. -it, for commands whose output is captured.
+    :param options: Command options.
+    :return: Remaining options.
+    """
+    remaining = []
+    for option in options:
+        if option in ('--interactive', '--tty') or option.startswith(('--interactive=', '--tty=')):
+            continue
+        if option.startswith('-') and not option.startswith('--') and set(option[1:]) <= set('itd'):
+            option = option.replace('i', '').replace('t', '')
+            if option == '-':
+                continue
+        remaining.append(option)
+    return remaining
+
+
+def replace_process(cmd: list) -> None:
+    """
+    Replaces the snowglobe process with a docker command, which then owns the terminal and its signals.
+    Output that is still buffered is written first.
+    :param cmd: Command arguments.
+    :return: None. Does not return.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execvp(cmd[0], cmd)
+
+
+def run_attached(cmd: list, options: list, replace: bool, operation: str = None) -> None:
+    """
+    Runs a docker command that may attach the terminal. Interactive commands replace the snowglobe process if allowed,
+    unless a trace is being recorded, since it is written when snowglobe exits.
+    :param cmd: Command arguments.
+    :param options: Command options.
+    :param replace: Whether the process may be replaced.
+    :param operation: Docker sub command whose deadline applies if the command does not attach the terminal.
+    :return: None.
+    """
+    if replace and trace.EVENTS is None and attaches(options):
+        replace_process(cmd)
+    else:
+        run(cmd, None if attaches(options) else operation)
 
 
 class Runtime:
@@ -14,7 +356,7 @@ class Runtime:
         :return: Inspect dictionary.
         """
         cmd = ['docker', 'container', 'inspect', name]
-        response = subprocess.run(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        response = run(cmd, 'inspect', RETRIES, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         try:
             containers = json.loads(response.stdout.decode())
         except json.JSONDecodeError as jde:
@@ -25,12 +367,144 @@ class Runtime:
         return containers[0]
 
     @staticmethod
-    def create(name: str, image: str, create: dict) -> None:
+    def states(names: list) -> dict:
+        """
+        Runs a single docker container inspect command for many containers and returns the fields their status is
+        built from. Containers that do not exist are left out, any other docker error is raised.
+        :param names: Names of the containers.
+        :return: Dictionary of the state, start time, image id and port bindings for each container name.
+        """
+        cmd = ['docker', 'container', 'inspect', '--format', STATUS_FORMAT] + names
+        response = run(cmd, 'inspect', RETRIES, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            errors = response.stderr.decode().strip()
+            # Docker exits with an error if any container does not exist, but still prints the others.
+            if not errors or not all('No such container' in line for line in errors.splitlines()):
+                raise RuntimeError(f'Containers can not be inspected: {errors}')
+        states = {}
+        for line in response.stdout.decode().splitlines():
+            name, state, started_at, image, ports = line.split('\t')
+            try:
+                ports = json.loads(ports)
+            except json.JSONDecodeError as jde:
+                raise RuntimeError(f'Invalid json format: {jde}')
+            states[name.lstrip('/')] = {'state': state, 'started_at': started_at, 'image': image, 'ports': ports}
+
+        return states
+
+    @staticmethod
+    def status(names: list) -> dict:
+        """
+        Runs a single docker container inspect command for many containers and returns their status.
+        Containers that do not exist are left out.
+        :param names: Names of the containers.
+        :return: Status dictionary for each container name.
+        """
+        return {name: make_status(**state) for name, state in Runtime.states(names).items()}
+
+    @staticmethod
+    def containers() -> dict:
+        """
+        Lists all containers with a single docker container ls command.
+        :return: State and snowglobe labels of each container by name.
+        """
+        cmd = ['docker', 'container', 'ls', '--all', '--no-trunc', '--format', CONTAINERS_FORMAT]
+        response = run(cmd, 'ls', RETRIES, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            raise RuntimeError(f'Containers can not be listed: {response.stderr.decode().strip()}')
+
+        containers = {}
+        for line in response.stdout.decode().splitlines():
+            name, state, *values = line.split('\t')
+            containers[name] = {'running': state == 'running',
+                                'labels': {label: value for label, value in zip(LABELS, values) if value}}
+
+        return containers
+
+    @staticmethod
+    def events():
+        """
+        Follows the docker events stream of containers.
+        :return: Generator of event dictionaries.
+        """
+        cmd = ['docker', 'events', '--format', '{{json .}}', '--filter', 'type=container']
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        try:
+            for line in process.stdout:
+                yield json.loads(line.decode())
+        finally:
+            process.kill()
+            process.wait()
+
+    @staticmethod
+    def health_events(name: str, since: str) -> Stream:
+        """
+        Follows the health status changes and exits of a container.
+        :param name: Name of the docker container.
+        :param since: Unix time events are included from, so that events are not missed while docker events starts.
+        :return: Stream of event lines in json format.
+        """
+        return Stream(['docker', 'events', '--format', '{{json .}}', '--since', since, '--filter', 'type=container',
+                       '--filter', f'container={name}', '--filter', 'event=health_status', '--filter', 'event=die'])
+
+    @staticmethod
+    def logs(name: str, since: str = None) -> Stream:
+        """
+        Follows the output of a container until it stops.
+        :param name: Name of the docker container.
+        :param since: Only output written after this time, e.g. the start time of the container.
+        :return: Stream of lines, stdout and stderr combined.
+        """
+        cmd = ['docker', 'container', 'logs', '--follow']
+        if since:
+            cmd.extend(['--since', since])
+        return Stream(cmd + [name])
+
+    @staticmethod
+    def stats():
+        """
+        Follows the resource usage of all running containers with a single docker stats stream.
+        :return: Generator of a dictionary of the cpu percentage, memory and memory limit by container name, one for
+        every refresh of docker stats.
+        """
+        cmd = ['docker', 'stats', '--format', STATS_FORMAT]
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        try:
+            frame = None
+            for line in process.stdout:
+                line = line.decode(errors='replace')
+                if CURSOR_HOME in line:
+                    if frame is not None:
+                        yield frame
+                    frame = {}
+                    line = line[line.rindex(CURSOR_HOME) + len(CURSOR_HOME):]
+                fields = strip_escapes(line).strip().split('\t')
+                if frame is None or len(fields) != 3:
+                    continue
+                name, cpu, memory = fields
+                usage, _, limit = memory.partition('/')
+                try:
+                    frame[name] = {'cpu': float(cpu.rstrip('%')), 'memory': parse_size(usage),
+                                   'limit': parse_size(limit)}
+                except ValueError:
+                    continue
+            if frame:
+                yield frame
+        finally:
+            process.kill()
+            process.wait()
+
+    @staticmethod
+    def create(name: str, image: str, create: dict, spec: str = None, labels: dict = None, store: str = None) -> None:
         """
-        Runs the docker container create command.
+        Runs the docker container create command. The container is labelled as managed by snowglobe, with the hash
+        of its spec and with the id of its config store.
         :param name: Name of the docker container.
         :param image: Name of the docker image.
         :param create: Create options.
+        :param spec: Spec hash of the container. Defaults to the hash of the image and create options.
+        :param labels: Additional labels of the container.
+        :param store: Id of the config store. Defaults to the store of the current settings.
         :return: None.
         """
         cmd = ['docker', 'container', 'create']
@@ -53,30 +527,37 @@ class Runtime:
         if create.get('volumes'):
             for volume in create['volumes']:
                 cmd.extend(['-v', f'{volume["hostPath"]}:{volume["containerPath"]}:{volume.get("mode", "rw")}'])
+        cmd.extend(['--label', f'{config.MANAGED_LABEL}=true',
+                    '--label', f'{config.SPEC_LABEL}={spec or config.spec_hash(image, create)}',
+                    '--label', f'{config.STORE_LABEL}={store or config.store_id()}'])
+        for key, value in (labels or {}).items():
+            cmd.extend(['--label', f'{key}={value}'])
         if create.get('options'):
             cmd.extend(create['options'].split())
 
         cmd.extend(['--name', name, image] + create['command'])
-        subprocess.run(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        run(cmd, 'create', stdin=subprocess.PIPE, stdout=subprocess.PIPE)
 
     @staticmethod
-    def start(name: str, start: str) -> None:
+    def start(name: str, start: str, replace: bool = False) -> None:
         """
         Runs the docker container start command.
         :param name: Name of the docker container
         :param start: Start options.
+        :param replace: Replace the snowglobe process with docker if the options attach the terminal.
         :return: None.
         """
         cmd = ['docker', 'container', 'start'] + start.split() + [name]
-        subprocess.run(cmd)
+        run_attached(cmd, start.split(), replace, 'start')
 
     @staticmethod
-    def exec(name: str, exec_name: str, execs: list) -> None:
+    def exec(name: str, exec_name: str, execs: list, replace: bool = False) -> None:
         """
         Runs the docker container exec command.
         :param name: Name of the docker container.
         :param exec_name: Name of the exec profile.
         :param execs: List of exec options.
+        :param replace: Replace the snowglobe process with docker if the profile is interactive.
         :return: None.
         """
         execs = {ele['name']: ele for ele in execs}
@@ -86,24 +567,295 @@ class Runtime:
 
         cmd = ['docker', 'container', 'exec'] + \
             execs[exec_name]['options'].split() + [name] + execs[exec_name]['command'].split()
-        subprocess.run(cmd)
+        run_attached(cmd, execs[exec_name]['options'].split(), replace)
 
     @staticmethod
-    def stop(name: str) -> None:
+    def exec_stream(name: str, exec_name: str, execs: list, output) -> int:
+        """
+        Runs the docker container exec command without a terminal and hands its output to a function line by line,
+        so that only a single line is held in memory.
+        :param name: Name of the docker container.
+        :param exec_name: Name of the exec profile.
+        :param execs: List of exec options.
+        :param output: Function called with each line of output, stdout and stderr combined.
+        :return: Exit code of the command.
+        """
+        execs = {ele['name']: ele for ele in execs}
+
+        if exec_name not in execs:
+            raise RuntimeError(f'Exec name: {exec_name} not found')
+
+        cmd = ['docker', 'container', 'exec'] + without_terminal(execs[exec_name].get('options', '').split()) + \
+            [name] + execs[exec_name]['command'].split()
+        with trace.span(' '.join(cmd[:3]), 'runtime', argv=cmd) as span:
+            process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            try:
+                for line in iter(lambda: process.stdout.readline(MAX_LINE), b''):
+                    output(line.decode(errors='replace').rstrip('\n'))
+            finally:
+                process.stdout.close()
+                code = process.wait()
+            span.set(exit_code=code)
+        return code
+
+    @staticmethod
+    def restart(name: str, timeout: int = None, signal: str = None) -> None:
+        """
+        Runs the docker container restart command.
+        :param name: Name of the docker container.
+        :param timeout: Seconds to wait for the container to stop before it is killed. Docker's default if None.
+        :param signal: Signal sent to stop the container. The signal of the image if None.
+        :return: None.
+        """
+        cmd = ['docker', 'container', 'restart'] + stop_options(timeout, signal) + [name]
+        run(cmd, 'restart', grace=stop_grace(timeout), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    @staticmethod
+    def stop(name: str, timeout: int = None, signal: str = None) -> None:
         """
         Runs the docker container stop command.
         :param name: Name of the docker container.
+        :param timeout: Seconds to wait for the container to stop before it is killed. Docker's default if None.
+        :param signal: Signal sent to stop the container. The signal of the image if None.
         :return: None.
         """
-        cmd = ['docker', 'container', 'stop', name]
-        subprocess.run(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        cmd = ['docker', 'container', 'stop'] + stop_options(timeout, signal) + [name]
+        run(cmd, 'stop', RETRIES, stop_grace(timeout), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
 
     @staticmethod
-    def remove(name: str) -> None:
+    def remove(name: str, force: bool = False) -> None:
         """
         Runs the docker container rm command.
         :param name: Name of the docker container.
+        :param force: Kill the container if it is running and remove it in the same command.
+        :return: None.
+        """
+        cmd = ['docker', 'container', 'rm'] + (['--force'] if force else []) + [name]
+        run(cmd, 'rm', RETRIES, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    @staticmethod
+    def rename(name: str, new_name: str) -> None:
+        """
+        Runs the docker container rename command.
+        :param name: Name of the docker container.
+        :param new_name: New name of the docker container.
+        :return: None.
+        """
+        cmd = ['docker', 'container', 'rename', name, new_name]
+        response = run(cmd, 'rename', stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            raise RuntimeError(f'Container: {name} can not be renamed: {response.stderr.decode().strip()}')
+
+    @staticmethod
+    def commit(name: str, image: str, environment: str) -> None:
+        """
+        Runs the docker container commit command. The image is labelled with the environment it was committed from.
+        :param name: Name of the docker container.
+        :param image: Name of the new image.
+        :param environment: Name of the environment.
         :return: None.
         """
-        cmd = ['docker', 'container', 'rm', name]
-        subprocess.run(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        cmd = ['docker', 'container', 'commit', '--change', f'LABEL {config.SNAPSHOT_LABEL}={environment}', name, image]
+        response = run(cmd, 'commit', stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            raise RuntimeError(f'Container: {name} can not be committed: {response.stderr.decode().strip()}')
+
+    @staticmethod
+    def snapshots(environment: str = None) -> list:
+        """
+        Lists snapshot images with a single docker image ls command.
+        :param environment: Name of the environment. Snapshots of all environments are listed if not given.
+        :return: List of dictionaries with the image, creation time and size of each snapshot.
+        """
+        label = config.SNAPSHOT_LABEL if environment is None else f'{config.SNAPSHOT_LABEL}={environment}'
+        cmd = ['docker', 'image', 'ls', '--filter', f'label={label}', '--format', SNAPSHOTS_FORMAT]
+        response = run(cmd, 'ls', RETRIES, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            raise RuntimeError(f'Snapshots can not be listed: {response.stderr.decode().strip()}')
+
+        snapshots = []
+        for line in response.stdout.decode().splitlines():
+            image, created, size = line.split('\t')
+            snapshots.append({'image': image, 'created': created[:19], 'size': size})
+        return snapshots
+
+    @staticmethod
+    def remove_image(image: str) -> None:
+        """
+        Runs the docker image rm command.
+        :param image: Name of the image.
+        :return: None.
+        """
+        cmd = ['docker', 'image', 'rm', image]
+        response = run(cmd, 'rm', stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            raise RuntimeError(f'Image: {image} can not be removed: {response.stderr.decode().strip()}')
+
+    @staticmethod
+    def has_image(image: str) -> bool:
+        """
+        Checks if an image is available locally with the docker image inspect command.
+        :param image: Name of the image.
+        :return: True if the image does not need to be pulled.
+        """
+        cmd = ['docker', 'image', 'inspect', '--format', '{{.Id}}', image]
+        response = run(cmd, 'inspect', RETRIES, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return response.returncode == 0
+
+    @staticmethod
+    def image_labels(image: str) -> dict:
+        """
+        Returns the labels of a local image.
+        :param image: Name of the image.
+        :return: Dictionary of labels, or None if the image is not available locally.
+        """
+        cmd = ['docker', 'image', 'inspect', '--format', '{{json .Config.Labels}}', image]
+        response = run(cmd, 'inspect', RETRIES, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            return None
+        try:
+            return json.loads(response.stdout.decode()) or {}
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def build(image: str, context: str, dockerfile: str = None, args: dict = None, labels: dict = None) -> None:
+        """
+        Runs the docker image build command without progress output.
+        :param image: Name of the built image.
+        :param context: Path of the build context.
+        :param dockerfile: Path of the Dockerfile. Defaults to the Dockerfile of the build context.
+        :param args: Build arguments.
+        :param labels: Labels of the built image.
+        :return: None.
+        """
+        cmd = ['docker', 'image', 'build', '--quiet', '--tag', image]
+        if dockerfile:
+            cmd.extend(['--file', dockerfile])
+        for key, value in (args or {}).items():
+            cmd.extend(['--build-arg', f'{key}={value}'])
+        for key, value in (labels or {}).items():
+            cmd.extend(['--label', f'{key}={value}'])
+        cmd.append(context)
+        response = run(cmd, 'build', stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            raise RuntimeError(f'Image: {image} can not be built: {response.stderr.decode().strip()}')
+
+    @staticmethod
+    def pull(image: str) -> None:
+        """
+        Runs the docker image pull command without progress output.
+        :param image: Name of the image.
+        :return: None.
+        """
+        cmd = ['docker', 'image', 'pull', '--quiet', image]
+        response = run(cmd, 'pull', stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if response.returncode != 0:
+            raise RuntimeError(f'Image: {image} can not be pulled: {response.stderr.decode().strip()}')
+
+
+def human_size(size: int) -> str:
+    """
+    Formats a size the way docker does in its image list.
+    :param size: Size in bytes.
+    :return: Human readable size.
+    """
+    size = float(size)
+    for unit in ('B', 'kB', 'MB', 'GB', 'TB'):
+        if size < 1000 or unit == 'TB':
+            break
+        size /= 1000
+    return f'{size:.4g}{unit}'
+
+
+def parse_size(size: str) -> int:
+    """
+    Parses a size the way docker prints it, e.g. 12.5MiB or 1.2GB.
+    :param size: Human readable size.
+    :return: Size in bytes.
+    """
+    size = size.strip()
+    number = size.rstrip('BKMGTikb')
+    unit = size[len(number):]
+    if unit not in SIZE_UNITS:
+        raise ValueError(f'Unknown size unit: {size}')
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def strip_escapes(text: str) -> str:
+    """
+    Removes terminal escape sequences.
+    :param text: Text.
+    :return: Text without escape sequences.
+    """
+    return ESCAPES.sub('', text)
+
+
+def human_duration(seconds: float) -> str:
+    """
+    Formats a duration the way docker does in its container status.
+    :param seconds: Duration in seconds.
+    :return: Human readable duration.
+    """
+    seconds = int(seconds)
+    minutes = seconds // 60
+    hours = int(seconds / 3600 + 0.5)
+    if seconds < 1:
+        return 'Less than a second'
+    if seconds == 1:
+        return '1 second'
+    if seconds < 60:
+        return f'{seconds} seconds'
+    if minutes == 1:
+        return 'About a minute'
+    if minutes < 60:
+        return f'{minutes} minutes'
+    if hours == 1:
+        return 'About an hour'
+    if hours < 48:
+        return f'{hours} hours'
+    if hours < 24 * 7 * 2:
+        return f'{hours // 24} days'
+    if hours < 24 * 30 * 2:
+        return f'{hours // 24 // 7} weeks'
+    if hours < 24 * 365 * 2:
+        return f'{hours // 24 // 30} months'
+    return f'{seconds // 3600 // 24 // 365} years'
+
+
+def make_status(state: str, started_at: str, image: str, ports: dict) -> dict:
+    """
+    Builds the status of a container from its inspect fields.
+    :param state: Container state, e.g. running.
+    :param started_at: Start time of the container.
+    :param image: Image id.
+    :param ports: Port bindings by container port.
+    :return: Status dictionary.
+    """
+    uptime = ''
+    if state == 'running':
+        started = datetime.strptime(started_at[:19], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+        uptime = human_duration((datetime.now(timezone.utc) - started).total_seconds())
+
+    return {
+        'state': state,
+        'uptime': uptime,
+        'image': image,
+        'ports': ', '.join(
+            f'{binding["HostIp"]}:{binding["HostPort"]}->{port}' if binding else port
+            for port, bindings in (ports or {}).items() for binding in bindings or [None]
+        ),
+    }
+
+
+def get_runtime(name: str) -> Runtime:
+    """
+    Returns a runtime backend. The api backend is only imported when it is used.
+    :param name: Name of the runtime backend. Either cli or api.
+    :return: Runtime object.
+    """
+    if name == 'api':
+        from snowglobe import api
+        return api.ApiRuntime()
+
+    return Runtime()
@@ -0,0 +1,260 @@
+from snowglobe import daemon, runtime, trace
+import subprocess
+import threading
+import socket
+import shlex
+import json
+import time
+import sys
+import os
+
+
+# Seconds without a request after which a session broker stops its agents and exits.
+IDLE_TIMEOUT = 600
+
+# Seconds the CLI waits for a new session broker to listen before falling back to docker exec.
+START_TIMEOUT = 5
+
+# Seconds between checks of the broker socket while it starts.
+START_INTERVAL = 0.01
+
+# Runs inside the container. Reads one shell quoted command per line and answers with a header line of the exit code
+# and the sizes of stdout and stderr, followed by both outputs. Each command runs in a sub shell without stdin.
+AGENT = '''
+out=/tmp/.snowglobe-session-$$.out
+err=/tmp/.snowglobe-session-$$.err
+trap 'rm -f "$out" "$err"' EXIT
+while IFS= read -r line; do
+    (eval "$line") </dev/null >"$out" 2>"$err"
+    code=$?
+    printf '%s %s %s\\n' "$code" "$(wc -c <"$out")" "$(wc -c <"$err")"
+    cat "$out" "$err"
+done
+'''
+
+
+def socket_path(name: str) -> str:
+    """
+    Returns the path of the unix socket of the session broker of a container. It is next to the daemon socket.
+    :param name: Name of the docker container.
+    :return: Socket path.
+    """
+    return os.path.join(os.path.dirname(daemon.socket_path()), f'session-{name}.sock')
+
+
+def query(name: str, options: list, command: list) -> dict:
+    """
+    Asks the session broker of a container to run a command.
+    :param name: Name of the docker container.
+    :param options: Docker exec options of the agent, e.g. -u root.
+    :param command: Command arguments.
+    :return: Response with the exit code, stdout and stderr, or with the error. None if no broker is listening.
+    """
+    with trace.span('session query', 'session', container=name, command=command), \
+            socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            daemon.connect(connection, socket_path(name))
+        except (OSError, RuntimeError):
+            return None
+        try:
+            connection.sendall(json.dumps({'options': options, 'command': command}).encode() + b'\n')
+            with connection.makefile('rb') as f:
+                return json.loads(f.readline().decode())
+        except (OSError, ValueError) as e:
+            return {'error': str(e)}
+
+
+def execute(name: str, options: list, command: list, idle_timeout: int = IDLE_TIMEOUT) -> int:
+    """
+    Runs a non-interactive command through the session broker of a container and writes its output. The broker is
+    started in a detached snowglobe process if it is not running yet.
+    :param name: Name of the docker container.
+    :param options: Docker exec options.
+    :param command: Command arguments.
+    :param idle_timeout: Idle timeout of a newly started broker in seconds.
+    :return: Exit code of the command, or None if the session could not be used.
+    """
+    if runtime.attaches(options):
+        return None
+    options = runtime.without_terminal(options)
+
+    response = query(name, options, command)
+    if response is None:
+        cmd = [sys.executable, '-m', 'snowglobe', 'session', name, '--idle-timeout', str(idle_timeout)]
+        subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        deadline = time.monotonic() + START_TIMEOUT
+        while response is None and time.monotonic() < deadline:
+            time.sleep(START_INTERVAL)
+            response = query(name, options, command)
+    # The command only runs again with docker exec if the broker could not start it, e.g. the agent failed to start.
+    if response is None or 'error' in response:
+        return None
+
+    sys.stdout.write(response['stdout'])
+    sys.stdout.flush()
+    sys.stderr.write(response['stderr'])
+    sys.stderr.flush()
+    return response['code']
+
+
+class Agent:
+    """
+    Agent class. A long lived shell in a container that runs commands sent over its stdin, one at a time.
+    """
+    def __init__(self, cmd: list):
+        """
+        Starts the agent.
+        :param cmd: Command starting the agent shell, e.g. docker container exec -i NAME sh -c AGENT.
+        """
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.lock = threading.Lock()
+
+    def run(self, command: list) -> dict:
+        """
+        Runs a command in the agent.
+        :param command: Command arguments.
+        :return: Dictionary with the exit code, stdout and stderr of the command.
+        """
+        with self.lock:
+            self.process.stdin.write(' '.join(shlex.quote(arg) for arg in command).encode() + b'\n')
+            self.process.stdin.flush()
+            header = self.process.stdout.readline().split()
+            if len(header) != 3:
+                raise RuntimeError('Session agent exited')
+            code, stdout_size, stderr_size = (int(field) for field in header)
+            stdout = self.process.stdout.read(stdout_size)
+            stderr = self.process.stdout.read(stderr_size)
+        return {'code': code, 'stdout': stdout.decode(errors='replace'), 'stderr': stderr.decode(errors='replace')}
+
+    def close(self) -> None:
+        """
+        Stops the agent.
+        :return: None.
+        """
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class Broker:
+    """
+    Broker class. Runs commands of a container through agents kept alive between requests, one per set of exec
+    options, and answers over a unix socket.
+    """
+    def __init__(self, name: str, idle_timeout: int = IDLE_TIMEOUT):
+        """
+        Initialises the broker.
+        :param name: Name of the docker container.
+        :param idle_timeout: Seconds without a request after which the broker exits.
+        """
+        self.name = name
+        self.idle_timeout = idle_timeout
+        self.agents = {}
+        self.lock = threading.Lock()
+        self.last_request = time.monotonic()
+        self.active = 0
+
+    def agent(self, options: list) -> Agent:
+        """
+        Returns the agent for a set of exec options, started on first use.
+        :param options: Docker exec options.
+        :return: Agent object.
+        """
+        with self.lock:
+            key = tuple(options)
+            if key not in self.agents:
+                cmd = ['docker', 'container', 'exec', '-i'] + options + [self.name, 'sh', '-c', AGENT]
+                self.agents[key] = Agent(cmd)
+            return self.agents[key]
+
+    def answer(self, request: dict) -> dict:
+        """
+        Runs a command of a request. An agent that fails is dropped, so that the next request starts a new one.
+        :param request: Request with the exec options and the command.
+        :return: Response with the exit code and outputs, or the error.
+        """
+        options = request.get('options', [])
+        with self.lock:
+            self.active += 1
+        try:
+            agent = self.agent(options)
+            return agent.run(request['command'])
+        except (OSError, ValueError, RuntimeError) as e:
+            with self.lock:
+                agent = self.agents.pop(tuple(options), None)
+            if agent is not None:
+                agent.close()
+            return {'error': str(e)}
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.last_request = time.monotonic()
+
+    def idle(self) -> bool:
+        """
+        Checks if the broker went without requests for longer than its idle timeout.
+        :return: True if the broker is idle.
+        """
+        with self.lock:
+            return self.active == 0 and time.monotonic() - self.last_request > self.idle_timeout
+
+    def close(self) -> None:
+        """
+        Stops all agents.
+        :return: None.
+        """
+        with self.lock:
+            agents, self.agents = list(self.agents.values()), {}
+        for agent in agents:
+            agent.close()
+
+    def serve(self) -> None:
+        """
+        Answers requests on the unix socket until the broker is idle or interrupted. Requests for different exec
+        options are answered in parallel.
+        :return: None.
+        """
+        import socketserver
+
+        path = socket_path(self.name)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            if connection.connect_ex(path) == 0:
+                raise RuntimeError(f'A session broker is already listening on {path}')
+        if os.path.exists(path):
+            os.remove(path)
+
+        broker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    response = broker.answer(json.loads(self.rfile.readline().decode()))
+                except (ValueError, KeyError):
+                    response = {'error': 'Invalid request'}
+                self.wfile.write(json.dumps(response).encode() + b'\n')
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        def watch(server) -> None:
+            while not self.idle():
+                time.sleep(1)
+            server.shutdown()
+
+        with Server(path, Handler) as server:
+            os.chmod(path, 0o600)
+            threading.Thread(target=watch, args=(server,), daemon=True).start()
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(path)
+                self.close()
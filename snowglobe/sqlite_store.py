@@ -0,0 +1,93 @@
+from snowglobe import trace
+import sqlite3
+import json
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS configs (
+    name TEXT PRIMARY KEY,
+    image TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS configs_image ON configs (image);
+'''
+
+
+class SqliteStore:
+    """
+    SqliteStore class. Stores configs in a sqlite database with lookups by name and image. Every write is a single
+    transaction.
+    """
+    @trace.traced('config')
+    def __init__(self, database_path: str):
+        """
+        Opens the database and creates the configs table if needed.
+        :param database_path: Path of the sqlite database.
+        """
+        try:
+            self.connection = sqlite3.connect(database_path, check_same_thread=False)
+            with self.connection:
+                self.connection.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            raise RuntimeError(f'Config database: {database_path} can not be opened. {e}')
+
+    @trace.traced('config')
+    def names(self) -> set:
+        """
+        Returns the names of all configs.
+        :return: Set of config names.
+        """
+        return {name for name, in self.connection.execute('SELECT name FROM configs')}
+
+    @trace.traced('config')
+    def get(self, conf: str) -> dict:
+        """
+        Returns a config.
+        :param conf: Name of the config.
+        :return: Config data.
+        """
+        row = self.connection.execute('SELECT data FROM configs WHERE name = ?', (conf,)).fetchone()
+        if row is None:
+            raise RuntimeError('Environment not found')
+        return json.loads(row[0])
+
+    @trace.traced('config')
+    def find(self, image: str) -> set:
+        """
+        Returns the names of the configs using an image.
+        :param image: Name of the image.
+        :return: Set of config names.
+        """
+        return {name for name, in self.connection.execute('SELECT name FROM configs WHERE image = ?', (image,))}
+
+    def put(self, conf: str, data: dict) -> None:
+        """
+        Writes a config.
+        :param conf: Name of the config.
+        :param data: Config data.
+        :return: None.
+        """
+        self.put_many({conf: data})
+
+    @trace.traced('config')
+    def put_many(self, configs: dict) -> None:
+        """
+        Writes many configs in a single transaction. Either all of them are written or none.
+        :param configs: Config data by name.
+        :return: None.
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO configs (name, image, data) VALUES (?, ?, ?)',
+                [(conf, data.get('image', ''), json.dumps(data)) for conf, data in configs.items()]
+            )
+
+    @trace.traced('config')
+    def delete(self, conf: str) -> None:
+        """
+        Deletes a config.
+        :param conf: Name of the config.
+        :return: None.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM configs WHERE name = ?', (conf,))
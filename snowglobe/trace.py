@@ -0,0 +1,139 @@
+import functools
+import threading
+import time
+import json
+import os
+
+
+# Recorded trace events, or None while tracing is off.
+EVENTS = None
+
+# Start time of the trace in microseconds.
+STARTED = 0
+
+
+class Span:
+    """
+    Span class. Records a complete trace event from entering to leaving the span.
+    """
+    def __init__(self, name: str, category: str, args: dict):
+        """
+        Initialises the span.
+        :param name: Name of the span.
+        :param category: Category of the span, e.g. runtime or config.
+        :param args: Arguments shown with the span.
+        """
+        self.name = name
+        self.category = category
+        self.args = args
+        self.started = 0
+
+    def __enter__(self):
+        self.started = now()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args['error'] = str(exc_value)
+        add_event(self.name, self.category, self.started, now() - self.started, self.args)
+
+    def set(self, **args) -> None:
+        """
+        Adds arguments to the span, e.g. results known only at its end.
+        :param args: Arguments.
+        :return: None.
+        """
+        self.args.update(args)
+
+
+class NullSpan:
+    """
+    NullSpan class. Stands in for spans while tracing is off.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def set(self, **args) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+def now() -> int:
+    """
+    Returns the time since the start of the trace.
+    :return: Time in microseconds.
+    """
+    return time.perf_counter_ns() // 1000 - STARTED
+
+
+def add_event(name: str, category: str, started: int, duration: int, args: dict) -> None:
+    """
+    Records a complete trace event.
+    :param name: Name of the event.
+    :param category: Category of the event.
+    :param started: Start of the event in microseconds.
+    :param duration: Duration of the event in microseconds.
+    :param args: Arguments shown with the event.
+    :return: None.
+    """
+    EVENTS.append({'name': name, 'cat': category, 'ph': 'X', 'ts': started, 'dur': duration, 'pid': os.getpid(),
+                   'tid': threading.get_ident(), 'args': args})
+
+
+def start() -> None:
+    """
+    Turns tracing on.
+    :return: None.
+    """
+    global EVENTS, STARTED
+    STARTED = time.perf_counter_ns() // 1000
+    EVENTS = []
+
+
+def span(name: str, category: str, **args):
+    """
+    Returns a span to be used as a context manager. Costs nothing but the call while tracing is off.
+    :param name: Name of the span.
+    :param category: Category of the span.
+    :param args: Arguments shown with the span.
+    :return: Span object.
+    """
+    if EVENTS is None:
+        return NULL_SPAN
+    return Span(name, category, args)
+
+
+def traced(category: str):
+    """
+    Decorator recording a span for every call of a function.
+    :param category: Category of the spans.
+    :return: Decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if EVENTS is None:
+                return function(*args, **kwargs)
+            with Span(function.__qualname__, category, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def save(file_path: str, name: str) -> None:
+    """
+    Writes the recorded events in the chrome trace event format, with a span for the whole command. Events are
+    sorted by start time, enclosing spans first.
+    :param file_path: Path of the trace file.
+    :param name: Name of the command.
+    :return: None.
+    """
+    add_event(name, 'cli', 0, now(), {})
+    events = sorted(EVENTS, key=lambda event: (event['ts'], -event['dur']))
+    with open(file_path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
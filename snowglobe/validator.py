@@ -0,0 +1,118 @@
+from collections.abc import Mapping, Sequence
+
+
+# Python types accepted and excluded for each schema type. Same as the Cerberus type definitions.
+TYPES = {
+    'boolean': ((bool,), ()),
+    'dict': ((Mapping,), ()),
+    'integer': ((int,), ()),
+    'list': ((Sequence,), (str,)),
+    'string': ((str,), ()),
+}
+
+# Schema rules understood by the compiler.
+RULES = {'type', 'required', 'nullable', 'allowed', 'min', 'schema', 'allow_unknown'}
+
+# Schemas and their check functions by schema id. Schemas are module level constants, so each is compiled once per
+# process.
+COMPILED = {}
+
+
+def compile_field(rules: dict):
+    """
+    Compiles the rules of a single field into a check function.
+    :param rules: Field rules.
+    :return: Function returning the list of errors of a value.
+    """
+    unknown = set(rules) - RULES
+    if unknown:
+        raise RuntimeError(f'Schema rules: {sorted(unknown)} are not supported')
+
+    nullable = rules.get('nullable', False)
+    types, excluded = TYPES[rules['type']] if 'type' in rules else ((object,), ())
+    type_error = f'must be of {rules.get("type")} type'
+    allowed = rules.get('allowed')
+    minimum = rules.get('min')
+    check_schema = None
+    if rules.get('type') == 'dict' and 'schema' in rules:
+        check_schema = compile_mapping(rules['schema'], rules.get('allow_unknown', False))
+    elif rules.get('type') == 'list' and 'schema' in rules:
+        check_schema = compile_items(rules['schema'])
+
+    def check(value) -> list:
+        if value is None:
+            return [] if nullable else ['null value not allowed']
+        if not isinstance(value, types) or isinstance(value, excluded):
+            return [type_error]
+
+        errors = []
+        if allowed is not None and value not in allowed:
+            errors.append(f'unallowed value {value}')
+        if minimum is not None and value < minimum:
+            errors.append(f'min value is {minimum}')
+        if check_schema is not None:
+            schema_errors = check_schema(value)
+            if schema_errors:
+                errors.append(schema_errors)
+        return errors
+
+    return check
+
+
+def compile_items(rules: dict):
+    """
+    Compiles the rules of list items into a check function.
+    :param rules: Item rules.
+    :return: Function returning the errors of a list by item index.
+    """
+    check_item = compile_field(rules)
+
+    def check(items: list) -> dict:
+        errors = {}
+        for index, item in enumerate(items):
+            item_errors = check_item(item)
+            if item_errors:
+                errors[index] = item_errors
+        return errors
+
+    return check
+
+
+def compile_mapping(schema: dict, allow_unknown: bool):
+    """
+    Compiles a mapping schema into a check function.
+    :param schema: Schema of the mapping fields.
+    :param allow_unknown: Whether fields missing from the schema are allowed.
+    :return: Function returning the errors of a mapping by field.
+    """
+    fields = {field: compile_field(rules) for field, rules in schema.items()}
+    required = [field for field, rules in schema.items() if rules.get('required')]
+
+    def check(document: dict) -> dict:
+        errors = {field: ['required field'] for field in required if field not in document}
+        for field, value in document.items():
+            if field in fields:
+                field_errors = fields[field](value)
+                if field_errors:
+                    errors[field] = field_errors
+            elif not allow_unknown:
+                errors[field] = ['unknown field']
+        # Cerberus reports errors ordered by field name.
+        return dict(sorted(errors.items())) if errors else errors
+
+    return check
+
+
+def validate(schema: dict, document: dict) -> dict:
+    """
+    Validates a document against a Cerberus style schema and returns the errors in the same format as Cerberus.
+    :param schema: Validation schema.
+    :param document: Document to validate.
+    :return: Errors by field. Empty if the document is valid.
+    """
+    if id(schema) not in COMPILED:
+        COMPILED[id(schema)] = schema, compile_mapping(schema, False)
+
+    if not isinstance(document, Mapping):
+        return {'document': ['must be of dict type']}
+    return COMPILED[id(schema)][1](document)
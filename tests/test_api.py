@@ -0,0 +1,388 @@
+import unittest
+from unittest.mock import patch
+from http import server
+import socketserver
+import threading
+import tempfile
+import shutil
+import json
+from os import path
+from urllib.parse import urlencode
+from snowglobe import api, config, runtime
+
+
+class FakeDockerHandler(server.BaseHTTPRequestHandler):
+    """
+    Stand-in docker engine api. Replies with the canned responses of the server.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def reply(self):
+        threading.Event().wait(self.server.delay)
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length).decode()) if length else None
+        self.server.requests.append((self.command, self.path, body))
+        responses = self.server.responses.get((self.command, self.path), [(404, {'message': 'page not found'})])
+        status, data = responses.pop(0) if len(responses) > 1 else responses[0]
+        payload = data if isinstance(data, bytes) else json.dumps(data).encode() if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_DELETE = reply
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeDockerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, responses):
+        super().__init__(socket_path, FakeDockerHandler)
+        self.responses = responses
+        self.requests = []
+        self.connections = 0
+        self.delay = 0
+
+
+class TestApiRuntime(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = path.join(self.directory, 'docker.sock')
+        self.responses = {}
+        self.server = FakeDockerServer(self.socket_path, self.responses)
+        threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True).start()
+        self.runtime = api.ApiRuntime(f'unix://{self.socket_path}')
+
+    def tearDown(self):
+        self.runtime.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+        runtime.BREAKER.success()
+
+    @patch('snowglobe.api.os.environ', {'DOCKER_HOST': 'unix:///DOCKER.sock'})
+    def test_docker_host(self):
+        self.assertEqual(api.ApiRuntime().host, 'unix:///DOCKER.sock')
+
+    @patch('snowglobe.api.os.environ', {})
+    def test_default_docker_host(self):
+        self.assertEqual(api.ApiRuntime().host, 'unix:///var/run/docker.sock')
+
+    def test_unsupported_docker_host(self):
+        with self.assertRaises(RuntimeError):
+            api.ApiRuntime('ssh://HOST').inspect('NAME')
+
+    def test_cannot_connect(self):
+        with self.assertRaises(RuntimeError):
+            api.ApiRuntime(f'unix://{self.directory}/MISSING.sock').inspect('NAME')
+
+    def test_inspect_container_not_found(self):
+        self.responses[('GET', '/containers/NAME/json')] = [(404, {'message': 'No such container: NAME'})]
+
+        with self.assertRaises(RuntimeError):
+            self.runtime.inspect('NAME')
+
+    def test_inspect(self):
+        self.responses[('GET', '/containers/NAME/json')] = [(200, {'Name': '/NAME'})]
+
+        res = self.runtime.inspect('NAME')
+
+        self.assertEqual(res, {'Name': '/NAME'})
+
+    def test_states(self):
+        self.responses[('GET', '/containers/NAME-1/json')] = [(200, {
+            'State': {'Status': 'running', 'StartedAt': '2020-01-01T10:00:00Z'}, 'Image': 'sha256:ID',
+            'NetworkSettings': {'Ports': {'80/tcp': None}}})]
+        self.responses[('GET', '/containers/NAME-2/json')] = [(404, {'message': 'No such container: NAME-2'})]
+
+        res = self.runtime.states(['NAME-1', 'NAME-2'])
+
+        self.assertEqual(res, {'NAME-1': {'state': 'running', 'started_at': '2020-01-01T10:00:00Z',
+                                          'image': 'sha256:ID', 'ports': {'80/tcp': None}}})
+
+    def test_keep_alive_connection(self):
+        self.responses[('GET', '/containers/NAME/json')] = [(200, {})]
+        self.responses[('POST', '/containers/NAME/stop')] = [(204, None)]
+        self.responses[('DELETE', '/containers/NAME')] = [(204, None)]
+
+        self.runtime.inspect('NAME')
+        self.runtime.stop('NAME')
+        self.runtime.remove('NAME')
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_reconnect_after_connection_closed(self):
+        self.responses[('GET', '/containers/NAME/json')] = [(200, {})]
+        self.runtime.inspect('NAME')
+        self.runtime.connection.sock.close()
+        self.runtime.connection.sock = None
+
+        self.runtime.inspect('NAME')
+
+        self.assertEqual(self.server.connections, 2)
+
+    def test_connection_per_thread(self):
+        self.responses[('GET', '/containers/NAME/json')] = [(200, {})]
+        self.runtime.inspect('NAME')
+        thread = threading.Thread(target=self.runtime.inspect, args=('NAME',))
+        thread.start()
+        thread.join()
+
+        self.runtime.inspect('NAME')
+
+        self.assertEqual(self.server.connections, 2)
+
+    def test_status(self):
+        filters = json.dumps({'name': ['^/NAME\\-1$', '^/NAME\\-2$']})
+        self.responses[('GET', f'/containers/json?{urlencode({"all": 1, "filters": filters})}')] = [(200, [
+            {'Names': ['/NAME-2'], 'State': 'exited', 'Status': 'Exited (0) 2 hours ago', 'ImageID': 'sha256:ID',
+             'Ports': []},
+            {'Names': ['/NAME-1'], 'State': 'running', 'Status': 'Up 5 minutes (healthy)', 'ImageID': 'sha256:ID',
+             'Ports': [{'IP': '0.0.0.0', 'PrivatePort': 80, 'PublicPort': 8080, 'Type': 'tcp'},
+                       {'PrivatePort': 443, 'Type': 'tcp'}]},
+        ])]
+
+        res = self.runtime.status(['NAME-1', 'NAME-2'])
+
+        self.assertEqual(res, {
+            'NAME-1': {'state': 'running', 'uptime': '5 minutes', 'image': 'sha256:ID',
+                       'ports': '0.0.0.0:8080->80/tcp, 443/tcp'},
+            'NAME-2': {'state': 'exited', 'uptime': '', 'image': 'sha256:ID', 'ports': ''},
+        })
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_containers(self):
+        self.responses[('GET', '/containers/json?all=1')] = [(200, [
+            {'Names': ['/NAME-1'], 'State': 'running', 'Labels': {config.MANAGED_LABEL: 'true', 'KEY': 'VALUE'}},
+            {'Names': ['/NAME-2'], 'State': 'exited', 'Labels': None},
+        ])]
+
+        res = self.runtime.containers()
+
+        self.assertEqual(res, {
+            'NAME-1': {'running': True, 'labels': {config.MANAGED_LABEL: 'true'}},
+            'NAME-2': {'running': False, 'labels': {}},
+        })
+
+    def test_rename(self):
+        self.responses[('POST', '/containers/NAME-spare-1/rename?name=NAME')] = [(204, None)]
+
+        self.runtime.rename('NAME-spare-1', 'NAME')
+
+        self.assertEqual(self.server.requests, [('POST', '/containers/NAME-spare-1/rename?name=NAME', None)])
+
+    def test_rename_error(self):
+        self.responses[('POST', '/containers/NAME-spare-1/rename?name=NAME')] = [(409, {'message': 'name in use'})]
+
+        with self.assertRaises(RuntimeError):
+            self.runtime.rename('NAME-spare-1', 'NAME')
+
+    def test_commit(self):
+        query = urlencode({'container': 'NAME', 'repo': 'snowglobe/name', 'tag': 'TAG',
+                           'changes': f'LABEL {config.SNAPSHOT_LABEL}=ENV'})
+        self.responses[('POST', f'/commit?{query}')] = [(201, {'Id': 'sha256:ID'})]
+
+        self.runtime.commit('NAME', 'snowglobe/name:TAG', 'ENV')
+
+        self.assertEqual(self.server.requests, [('POST', f'/commit?{query}', None)])
+
+    def test_snapshots(self):
+        filters = json.dumps({'label': [f'{config.SNAPSHOT_LABEL}=ENV']})
+        self.responses[('GET', f'/images/json?{urlencode({"filters": filters})}')] = [(200, [
+            {'RepoTags': ['snowglobe/name:TAG'], 'Created': 1577872800, 'Size': 1234567890},
+        ])]
+
+        res = self.runtime.snapshots('ENV')
+
+        self.assertEqual(res, [{'image': 'snowglobe/name:TAG', 'created': '2020-01-01 10:00:00', 'size': '1.235GB'}])
+
+    def test_remove_image_error(self):
+        self.responses[('DELETE', '/images/snowglobe%2Fname%3ATAG')] = [(409, {'message': 'image is in use'})]
+
+        with self.assertRaises(RuntimeError):
+            self.runtime.remove_image('snowglobe/name:TAG')
+
+    @patch('snowglobe.api.print')
+    def test_create(self, mocked_print):
+        self.responses[('POST', '/containers/create?name=NAME')] = [(201, {'Id': 'ID'})]
+        create = {
+            'command': ['COMMAND'],
+            'entrypoint': 'ENTRYPOINT',
+            'envs': {
+                'KEY': 'VALUE',
+            },
+            'ports': [
+                {
+                    'containerPort': 8080,
+                    'hostPort': 8080,
+                },
+                {
+                    'containerPort': 80,
+                    'hostPort': 80,
+                    'hostIP': '120.0.0.1',
+                    'protocol': 'udp'
+                },
+            ],
+            'volumes': [
+                {
+                    'hostPath': '/PATH/ON/HOST',
+                    'containerPath': '/PATH/ON/CONTAINER',
+                    'mode': 'rw',
+                }
+            ],
+            'options': '-it --hostname HOSTNAME --restart=on-failure:3 -l KEY=VALUE',
+        }
+
+        self.runtime.create('NAME', 'IMAGE', create)
+
+        self.assertEqual(self.server.requests, [('POST', '/containers/create?name=NAME', {
+            'Image': 'IMAGE',
+            'Cmd': ['COMMAND'],
+            'Entrypoint': ['ENTRYPOINT'],
+            'Env': ['KEY=VALUE'],
+            'Hostname': 'HOSTNAME',
+            'Labels': {config.MANAGED_LABEL: 'true', config.SPEC_LABEL: config.spec_hash('IMAGE', create),
+                       config.STORE_LABEL: config.store_id(), 'KEY': 'VALUE'},
+            'AttachStdin': True,
+            'AttachStdout': True,
+            'AttachStderr': True,
+            'OpenStdin': True,
+            'StdinOnce': True,
+            'Tty': True,
+            'ExposedPorts': {'8080/tcp': {}, '80/udp': {}},
+            'HostConfig': {
+                'PortBindings': {
+                    '8080/tcp': [{'HostIp': '', 'HostPort': '8080'}],
+                    '80/udp': [{'HostIp': '120.0.0.1', 'HostPort': '80'}],
+                },
+                'Binds': ['/PATH/ON/HOST:/PATH/ON/CONTAINER:rw'],
+                'RestartPolicy': {'Name': 'on-failure', 'MaximumRetryCount': 3},
+            },
+        })])
+        mocked_print.assert_not_called()
+
+    @patch('snowglobe.api.print')
+    def test_create_pulls_missing_image(self, mocked_print):
+        self.responses[('POST', '/containers/create?name=NAME')] = [(404, {'message': 'No such image: IMAGE:TAG'}),
+                                                                     (201, {'Id': 'ID'})]
+        self.responses[('POST', '/images/create?fromImage=IMAGE&tag=TAG')] = [(200, b'{"status": "PULLED"}\n')]
+
+        self.runtime.create('NAME', 'IMAGE:TAG', {'command': []})
+
+        self.assertEqual([request[1] for request in self.server.requests], [
+            '/containers/create?name=NAME', '/images/create?fromImage=IMAGE&tag=TAG', '/containers/create?name=NAME'
+        ])
+
+    def test_has_image(self):
+        self.responses[('GET', '/images/IMAGE%3ATAG/json')] = [(200, {'Id': 'ID'}), (404, {'message': 'No such image'})]
+
+        self.assertTrue(self.runtime.has_image('IMAGE:TAG'))
+        self.assertFalse(self.runtime.has_image('IMAGE:TAG'))
+
+    def test_image_labels(self):
+        self.responses[('GET', '/images/IMAGE/json')] = [(200, {'Config': {'Labels': {'KEY': 'VALUE'}}}),
+                                                          (200, {'Config': {'Labels': None}}),
+                                                          (404, {'message': 'No such image'})]
+
+        self.assertEqual(self.runtime.image_labels('IMAGE'), {'KEY': 'VALUE'})
+        self.assertEqual(self.runtime.image_labels('IMAGE'), {})
+        self.assertIsNone(self.runtime.image_labels('IMAGE'))
+
+    def test_pull_error(self):
+        self.responses[('POST', '/images/create?fromImage=IMAGE&tag=TAG')] = [
+            (200, b'{"status": "PULLING"}\n{"error": "manifest unknown"}\n')
+        ]
+
+        with self.assertRaisesRegex(RuntimeError, 'manifest unknown'):
+            self.runtime.pull('IMAGE:TAG')
+
+    def test_create_unsupported_option(self):
+        with self.assertRaises(RuntimeError):
+            self.runtime.create('NAME', 'IMAGE', {'command': [], 'options': '--cpus 2'})
+
+        self.assertEqual(self.server.requests, [])
+
+    def test_split_image(self):
+        self.assertEqual(api.split_image('IMAGE'), {'fromImage': 'IMAGE', 'tag': 'latest'})
+        self.assertEqual(api.split_image('HOST:5000/IMAGE'), {'fromImage': 'HOST:5000/IMAGE', 'tag': 'latest'})
+        self.assertEqual(api.split_image('IMAGE:TAG'), {'fromImage': 'IMAGE', 'tag': 'TAG'})
+        self.assertEqual(api.split_image('IMAGE@sha256:ID'), {'fromImage': 'IMAGE', 'tag': 'sha256:ID'})
+
+    @patch('snowglobe.api.print')
+    def test_start(self, mocked_print):
+        self.responses[('POST', '/containers/NAME/start')] = [(204, None)]
+
+        self.runtime.start('NAME', '')
+
+        mocked_print.assert_called_with('NAME')
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_start_attached(self, mocked_run):
+        self.runtime.start('NAME', '-i')
+
+        mocked_run.assert_called_with(['docker', 'container', 'start', '-i', 'NAME'])
+        self.assertEqual(self.server.requests, [])
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_exec(self, mocked_run):
+        self.runtime.exec('NAME', 'EXEC-NAME', [{'name': 'EXEC-NAME', 'command': 'EXEC_COMMAND', 'options': '-it'}])
+
+        mocked_run.assert_called_with(['docker', 'container', 'exec', '-it', 'NAME', 'EXEC_COMMAND'])
+
+    @patch('snowglobe.api.print')
+    def test_stop_error(self, mocked_print):
+        self.responses[('POST', '/containers/NAME/stop')] = [(404, {'message': 'No such container: NAME'})]
+
+        self.runtime.stop('NAME')
+
+        self.assertEqual(mocked_print.call_args[0], ('Error response from daemon: No such container: NAME',))
+
+    def test_remove(self):
+        self.responses[('DELETE', '/containers/NAME')] = [(204, None)]
+
+        self.runtime.remove('NAME')
+
+        self.assertEqual(self.server.requests, [('DELETE', '/containers/NAME', None)])
+
+
+    def test_remove_force(self):
+        self.responses[('DELETE', '/containers/NAME?force=true')] = [(204, None)]
+
+        self.runtime.remove('NAME', force=True)
+
+        self.assertEqual(self.server.requests, [('DELETE', '/containers/NAME?force=true', None)])
+
+    def test_stop_settings(self):
+        self.responses[('POST', '/containers/NAME/stop?t=0&signal=SIGKILL')] = [(204, None)]
+
+        self.runtime.stop('NAME', timeout=0, signal='SIGKILL')
+
+        self.assertEqual(self.server.requests, [('POST', '/containers/NAME/stop?t=0&signal=SIGKILL', None)])
+
+    @patch.dict('snowglobe.api.os.environ', {'SNOWGLOBE_TIMEOUTS': 'default=0.05'})
+    @patch('snowglobe.runtime.time.sleep')
+    def test_timeout(self, mocked_sleep):
+        self.server.delay = 0.2
+        self.responses[('GET', '/containers/NAME/json')] = [(200, {})]
+        self.responses[('POST', '/containers/NAME/restart')] = [(204, None)]
+
+        with self.assertRaises(runtime.RetriesExhausted):
+            self.runtime.inspect('NAME')
+        with self.assertRaises(runtime.DockerUnavailable):
+            self.runtime.restart('NAME')
+
+        self.assertEqual(mocked_sleep.call_count, runtime.RETRIES)
+        self.assertEqual(self.server.connections, runtime.RETRIES + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
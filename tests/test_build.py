@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import shutil
+import json
+import os
+from os import path
+from snowglobe import build
+
+
+class TestBuild(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.context = path.join(self.directory, 'context')
+        os.makedirs(path.join(self.context, 'src'))
+        self.write('Dockerfile', 'FROM alpine\nCOPY . /app\n')
+        self.write('src/main.py', 'print("hello")\n')
+        self.cache_path = path.join(self.directory, 'cache.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        with open(path.join(self.context, name), 'w') as f:
+            f.write(content)
+
+    def context_hash(self, **kwargs):
+        return build.context_hash(self.context, cache=build.HashCache(self.cache_path), **kwargs)
+
+    def test_context_hash(self):
+        res = self.context_hash()
+
+        self.assertEqual(res, self.context_hash())
+        self.assertNotEqual(res, self.context_hash(args={'VERSION': '1'}))
+        self.write('src/main.py', 'print("bye")\n')
+        self.assertNotEqual(res, self.context_hash())
+
+    def test_context_hash_executable_bit(self):
+        res = self.context_hash()
+
+        os.chmod(path.join(self.context, 'src', 'main.py'), 0o755)
+
+        self.assertNotEqual(res, self.context_hash())
+
+    def test_context_hash_dockerignore(self):
+        self.write('.dockerignore', '# Comment\nbuild\n*.log\n!keep.log\n')
+        res = self.context_hash()
+
+        os.mkdir(path.join(self.context, 'build'))
+        self.write('build/output', 'OUTPUT')
+        self.write('debug.log', 'DEBUG')
+        self.assertEqual(res, self.context_hash())
+        self.write('keep.log', 'KEEP')
+        self.assertNotEqual(res, self.context_hash())
+
+    def test_context_files(self):
+        self.write('.dockerignore', 'src\n')
+        os.symlink('src', path.join(self.context, 'link'))
+
+        res = build.context_files(self.context, build.ignore_patterns(self.context))
+
+        self.assertEqual(res, ['.dockerignore', 'Dockerfile', 'link'])
+
+    def test_context_files_nested(self):
+        self.write('.dockerignore', '*.md\nsrc/*.py\n**/*.tmp\n')
+        os.makedirs(path.join(self.context, 'docs', 'api'))
+        os.makedirs(path.join(self.context, 'src', 'lib'))
+        for name in ['README.md', 'docs/readme.md', 'docs/api/cache.tmp', 'src/lib/util.py', 'cache.tmp']:
+            self.write(name, 'CONTENT')
+
+        res = build.context_files(self.context, build.ignore_patterns(self.context))
+
+        self.assertEqual(res, ['.dockerignore', 'Dockerfile', 'docs/readme.md', 'src/lib/util.py'])
+
+    def test_is_ignored(self):
+        patterns = [('docs/**/*.md', True)]
+
+        self.assertTrue(build.is_ignored('docs/readme.md', patterns))
+        self.assertTrue(build.is_ignored('docs/api/v1/readme.md', patterns))
+        self.assertFalse(build.is_ignored('src/docs/readme.md', patterns))
+        self.assertTrue(build.is_ignored('src/main.py', [('**', True)]))
+
+    def test_context_hash_uses_cache(self):
+        res = self.context_hash()
+
+        with patch('snowglobe.build.file_digest') as mocked_digest:
+            mocked_digest.return_value = 'DIGEST'
+            self.assertEqual(res, build.context_hash(self.context, cache=build.HashCache(self.cache_path)))
+
+        mocked_digest.assert_not_called()
+        with open(self.cache_path, 'r') as f:
+            self.assertEqual(set(json.load(f)['contexts'][self.context]), {'Dockerfile', 'src/main.py'})
+
+    def test_context_hash_cache_drops_removed_files(self):
+        self.context_hash()
+
+        os.remove(path.join(self.context, 'src', 'main.py'))
+        self.context_hash()
+
+        with open(self.cache_path, 'r') as f:
+            self.assertEqual(set(json.load(f)['contexts'][self.context]), {'Dockerfile'})
+
+    def test_context_hash_missing_dockerfile(self):
+        with self.assertRaises(RuntimeError):
+            self.context_hash(dockerfile='MISSING')
+
+
+if __name__ == '__main__':
+    unittest.main()
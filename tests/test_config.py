@@ -1,5 +1,10 @@
 import unittest
 from unittest.mock import Mock, patch
+import tempfile
+import shutil
+import json
+import os
+from os import path
 from snowglobe import config
 
 
@@ -13,109 +18,350 @@ class TestConfig(unittest.TestCase):
         pass
 
     def setUp(self):
-        pass
+        self.directory = tempfile.mkdtemp()
+        self.config_path = path.join(self.directory, 'configs')
+        os.mkdir(self.config_path)
+        with open(path.join(self.config_path, 'README'), 'w') as f:
+            f.write('README')
+        patcher = patch('snowglobe.config.path.abspath')
+        self.addCleanup(patcher.stop)
+        patcher.start().return_value = path.join(self.directory, 'config.py')
 
     def tearDown(self):
-        pass
+        shutil.rmtree(self.directory)
+
+    def write_config(self, conf, data):
+        with open(path.join(self.config_path, f'{conf}.json'), 'w') as f:
+            json.dump(data, f)
 
     def test_get_template(self):
         res = config.Config.get_template()
 
         self.assertEqual(res, config.TEMPLATE)
 
-    @patch('snowglobe.config.path.abspath')
-    @patch('snowglobe.config.listdir')
-    def test_get_config_config_does_not_exist(self, mocked_listdir, mocked_abspath):
-        mocked_abspath.return_value = '/PACKAGE/DIRECTORY/config.py'
-        mocked_listdir.return_value = ['README']
+    def test_confs(self):
+        self.write_config('NAME-1', {})
+        self.write_config('NAME-2', {})
+
+        conf = config.Config()
+
+        self.assertEqual(conf.confs, {'NAME-1', 'NAME-2'})
+
+    def test_get_config_config_does_not_exist(self):
         conf = config.Config()
 
         with self.assertRaises(RuntimeError):
             conf.get_config('NAME')
 
-    @patch('snowglobe.config.path.abspath')
-    @patch('snowglobe.config.listdir')
+    def test_get_config(self):
+        self.write_config('NAME', {'KEY': 'VALUE'})
+        conf = config.Config()
+
+        res = conf.get_config('NAME')
+
+        self.assertEqual(res, {'KEY': 'VALUE'})
+
     @patch('snowglobe.config.open')
-    @patch('snowglobe.config.json.load')
-    def test_get_config(self, mocked_json_load, mocked_open, mocked_listdir, mocked_abspath):
-        mocked_abspath.return_value = '/PACKAGE/DIRECTORY/config.py'
-        mocked_listdir.return_value = ['NAME.json', 'README']
-        mocked_file_handler = Mock()
-        mocked_file_handler.__enter__ = Mock()
-        mocked_file_handler.__exit__ = Mock()
-        mocked_file_handler.__enter__.return_value = mocked_file_handler
-        mocked_open.return_value = mocked_file_handler
-        mocked_json_load.return_value = {'KEY': 'VALUE'}
+    def test_get_config_from_index(self, mocked_open):
+        self.write_config('NAME', {'KEY': 'VALUE'})
+        mocked_open.side_effect = open
+        config.Config()
+        mocked_open.reset_mock()
         conf = config.Config()
 
+        res = conf.get_config('NAME')
         res = conf.get_config('NAME')
 
-        mocked_open.assert_called_with('/PACKAGE/DIRECTORY/configs/NAME.json', 'r')
-        mocked_json_load.assert_called_with(mocked_file_handler)
+        mocked_open.assert_called_once_with(path.join(self.config_path, config.INDEX_FILE), 'r')
         self.assertEqual(res, {'KEY': 'VALUE'})
 
-    @patch('snowglobe.config.path.abspath')
-    @patch('snowglobe.config.listdir')
-    @patch('snowglobe.config.Validator')
-    def test_set_config_validation_error(self, mocked_validator, mocked_listdir, mocked_abspath):
-        mocked_abspath.return_value = '/PACKAGE/DIRECTORY/config.py'
-        mocked_listdir.return_value = ['NAME.json', 'README']
-        mocked_validator_object = Mock()
-        mocked_validator_object.validate.return_value = False
-        mocked_validator.return_value = mocked_validator_object
+    def test_index_updates_changed_config(self):
+        self.write_config('NAME-1', {'KEY': 'VALUE'})
+        self.write_config('NAME-2', {'KEY': 'VALUE'})
+        config.Config()
+        self.write_config('NAME-1', {'KEY': 'NEW-VALUE'})
+        os.remove(path.join(self.config_path, 'NAME-2.json'))
+        self.write_config('NAME-3', {})
+
+        conf = config.Config()
+
+        self.assertEqual(conf.confs, {'NAME-1', 'NAME-3'})
+        self.assertEqual(conf.get_config('NAME-1'), {'KEY': 'NEW-VALUE'})
+
+    def test_index_detects_config_edited_in_place(self):
+        self.write_config('NAME', {'KEY': 'VALUE'})
+        config.Config()
+        config_mtime = os.stat(self.config_path).st_mtime_ns
+        self.write_config('NAME', {'KEY': 'NEW-VALUE'})
+        os.utime(self.config_path, ns=(config_mtime, config_mtime))
+
+        conf = config.Config()
+
+        self.assertEqual(conf.get_config('NAME'), {'KEY': 'NEW-VALUE'})
+
+    def test_index_corrupt(self):
+        self.write_config('NAME', {'KEY': 'VALUE'})
+        with open(path.join(self.config_path, config.INDEX_FILE), 'w') as f:
+            f.write('INVALID-JSON')
+
+        conf = config.Config()
+
+        self.assertEqual(conf.get_config('NAME'), {'KEY': 'VALUE'})
+
+    def test_set_config_validation_error(self):
         conf = config.Config()
 
         with self.assertRaises(RuntimeError):
             conf.set_config('NAME', {})
 
-        mocked_validator_object.validate.assert_called_with({})
+        self.assertFalse(path.exists(path.join(self.config_path, 'NAME.json')))
 
-    @patch('snowglobe.config.path.abspath')
-    @patch('snowglobe.config.listdir')
-    @patch('snowglobe.config.Validator')
-    @patch('snowglobe.config.open')
-    @patch('snowglobe.config.json.dump')
-    def test_set_config(self, mocked_json_dump, mocked_open, mocked_validator, mocked_listdir, mocked_abspath):
-        mocked_abspath.return_value = '/PACKAGE/DIRECTORY/config.py'
-        mocked_listdir.return_value = ['NAME.json', 'README']
-        mocked_validator_object = Mock()
-        mocked_validator_object.validate.return_value = True
-        mocked_validator_object.document = {}
-        mocked_validator.return_value = mocked_validator_object
-        mocked_file_handler = Mock()
-        mocked_file_handler.__enter__ = Mock()
-        mocked_file_handler.__exit__ = Mock()
-        mocked_file_handler.__enter__.return_value = mocked_file_handler
-        mocked_open.return_value = mocked_file_handler
-        mocked_json_dump.return_value = None
-        conf = config.Config()
-
-        conf.set_config('NAME', {})
-
-        mocked_validator_object.validate.assert_called_with({})
-        mocked_open.assert_called_with('/PACKAGE/DIRECTORY/configs/NAME.json', 'w')
-        mocked_json_dump.assert_called_with({}, mocked_file_handler, indent=4)
-
-    @patch('snowglobe.config.path.abspath')
-    @patch('snowglobe.config.listdir')
-    def test_del_config_config_does_not_exist(self, mocked_listdir, mocked_abspath):
-        mocked_abspath.return_value = '/PACKAGE/DIRECTORY/config.py'
-        mocked_listdir.return_value = ['README']
+    def test_set_config(self):
+        conf = config.Config()
+
+        conf.set_config('NAME', config.TEMPLATE)
+
+        with open(path.join(self.config_path, 'NAME.json'), 'r') as f:
+            self.assertEqual(json.load(f), config.TEMPLATE)
+        self.assertEqual(conf.confs, {'NAME'})
+        self.assertEqual(conf.get_config('NAME'), config.TEMPLATE)
+        self.assertEqual(config.Config().get_config('NAME'), config.TEMPLATE)
+
+    def test_validate(self):
+        data = dict(config.TEMPLATE, depends_on=[{'name': 'DB', 'condition': 'healthy', 'timeout': 30}])
+
+        res = config.Config.validate(data)
+
+        self.assertEqual(res, data)
+
+    def test_validate_stop_timeout(self):
+        data = dict(config.TEMPLATE, stop={'timeout': -1})
+
+        with self.assertRaises(RuntimeError) as context:
+            config.Config.validate(data)
+
+        error = "{'stop': [{'timeout': ['min value is 0']}]}"
+        self.assertEqual(str(context.exception), f'Error in config format. Error: {error}')
+
+    def test_validate_build(self):
+        data = dict(config.TEMPLATE, build={'dockerfile': 'Dockerfile', 'args': {'VERSION': '1'}})
+
+        with self.assertRaises(RuntimeError) as context:
+            config.Config.validate(data)
+
+        error = "{'build': [{'context': ['required field']}]}"
+        self.assertEqual(str(context.exception), f'Error in config format. Error: {error}')
+        self.assertEqual(config.Config.validate(dict(data, build={'context': '.'})), dict(data, build={'context': '.'}))
+
+    def test_validate_ready(self):
+        data = dict(config.TEMPLATE, ready={'port': 8080, 'log': 'listening', 'timeout': 30},
+                    depends_on=[{'name': 'DB', 'condition': 'ready'}])
+
+        self.assertEqual(config.Config.validate(data), data)
+        with self.assertRaises(RuntimeError):
+            config.Config.validate(dict(data, ready={'port': 0}))
+
+    def test_validate_dependency_condition(self):
+        data = dict(config.TEMPLATE, depends_on=[{'name': 'DB', 'condition': 'CONDITION'}])
+
+        with self.assertRaises(RuntimeError) as context:
+            config.Config.validate(data)
+
+        error = "{'depends_on': [{0: [{'condition': ['unallowed value CONDITION']}]}]}"
+        self.assertEqual(str(context.exception), f'Error in config format. Error: {error}')
+
+    def test_set_config_replaces_file(self):
+        conf = config.Config()
+        conf.set_config('NAME', config.TEMPLATE)
+        data = dict(config.TEMPLATE, image='NEW-IMAGE')
+
+        conf.set_config('NAME', data)
+
+        self.assertEqual(sorted(os.listdir(self.config_path)), sorted([config.INDEX_FILE, 'NAME.json', 'README']))
+        self.assertEqual(config.Config().get_config('NAME'), data)
+
+    def test_find_configs(self):
+        conf = config.Config()
+        conf.set_config('NAME-1', config.TEMPLATE)
+        conf.set_config('NAME-2', dict(config.TEMPLATE, image='OTHER-IMAGE'))
+
+        res = conf.find_configs('IMAGE:TAG')
+
+        self.assertEqual(res, ['NAME-1'])
+
+    def test_import_and_export_configs(self):
+        directory = path.join(self.directory, 'export')
+        conf = config.Config()
+        conf.set_config('NAME-1', config.TEMPLATE)
+        conf.set_config('NAME-2', config.TEMPLATE)
+
+        exported = conf.export_configs(directory)
+        imported = config.Config('sqlite').import_configs(directory)
+
+        self.assertEqual(exported, ['NAME-1', 'NAME-2'])
+        self.assertEqual(imported, ['NAME-1', 'NAME-2'])
+        self.assertEqual(config.Config('sqlite').get_config('NAME-2'), config.TEMPLATE)
+
+    def test_import_configs_validation_error(self):
+        directory = path.join(self.directory, 'import')
+        os.mkdir(directory)
+        with open(path.join(directory, 'NAME-1.json'), 'w') as f:
+            json.dump(config.TEMPLATE, f)
+        with open(path.join(directory, 'NAME-2.json'), 'w') as f:
+            json.dump({}, f)
+        conf = config.Config('sqlite')
+
+        with self.assertRaises(RuntimeError):
+            conf.import_configs(directory)
+
+        self.assertEqual(config.Config('sqlite').confs, set())
+
+    def test_import_configs_check(self):
+        directory = path.join(self.directory, 'import')
+        os.mkdir(directory)
+        with open(path.join(directory, 'NAME-1.json'), 'w') as f:
+            json.dump(config.TEMPLATE, f)
+        check = Mock(side_effect=RuntimeError('CHECK'))
+
+        with self.assertRaisesRegex(RuntimeError, 'CHECK'):
+            config.Config('sqlite').import_configs(directory, check)
+
+        check.assert_called_once_with({'NAME-1': config.TEMPLATE})
+        self.assertEqual(config.Config('sqlite').confs, set())
+
+    def test_import_configs_resolves_build_context(self):
+        directory = path.join(self.directory, 'import')
+        os.mkdir(directory)
+        with open(path.join(directory, 'NAME-1.json'), 'w') as f:
+            json.dump(dict(config.TEMPLATE, build={'context': '../webapp'}), f)
+        with open(path.join(directory, 'NAME-2.json'), 'w') as f:
+            json.dump(dict(config.TEMPLATE, build={'context': '/CONTEXT'}), f)
+        conf = config.Config()
+
+        with patch('snowglobe.config.path.abspath', lambda file_path: file_path):
+            res = conf.load_directory(directory)
+
+        self.assertEqual(res['NAME-1']['build']['context'], path.join(self.directory, 'webapp'))
+        self.assertEqual(res['NAME-2']['build']['context'], '/CONTEXT')
+
+    def test_config_directory_from_environment(self):
+        directory = path.join(self.directory, 'other')
+        os.mkdir(directory)
+        with patch.dict('snowglobe.config.os.environ', {'SNOWGLOBE_CONFIG_DIR': directory}):
+            config.Config().set_config('NAME', config.TEMPLATE)
+
+        self.assertTrue(path.exists(path.join(directory, 'NAME.json')))
+        self.assertEqual(config.Config().confs, set())
+
+    def test_unknown_store(self):
+        with self.assertRaises(RuntimeError):
+            config.Config('STORE')
+
+    def test_spec_hash(self):
+        create = {
+            'command': [],
+            'ports': [{'hostPort': 80, 'containerPort': 80}, {'hostPort': 443, 'containerPort': 443}],
+            'volumes': [{'hostPath': '/HOST', 'containerPath': '/CONTAINER'}],
+        }
+        same = {
+            'ports': [{'hostPort': 443, 'containerPort': 443, 'protocol': 'tcp'},
+                      {'hostPort': 80, 'containerPort': 80}],
+            'volumes': [{'hostPath': '/HOST', 'containerPath': '/CONTAINER', 'mode': 'rw'}],
+            'options': '',
+        }
+
+        res = config.spec_hash('IMAGE', create)
+
+        self.assertEqual(res, config.spec_hash('IMAGE', same))
+        self.assertNotEqual(res, config.spec_hash('OTHER-IMAGE', create))
+        self.assertNotEqual(res, config.spec_hash('IMAGE', dict(create, envs={'KEY': 'VALUE'})))
+        self.assertNotEqual(res, config.spec_hash('IMAGE', create, 'BUILD-HASH'))
+        self.assertNotEqual(config.spec_hash('IMAGE', create, 'BUILD-HASH'), config.spec_hash('IMAGE', create, 'OTHER'))
+
+    def test_del_config_config_does_not_exist(self):
         conf = config.Config()
 
         with self.assertRaises(RuntimeError):
             conf.del_config('NAME')
 
-    @patch('snowglobe.config.path.abspath')
-    @patch('snowglobe.config.listdir')
-    @patch('snowglobe.config.remove')
-    def test_del_config(self, mocked_remove, mocked_listdir, mocked_abspath):
-        mocked_abspath.return_value = '/PACKAGE/DIRECTORY/config.py'
-        mocked_listdir.return_value = ['NAME', 'README']
+    def test_del_config(self):
+        self.write_config('NAME', {})
+        conf = config.Config()
+
+        conf.del_config('NAME')
+
+        self.assertFalse(path.exists(path.join(self.config_path, 'NAME.json')))
+        self.assertEqual(conf.confs, set())
+        self.assertEqual(config.Config().confs, set())
+
+    def test_del_config_from_many_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        names = [f'NAME-{index}' for index in range(200)]
+        for name in names:
+            self.write_config(name, {'name': name})
         conf = config.Config()
 
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(conf.del_config, names))
+
+        self.assertEqual(config.Config().confs, set())
+
+
+class TestSqliteStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(path.join(self.directory, 'configs'))
+        patcher = patch('snowglobe.config.path.abspath')
+        self.addCleanup(patcher.stop)
+        patcher.start().return_value = path.join(self.directory, 'config.py')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_set_config(self):
+        conf = config.Config('sqlite')
+
+        conf.set_config('NAME', config.TEMPLATE)
+
+        self.assertTrue(path.exists(path.join(self.directory, 'configs', config.DATABASE_FILE)))
+        self.assertEqual(conf.confs, {'NAME'})
+        self.assertEqual(config.Config('sqlite').get_config('NAME'), config.TEMPLATE)
+
+    def test_store_from_environment(self):
+        database = path.join(self.directory, 'configs.db')
+        with patch.dict('snowglobe.config.os.environ', {'SNOWGLOBE_STORE': 'sqlite', 'SNOWGLOBE_DB': database}):
+            config.Config().set_config('NAME', config.TEMPLATE)
+
+        self.assertTrue(path.exists(database))
+
+    def test_find_configs(self):
+        conf = config.Config('sqlite')
+        conf.set_config('NAME-1', config.TEMPLATE)
+        conf.set_config('NAME-2', dict(config.TEMPLATE, image='OTHER-IMAGE'))
+
+        res = conf.find_configs('OTHER-IMAGE')
+
+        self.assertEqual(res, ['NAME-2'])
+
+    def test_del_config(self):
+        conf = config.Config('sqlite')
+        conf.set_config('NAME', config.TEMPLATE)
+
         conf.del_config('NAME')
-        mocked_remove.assert_called_with('/PACKAGE/DIRECTORY/configs/NAME.json')
+
+        self.assertEqual(conf.confs, set())
+        self.assertEqual(config.Config('sqlite').confs, set())
+        with self.assertRaises(RuntimeError):
+            conf.get_config('NAME')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,243 @@
+import unittest
+from unittest.mock import Mock, patch
+import threading
+import tempfile
+import socket
+import shutil
+import json
+import time
+import os
+from os import path
+from snowglobe import daemon, config
+
+
+def states(*names, state='running', image='sha256:0123456789abcdef'):
+    return {name: {'state': state, 'started_at': '2020-01-01T00:00:00.000000000Z', 'image': image,
+                   'ports': {'80/tcp': [{'HostIp': '0.0.0.0', 'HostPort': '8080'}]}} for name in names}
+
+
+def event(action, name, **attributes):
+    return {'Type': 'container', 'Action': action, 'Actor': {'ID': 'ID', 'Attributes': dict(name=name, **attributes)}}
+
+
+class TestStateCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.runtime = Mock()
+        self.runtime.states.side_effect = lambda names: states(*names)
+        self.cache = daemon.StateCache(self.runtime)
+
+    def tearDown(self):
+        pass
+
+    def test_status_inspects_once(self):
+        self.cache.status(['NAME'])
+        res = self.cache.status(['NAME'])
+
+        self.runtime.states.assert_called_once_with(['NAME'])
+        self.assertEqual(res['NAME']['state'], 'running')
+        self.assertEqual(res['NAME']['image'], 'sha256:0123456789abcdef')
+        self.assertEqual(res['NAME']['ports'], '0.0.0.0:8080->80/tcp')
+
+    def test_status_inspects_missing_names_together(self):
+        self.cache.status(['NAME-1'])
+
+        res = self.cache.status(['NAME-1', 'NAME-2', 'NAME-3'])
+
+        self.runtime.states.assert_called_with(['NAME-2', 'NAME-3'])
+        self.assertEqual(self.runtime.states.call_count, 2)
+        self.assertEqual(list(res), ['NAME-1', 'NAME-2', 'NAME-3'])
+
+    def test_status_inspects_without_lock(self):
+        def locked_states(names):
+            self.assertTrue(self.cache.lock.acquire(blocking=False))
+            self.cache.lock.release()
+            return states(*names)
+        self.runtime.states.side_effect = locked_states
+
+        self.cache.status(['NAME'])
+        self.cache.handle(event('die', 'NAME'))
+
+        self.assertEqual(self.runtime.states.call_count, 2)
+
+    def test_status_missing_container(self):
+        self.runtime.states.side_effect = None
+        self.runtime.states.return_value = {}
+
+        res = self.cache.status(['NAME'])
+
+        self.assertEqual(res, {})
+        self.assertEqual(self.cache.containers, {'NAME': None})
+
+    def test_event_refreshes_state(self):
+        self.cache.status(['NAME'])
+        self.runtime.states.side_effect = lambda names: states(*names, state='exited')
+
+        self.cache.handle(event('die', 'NAME'))
+        res = self.cache.status(['NAME'])
+
+        self.assertEqual(self.runtime.states.call_count, 2)
+        self.assertEqual(res['NAME']['state'], 'exited')
+        self.assertEqual(res['NAME']['uptime'], '')
+
+    def test_event_inspect_error(self):
+        self.cache.status(['NAME'])
+        self.runtime.states.side_effect = RuntimeError('Docker unavailable')
+
+        self.cache.handle(event('die', 'NAME'))
+
+        self.assertEqual(self.cache.containers, {})
+
+    def test_event_ignored(self):
+        self.cache.handle(event('exec_start: sh', 'NAME'))
+        self.cache.handle({'Type': 'network', 'Action': 'connect'})
+
+        self.runtime.states.assert_not_called()
+
+    def test_destroy_event(self):
+        self.cache.status(['NAME'])
+
+        self.cache.handle(event('destroy', 'NAME'))
+        res = self.cache.status(['NAME'])
+
+        self.runtime.states.assert_called_once_with(['NAME'])
+        self.assertEqual(res, {})
+
+    def test_rename_event(self):
+        self.cache.handle(event('rename', 'NEW-NAME', oldName='/NAME'))
+
+        res = self.cache.status(['NAME', 'NEW-NAME'])
+
+        self.runtime.states.assert_called_once_with(['NEW-NAME'])
+        self.assertEqual(list(res), ['NEW-NAME'])
+
+    def test_watch_clears_cache_when_stream_ends(self):
+        self.cache.watch([event('start', 'NAME')])
+
+        self.assertEqual(self.cache.containers, {})
+
+
+class TestDaemon(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(path.join(self.directory, 'configs'))
+        with open(path.join(self.directory, 'configs', 'NAME.json'), 'w') as f:
+            json.dump(dict(config.TEMPLATE, name='NAME'), f)
+        patcher = patch('snowglobe.config.path.abspath')
+        self.addCleanup(patcher.stop)
+        patcher.start().return_value = path.join(self.directory, 'config.py')
+        patcher = patch.dict('snowglobe.daemon.os.environ', {'SNOWGLOBE_SOCKET': path.join(self.directory, 'sock')})
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+        self.runtime = Mock()
+        self.runtime.states.side_effect = lambda names: states(*names)
+        self.event_handled = threading.Event()
+        self.stream_ended = threading.Event()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def events(self):
+        yield event('start', 'NAME')
+        self.event_handled.set()
+        self.stream_ended.wait()
+
+    def test_answer_list(self):
+        request = {'command': 'list', 'store': config.store_location()}
+
+        res = daemon.Daemon(self.runtime, self.events).answer(request)
+
+        self.assertEqual(res, {'output': 'Environments:\nNAME\n'})
+
+    def test_answer_inspect_error(self):
+        request = {'command': 'inspect', 'name': 'OTHER', 'store': config.store_location()}
+
+        res = daemon.Daemon(self.runtime, self.events).answer(request)
+
+        self.assertEqual(res, {'error': 'Environment not found'})
+
+    def test_answer_other_store(self):
+        request = {'command': 'list', 'store': config.store_location('sqlite')}
+
+        res = daemon.Daemon(self.runtime, self.events).answer(request)
+
+        self.assertIn('refused', res)
+
+    def test_answer_command_not_served(self):
+        res = daemon.Daemon(self.runtime, self.events).answer({'command': 'start', 'name': 'NAME'})
+
+        self.assertIn('error', res)
+
+    def test_socket_directory(self):
+        with patch.dict('snowglobe.daemon.os.environ', {'XDG_RUNTIME_DIR': self.directory}):
+            res = daemon.socket_directory()
+
+        self.assertEqual(res, path.join(self.directory, f'snowglobe-{os.getuid()}'))
+        self.assertEqual(os.stat(res).st_mode & 0o777, 0o700)
+
+    def test_socket_directory_not_private(self):
+        directory = path.join(self.directory, f'snowglobe-{os.getuid()}')
+        os.mkdir(directory)
+        os.chmod(directory, 0o755)
+
+        with patch.dict('snowglobe.daemon.os.environ', {'XDG_RUNTIME_DIR': self.directory}):
+            with self.assertRaisesRegex(RuntimeError, 'not a private directory'):
+                daemon.socket_directory()
+
+    def test_query_socket_of_other_user(self):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(path.join(self.directory, 'sock'))
+        listener.listen()
+
+        with patch('snowglobe.daemon.os.getuid', Mock(return_value=os.getuid() + 1)), \
+                patch('snowglobe.daemon.QUERY_TIMEOUT', 0.01):
+            self.assertIsNone(daemon.query('list'))
+
+        listener.setblocking(False)
+        with self.assertRaises(BlockingIOError):
+            listener.accept()
+
+    def test_query_without_daemon(self):
+        self.assertIsNone(daemon.query('list'))
+
+    def test_serve(self):
+        snowglobe = daemon.Daemon(self.runtime, self.events)
+        self.addCleanup(self.stream_ended.set)
+        threading.Thread(target=snowglobe.serve, daemon=True).start()
+        self.event_handled.wait(5)
+        # The socket file exists before the server listens on it, so wait for an answer.
+        deadline = time.monotonic() + 5
+        status = daemon.query('status')
+        while status is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+            status = daemon.query('status')
+        daemon.query('status')
+
+        self.assertEqual(status.splitlines()[1].split()[:2], ['NAME', 'running'])
+        self.assertEqual(json.loads(daemon.query('inspect', 'NAME'))['name'], 'NAME')
+        self.runtime.states.assert_called_once_with(['NAME'])
+        with self.assertRaises(RuntimeError):
+            daemon.query('inspect', 'OTHER')
+        with patch.dict('snowglobe.config.os.environ', {'SNOWGLOBE_STORE': 'sqlite'}):
+            self.assertIsNone(daemon.query('status'))
+
+
+if __name__ == '__main__':
+    unittest.main()
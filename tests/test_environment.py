@@ -1,9 +1,153 @@
 import unittest
-from unittest.mock import Mock, patch, call
+from unittest.mock import ANY, MagicMock, Mock, patch, call
+import itertools
+import threading
 import json
 from snowglobe import environment, config
 
 
+class TestDependencyLevels(unittest.TestCase):
+    def test_dependency_levels(self):
+        graph = {'APP': ['CACHE', 'DB', 'QUEUE'], 'CACHE': ['DB'], 'DB': [], 'QUEUE': [], 'OTHER': ['APP']}
+
+        res = environment.dependency_levels(['APP'], graph.get)
+
+        self.assertEqual(res, [['DB', 'QUEUE'], ['CACHE'], ['APP']])
+
+    def test_dependency_levels_no_dependencies(self):
+        res = environment.dependency_levels(['APP'], lambda name: [])
+
+        self.assertEqual(res, [['APP']])
+
+    def test_dependency_levels_cycle(self):
+        graph = {'APP': ['CACHE'], 'CACHE': ['DB'], 'DB': ['APP']}
+
+        with self.assertRaisesRegex(RuntimeError, 'APP -> CACHE -> DB -> APP'):
+            environment.dependency_levels(['APP'], graph.get)
+
+    def test_dependency_levels_many(self):
+        graph = {'APP-1': ['DB'], 'APP-2': ['CACHE'], 'CACHE': ['DB'], 'DB': []}
+
+        res = environment.dependency_levels(['APP-1', 'APP-2'], graph.get)
+
+        self.assertEqual(res, [['DB'], ['APP-1', 'CACHE'], ['APP-2']])
+
+
+def fake_docker(state: dict, images: list = None):
+    """
+    Returns a stand-in for subprocess.run that answers docker container inspect with the given container state.
+    Docker image inspect only finds the given images, or every image if not given.
+    """
+    def run(cmd, **kwargs):
+        response = Mock()
+        response.returncode = 0
+        if cmd[1:3] == ['image', 'inspect'] and images is not None and cmd[-1] not in images:
+            response.returncode = 1
+        response.stdout = json.dumps([state] if state and cmd[2] == 'inspect' else []).encode()
+        return response
+
+    return run
+
+
+class TestCommandCalls(unittest.TestCase):
+    """
+    Number of docker processes started by each command.
+    """
+    RUNNING = {'Name': '/NAME', 'State': {'Running': True}}
+    STOPPED = {'Name': '/NAME', 'State': {'Running': False}}
+
+    def setUp(self):
+        patcher = patch('snowglobe.environment.config.Config')
+        self.addCleanup(patcher.stop)
+        self.mocked_config_object = patcher.start().return_value
+        self.mocked_config_object.get_config.return_value = {
+            'name': 'NAME', 'image': 'IMAGE', 'create': {'command': []}, 'start': '',
+            'execs': [{'name': 'EXEC-NAME', 'command': 'EXEC-COMMAND', 'options': ''}],
+        }
+        patcher = patch('snowglobe.environment.print')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def docker_calls(self, state, command, *args, images=None):
+        """
+        Returns the docker container sub commands run by a command. Image sub commands, which run in the background,
+        are kept in image_calls.
+        """
+        self.mocked_config_object.get_config.reset_mock()
+        with patch('snowglobe.runtime.subprocess.run') as mocked_run:
+            mocked_run.side_effect = fake_docker(state, images)
+            getattr(environment.Environment(), command)(*args)
+        self.assertEqual(self.mocked_config_object.get_config.call_count, 1)
+        calls = [cmd[0][0] for cmd in mocked_run.call_args_list]
+        self.image_calls = [cmd[2] for cmd in calls if cmd[1] == 'image']
+        return [cmd[2] for cmd in calls if cmd[1] == 'container']
+
+    def test_start_missing(self):
+        self.assertEqual(self.docker_calls(None, 'start', 'NAME'), ['inspect', 'create', 'start'])
+
+    def test_start_stopped(self):
+        self.assertEqual(self.docker_calls(self.STOPPED, 'start', 'NAME'), ['inspect', 'start'])
+
+    def test_exec_running(self):
+        self.assertEqual(self.docker_calls(self.RUNNING, 'exec', 'NAME', 'EXEC-NAME'), ['inspect', 'exec'])
+
+    def test_stop_running(self):
+        self.assertEqual(self.docker_calls(self.RUNNING, 'stop', 'NAME'), ['inspect', 'stop'])
+
+    def test_stop_stopped(self):
+        self.assertEqual(self.docker_calls(self.STOPPED, 'stop', 'NAME'), ['inspect'])
+
+    def test_reset_running(self):
+        self.assertEqual(self.docker_calls(self.RUNNING, 'reset', 'NAME'), ['inspect', 'stop', 'rm', 'create'])
+        self.assertEqual(self.image_calls, ['inspect'])
+
+    def test_reset_running_pulls_missing_image(self):
+        self.assertEqual(self.docker_calls(self.RUNNING, 'reset', 'NAME', images=[]),
+                         ['inspect', 'stop', 'rm', 'create'])
+        self.assertEqual(self.image_calls, ['inspect', 'pull'])
+
+    def test_reset_running_kill(self):
+        self.mocked_config_object.get_config.return_value['stop'] = {'force': True}
+
+        self.assertEqual(self.docker_calls(self.RUNNING, 'reset', 'NAME'), ['inspect', 'rm', 'create'])
+
+    def test_reset_spec_unchanged(self):
+        spec = config.spec_hash('IMAGE', {'command': []})
+        running = dict(self.RUNNING, Config={'Labels': {config.SPEC_LABEL: spec}})
+
+        self.assertEqual(self.docker_calls(running, 'reset', 'NAME'), ['inspect', 'restart'])
+        self.assertEqual(self.docker_calls(running, 'reset', 'NAME', True), ['inspect', 'stop', 'rm', 'create'])
+
+    def test_start_spec_changed(self):
+        stopped = dict(self.STOPPED, Config={'Labels': {config.SPEC_LABEL: 'OLD-SPEC'}})
+
+        self.assertEqual(self.docker_calls(stopped, 'start', 'NAME'), ['inspect', 'rm', 'create', 'start'])
+
+    def test_reset_from_image(self):
+        spec = config.spec_hash('IMAGE', {'command': []})
+        running = dict(self.RUNNING, Config={'Labels': {config.SPEC_LABEL: spec}})
+
+        with patch('snowglobe.runtime.subprocess.run') as mocked_run:
+            mocked_run.side_effect = fake_docker(running)
+            environment.Environment().run('reset', 'NAME', image='SNAPSHOT')
+
+        self.assertEqual([cmd[0][0][2] for cmd in mocked_run.call_args_list], ['inspect', 'stop', 'rm', 'create'])
+        create = mocked_run.call_args_list[-1][0][0]
+        self.assertEqual(create[-2:], ['NAME', 'SNAPSHOT'])
+        self.assertIn(f'{config.SPEC_LABEL}={spec}', create)
+
+    def test_reset_missing(self):
+        self.assertEqual(self.docker_calls(None, 'reset', 'NAME'), ['inspect', 'create'])
+        self.assertEqual(self.image_calls, [])
+
+    def test_remove_stopped(self):
+        self.assertEqual(self.docker_calls(self.STOPPED, 'remove', 'NAME'), ['inspect', 'rm'])
+
+    def test_remove_missing(self):
+        self.assertEqual(self.docker_calls(None, 'remove', 'NAME'), ['inspect'])
+        self.mocked_config_object.del_config.assert_called_with('NAME')
+
+
 class TestEnvironment(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -37,17 +181,104 @@ class TestEnvironment(unittest.TestCase):
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_template(self, mocked_print, mocked_config):
+    def test_list_by_image(self, mocked_print,  mocked_config):
+        mocked_config_object = Mock()
+        mocked_config_object.find_configs.return_value = ['NAME-2']
+        mocked_config.return_value = mocked_config_object
+        env = environment.Environment(store_name='sqlite')
+
+        env.list('IMAGE')
+
+        mocked_config.assert_called_with('sqlite')
+        mocked_config_object.find_configs.assert_called_with('IMAGE')
+        mocked_print.assert_has_calls([
+            call('Environments:'),
+            call('NAME-2')
+        ])
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_import_configs(self, mocked_print,  mocked_config):
+        mocked_config_object = Mock()
+        mocked_config_object.import_configs.return_value = ['NAME-1', 'NAME-2']
+        mocked_config.return_value = mocked_config_object
+        env = environment.Environment()
+
+        env.import_configs('DIRECTORY')
+
+        mocked_config_object.import_configs.assert_called_with('DIRECTORY', env.check_dependencies)
+        mocked_print.assert_called_with('Imported 2 environments from: DIRECTORY')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_status(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
-        mocked_config_object.get_template.return_value = {}
+        mocked_config_object.confs = {'NAME-2', 'NAME-1'}
         mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
         env = environment.Environment()
+        env.runtime.status = Mock()
+        env.runtime.status.return_value = {
+            'NAME-1': {'state': 'running', 'uptime': '5 minutes', 'image': 'sha256:0123456789abcdef', 'ports': ''}
+        }
+
+        env.status()
+
+        env.runtime.status.assert_called_once_with(['NAME-1', 'NAME-2'])
+        mocked_print.assert_called_with(
+            'NAME     STATE     UPTIME      IMAGE          PORTS\n'
+            'NAME-1   running   5 minutes   0123456789ab\n'
+            'NAME-2   missing'
+        )
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_top_interrupted(self, mocked_print, mocked_config):
+        mocked_config.return_value.confs = {'NAME'}
+        env = environment.Environment()
+        env.runtime.stats = Mock()
+        env.runtime.stats.return_value.__iter__ = Mock(side_effect=KeyboardInterrupt)
+
+        env.top()
+
+        mocked_print.assert_not_called()
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    @patch('snowglobe.environment.time.monotonic', Mock(side_effect=[0, 60, 120]))
+    def test_top(self, mocked_print, mocked_config):
+        mocked_config.return_value.confs = {'NAME-2', 'NAME-1'}
+        env = environment.Environment()
+        env.runtime.stats = Mock()
+        env.runtime.stats.return_value = iter([
+            {'NAME-1': {'cpu': 1.0, 'memory': 2000000, 'limit': 8000000},
+             'OTHER': {'cpu': 5.0, 'memory': 1, 'limit': 1}},
+            {'NAME-1': {'cpu': 3.0, 'memory': 1000000, 'limit': 8000000}},
+            {},
+        ])
+
+        env.top(count=2)
+
+        self.assertEqual(mocked_print.call_count, 2)
+        mocked_print.assert_called_with(
+            'NAME     CPU     AVG CPU   PEAK CPU   MEMORY   AVG MEMORY   PEAK MEMORY   LIMIT\n'
+            'NAME-1   3.00%   2.00%     3.00%      1MB      1.5MB        2MB           8MB\n'
+            'NAME-2   -       -         -          -        -            -             -',
+            flush=True
+        )
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_template(self, mocked_print, mocked_config):
+        mocked_config.get_template.return_value = {}
+        mocked_print.return_value = None
+        env = environment.Environment()
 
         env.template()
 
         mocked_print.assert_called_with(json.dumps({}, indent=4))
-        mocked_config_object.get_template.assert_called_with()
+        mocked_config.get_template.assert_called_with()
+        mocked_config.assert_not_called()
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
@@ -68,227 +299,926 @@ class TestEnvironment(unittest.TestCase):
     @patch('snowglobe.environment.print')
     def test_setup(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
-        mocked_config_object.set_config.return_value = None
         mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
         env = environment.Environment()
-        env.create = Mock()
+        env.run = Mock()
 
         env.setup('NAME', {})
 
         mocked_print.assert_called_with('Setting up environment: NAME')
-        mocked_config_object.set_config.assert_called_with('NAME', {})
-        env.create.assert_called_with('NAME')
+        mocked_config_object.validate.assert_called_with({})
+        env.run.assert_called_with('setup', 'NAME', env={})
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_remove(self, mocked_print, mocked_config):
+    def test_setup_warm_up(self, mocked_print, mocked_config):
+        mocked_print.return_value = None
+        env = environment.Environment()
+        env.runtime = Mock()
+        env.runtime.has_image.return_value = False
+        env.run = Mock()
+
+        env.setup('NAME', {'name': 'NAME', 'image': 'IMAGE'})
+        env.wait_for_image('IMAGE')
+
+        env.runtime.has_image.assert_called_once_with('IMAGE')
+        env.runtime.pull.assert_called_once_with('IMAGE')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_setup_resolves_build_context(self, mocked_print, mocked_config):
+        mocked_print.return_value = None
+        env = environment.Environment()
+        env.run = Mock()
+
+        env.setup('NAME', {'name': 'NAME', 'image': 'IMAGE', 'build': {'context': 'webapp'}}, '/CONFIGS')
+
+        env.run.assert_called_with('setup', 'NAME', env={'name': 'NAME', 'image': 'IMAGE',
+                                                         'build': {'context': '/CONFIGS/webapp'}})
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_setup_invalid_config_not_warmed_up(self, mocked_print, mocked_config):
+        mocked_print.return_value = None
+        mocked_config.return_value.validate.side_effect = RuntimeError('Invalid config')
+        env = environment.Environment()
+        env.runtime = Mock()
+        env.run = Mock()
+
+        with self.assertRaisesRegex(RuntimeError, 'Invalid config'):
+            env.setup('NAME', {'name': 'NAME', 'image': ['IMAGE']})
+
+        env.runtime.has_image.assert_not_called()
+        env.run.assert_not_called()
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_warm_up_error(self, mocked_print, mocked_config):
+        env = environment.Environment()
+        env.runtime = Mock()
+        env.runtime.has_image.return_value = False
+        env.runtime.pull.side_effect = RuntimeError('Image: IMAGE can not be pulled')
+
+        env.warm_up('IMAGE')
+        env.wait_for_image('IMAGE')
+        env.apply(('create', 'NAME'), {'name': 'NAME', 'image': 'IMAGE', 'create': {}})
+
+        env.runtime.create.assert_called_once_with('NAME', 'IMAGE', {}, store=env.store)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_warm_up_dry_run(self, mocked_print, mocked_config):
+        env = environment.Environment(dry_run=True)
+        env.runtime = Mock()
+
+        env.warm_up('IMAGE')
+        env.wait_for_image('IMAGE')
+
+        env.runtime.has_image.assert_not_called()
+
+    @patch('snowglobe.build.context_hash')
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_apply_create_build(self, mocked_print, mocked_config, mocked_context_hash):
+        mocked_config.return_value.CONFIG_PATH = '/CONFIGS'
+        mocked_context_hash.return_value = 'HASH'
+        data = {'name': 'NAME', 'image': 'IMAGE', 'create': {}, 'build': {'context': '/CONTEXT', 'args': {'KEY': '1'}}}
+        env = environment.Environment()
+        env.runtime = Mock()
+        env.runtime.image_labels.return_value = {config.BUILD_LABEL: 'OLD-HASH'}
+
+        env.apply(('create', 'NAME'), data)
+
+        mocked_context_hash.assert_called_once_with('/CONTEXT', None, {'KEY': '1'}, ANY)
+        env.runtime.build.assert_called_once_with('IMAGE', '/CONTEXT', None, {'KEY': '1'},
+                                                  {config.MANAGED_LABEL: 'true', config.BUILD_LABEL: 'HASH'})
+        env.runtime.create.assert_called_once_with('NAME', 'IMAGE', {}, spec=config.spec_hash('IMAGE', {}, 'HASH'),
+                                                   store=env.store)
+        mocked_print.assert_any_call('Building image: IMAGE')
+
+    @patch('snowglobe.build.context_hash')
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_build_image_unchanged(self, mocked_print, mocked_config, mocked_context_hash):
+        mocked_config.return_value.CONFIG_PATH = '/CONFIGS'
+        mocked_context_hash.return_value = 'HASH'
+        data = {'name': 'NAME', 'image': 'IMAGE', 'create': {}, 'build': {'context': '/CONTEXT', 'dockerfile': 'DF'}}
+        env = environment.Environment()
+        env.runtime = Mock()
+        env.runtime.image_labels.return_value = {config.BUILD_LABEL: 'HASH'}
+
+        env.build_image(data)
+        env.runtime.image_labels.return_value = None
+        env.build_image(data)
+
+        self.assertEqual(mocked_context_hash.call_count, 1)
+        env.runtime.build.assert_called_once_with('IMAGE', '/CONTEXT', '/CONTEXT/DF', None, ANY)
+
+    @patch('snowglobe.build.context_hash')
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_build_image_different_images_in_parallel(self, mocked_print, mocked_config, mocked_context_hash):
+        mocked_config.return_value.CONFIG_PATH = '/CONFIGS'
+        mocked_context_hash.return_value = 'HASH'
+        env = environment.Environment()
+        env.runtime = Mock()
+        env.runtime.image_labels.return_value = None
+        both_building = threading.Barrier(2, timeout=5)
+        env.runtime.build.side_effect = lambda *args: both_building.wait()
+        envs = [{'name': f'NAME-{index}', 'image': f'IMAGE-{index}', 'create': {}, 'build': {'context': '/CONTEXT'}}
+                for index in (1, 2)]
+
+        threads = [threading.Thread(target=env.build_image, args=(data,)) for data in envs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(both_building.broken)
+        self.assertEqual(env.runtime.build.call_count, 2)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_setup_dependency_cycle(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
-        mocked_config_object.del_config.return_value = None
+        mocked_config_object.confs = {'DB'}
+        mocked_config_object.get_config.return_value = {'name': 'DB', 'depends_on': [{'name': 'NAME'}]}
         mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
         env = environment.Environment()
-        env.stop = Mock()
-        env.delete = Mock()
+        env.run = Mock()
+
+        with self.assertRaises(RuntimeError):
+            env.setup('NAME', {'name': 'NAME', 'depends_on': [{'name': 'DB'}, {'name': 'MISSING'}]})
+
+        mocked_config_object.get_config.assert_called_with('DB')
+        env.run.assert_not_called()
+
+    @patch('snowglobe.environment.config.Config')
+    def test_check_dependencies(self, mocked_config):
+        mocked_config.return_value.confs = {'DB'}
+        mocked_config.return_value.get_config.return_value = {'name': 'DB', 'depends_on': [{'name': 'APP'}]}
+        env = environment.Environment()
+        configs = {'APP': {'name': 'APP', 'depends_on': [{'name': 'CACHE'}]},
+                   'CACHE': {'name': 'CACHE', 'depends_on': [{'name': 'DB'}]}}
+
+        with self.assertRaisesRegex(RuntimeError, 'APP -> CACHE -> DB -> APP'):
+            env.check_dependencies(configs)
+        env.check_dependencies(configs, stored=False)
+        with self.assertRaisesRegex(RuntimeError, 'APP -> CACHE -> APP'):
+            env.check_dependencies(dict(configs, CACHE={'name': 'CACHE', 'depends_on': [{'name': 'APP'}]}),
+                                   stored=False)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_remove(self, mocked_print, mocked_config):
+        mocked_print.return_value = None
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME'}
+        env = environment.Environment()
+        env.run = Mock()
+        env.fill_pool = Mock()
 
         env.remove('NAME')
 
         mocked_print.assert_called_with('Removing environment: NAME')
-        mocked_config_object.del_config.assert_called_with('NAME')
-        env.stop.assert_called_with('NAME')
-        env.delete.assert_called_with('NAME')
+        env.run.assert_called_with('remove', 'NAME', env={'name': 'NAME'})
+        env.fill_pool.assert_not_called()
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_remove_pool(self, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME', 'pool': 2}
+        env = environment.Environment()
+        env.run = Mock()
+        env.fill_pool = Mock()
+
+        env.remove('NAME')
+
+        env.fill_pool.assert_called_with({'name': 'NAME', 'pool': 2}, 0)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_pool(self, mocked_print, mocked_config):
+        data = {'name': 'NAME', 'image': 'IMAGE', 'create': {}, 'pool': 1}
+        mocked_config.return_value.get_config.return_value = dict(data)
+        spec = config.spec_hash('IMAGE', {})
+        env = environment.Environment()
+        containers = {
+            'NAME': {'running': True, 'labels': {config.SPEC_LABEL: spec, config.POOL_LABEL: 'NAME'}},
+            'NAME-spare-1': {'running': False, 'labels': {config.SPEC_LABEL: spec, config.POOL_LABEL: 'NAME'}},
+            'NAME-spare-2': {'running': False, 'labels': {config.SPEC_LABEL: 'OLD-SPEC', config.POOL_LABEL: 'NAME'}},
+            'OTHER-spare-1': {'running': False, 'labels': {config.SPEC_LABEL: spec, config.POOL_LABEL: 'OTHER'}},
+        }
+        env.runtime.containers = Mock()
+        # One of the two creates fails, so only one new spare shows up.
+        env.runtime.containers.side_effect = [containers, {
+            'NAME-spare-1': containers['NAME-spare-1'],
+            'NAME-spare-3': {'running': False, 'labels': {config.SPEC_LABEL: spec, config.POOL_LABEL: 'NAME'}},
+        }]
+        env.runtime.create = Mock()
+        env.runtime.remove = Mock()
+
+        env.pool('NAME', 3)
+
+        mocked_config.return_value.set_config.assert_called_with('NAME', dict(data, pool=3))
+        env.runtime.remove.assert_called_once_with('NAME-spare-2')
+        self.assertEqual(env.runtime.create.call_count, 2)
+        env.runtime.create.assert_called_with(ANY, 'IMAGE', {}, labels={config.POOL_LABEL: 'NAME'}, store=env.store)
+        mocked_print.assert_called_with('Pool of environment: NAME: 2 of 3 spare containers ready')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_pool_show(self, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'create': {}, 'pool': 2}
+        spec = config.spec_hash('IMAGE', {})
+        env = environment.Environment()
+        env.runtime.containers = Mock()
+        env.runtime.containers.return_value = {
+            'NAME-spare-1': {'running': False, 'labels': {config.SPEC_LABEL: spec, config.POOL_LABEL: 'NAME'}},
+        }
+        env.runtime.create = Mock()
+
+        env.pool('NAME')
+
+        env.runtime.create.assert_not_called()
+        mocked_config.return_value.set_config.assert_not_called()
+        mocked_print.assert_called_once_with('Pool of environment: NAME: 1 of 2 spare containers ready')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    @patch('subprocess.Popen')
+    def test_refill_pool(self, mocked_popen, mocked_print, mocked_config):
+        env = environment.Environment()
+
+        env.refill_pool('NAME', 2)
+
+        self.assertEqual(mocked_popen.call_args[0][0][-4:], ['pool', 'NAME', '--size', '2'])
+        mocked_print.assert_called_with('Refilling pool of environment: NAME in the background')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    @patch('snowglobe.environment.Environment.refill_pool')
+    def test_reset_swaps_spare(self, mocked_refill_pool, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'create': {},
+                                                              'pool': 1}
+        env = environment.Environment()
+        env.runtime.containers = Mock()
+        env.runtime.containers.return_value = {
+            'NAME-spare-1': {'running': False, 'labels': {config.SPEC_LABEL: config.spec_hash('IMAGE', {}),
+                                                          config.POOL_LABEL: 'NAME'}},
+        }
+        env.runtime.inspect = Mock()
+        env.runtime.inspect.return_value = {'State': {'Running': True}}
+        env.runtime.stop = Mock()
+        env.runtime.remove = Mock()
+        env.runtime.rename = Mock()
+        env.runtime.rename.side_effect = [None, RuntimeError('No such container')]
+        env.runtime.create = Mock()
+
+        env.reset('NAME')
+
+        env.runtime.rename.assert_called_with('NAME-spare-1', 'NAME')
+        env.runtime.create.assert_not_called()
+        mocked_refill_pool.assert_called_with('NAME', 1)
+
+        env.reset('NAME')
+
+        env.runtime.create.assert_called_with('NAME', 'IMAGE', {}, store=env.store)
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
     def test_reset(self, mocked_print, mocked_config):
-        mocked_config_object = Mock()
-        mocked_config_object.del_config.return_value = None
-        mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
         env = environment.Environment()
-        env.stop = Mock()
-        env.delete = Mock()
-        env.create = Mock()
+        env.run = Mock()
 
         env.reset('NAME')
 
         mocked_print.assert_called_with('Resetting environment: NAME')
-        env.stop.assert_called_with('NAME')
-        env.delete.assert_called_with('NAME')
-        env.create.assert_called_with('NAME')
+        env.run.assert_called_with('reset', 'NAME', force=False, image=None)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_reset_from_snapshot(self, mocked_print, mocked_config):
+        env = environment.Environment()
+        env.runtime.snapshots = Mock()
+        env.runtime.snapshots.return_value = [{'image': 'snowglobe/name:TAG', 'created': '', 'size': ''}]
+        env.run = Mock()
+
+        env.reset('NAME', snapshot='TAG')
+
+        env.runtime.snapshots.assert_called_with('NAME')
+        env.run.assert_called_with('reset', 'NAME', force=False, image='snowglobe/name:TAG')
+        with self.assertRaises(RuntimeError):
+            env.reset('NAME', snapshot='OTHER-TAG')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_snapshot(self, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'CONTAINER'}
+        env = environment.Environment()
+        env.runtime.commit = Mock()
+
+        env.snapshot('NAME', 'TAG')
+
+        env.runtime.commit.assert_called_with('CONTAINER', 'snowglobe/name:TAG', 'NAME')
+        mocked_print.assert_called_with('Created snapshot: TAG of environment: NAME')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_snapshots(self, mocked_print, mocked_config):
+        env = environment.Environment()
+        env.runtime.snapshots = Mock()
+        env.runtime.snapshots.return_value = [
+            {'image': 'snowglobe/name:OLD', 'created': '2020-01-01 10:00:00', 'size': '1.2GB'},
+            {'image': 'snowglobe/name:NEW', 'created': '2020-01-02 10:00:00', 'size': '1.3GB'},
+        ]
+
+        env.snapshots('NAME')
+
+        mocked_print.assert_called_with(
+            'IMAGE                CREATED               SIZE\n'
+            'snowglobe/name:NEW   2020-01-02 10:00:00   1.3GB\n'
+            'snowglobe/name:OLD   2020-01-01 10:00:00   1.2GB'
+        )
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_snapshots_prune(self, mocked_print, mocked_config):
+        env = environment.Environment()
+        env.runtime.snapshots = Mock()
+        env.runtime.snapshots.return_value = [
+            {'image': 'snowglobe/name:OLD', 'created': '2020-01-01 10:00:00', 'size': '1.2GB'},
+            {'image': 'snowglobe/other:OLD', 'created': '2020-01-01 10:00:00', 'size': '1.2GB'},
+            {'image': 'snowglobe/name:NEW', 'created': '2020-01-02 10:00:00', 'size': '1.3GB'},
+        ]
+        env.runtime.remove_image = Mock()
+
+        env.snapshots(prune=True)
+
+        env.runtime.snapshots.assert_called_with(None)
+        env.runtime.remove_image.assert_called_once_with('snowglobe/name:OLD')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    @patch('snowglobe.environment.time.monotonic')
+    def test_batch(self, mocked_monotonic, mocked_print, mocked_config):
+        mocked_monotonic.return_value = 0
+        mocked_print.return_value = None
+        env = environment.Environment()
+        env.stop = Mock()
+        env.stop.side_effect = [None, RuntimeError('FAILED')]
+
+        res = env.batch('stop', ['NAME-1', 'NAME-2'], 1)
+
+        self.assertFalse(res)
+        env.stop.assert_has_calls([call('NAME-1'), call('NAME-2')], any_order=True)
+        mocked_print.assert_called_with(
+            'NAME     RESULT   TIME   ERROR\n'
+            'NAME-1   ok       0.0s\n'
+            'NAME-2   failed   0.0s   FAILED'
+        )
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_create_container_does_not_exist(self, mocked_print, mocked_config):
+    def test_batch_success(self, mocked_print, mocked_config):
+        mocked_print.return_value = None
+        env = environment.Environment()
+        env.stop = Mock()
+
+        res = env.batch('stop', ['NAME-1', 'NAME-2', 'NAME-3'], 2)
+
+        self.assertTrue(res)
+        self.assertEqual(env.stop.call_count, 3)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_batch_start(self, mocked_print, mocked_config):
+        mocked_print.return_value = None
+        configs = {f'APP-{i}': {'depends_on': [{'name': 'DB'}]} for i in range(1, 4)}
+        configs['DB'] = {}
+        mocked_config.return_value.get_config.side_effect = configs.get
+        env = environment.Environment()
+        env.start_container = Mock()
+
+        res = env.batch('start', ['APP-1', 'APP-2', 'APP-3'], 2)
+
+        self.assertTrue(res)
+        self.assertEqual(env.start_container.call_count, 4)
+        self.assertEqual(env.start_container.call_args_list[0], call('DB', {}))
+        env.start_container.assert_has_calls([call(f'APP-{i}', configs[f'APP-{i}']) for i in range(1, 4)],
+                                             any_order=True)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    @patch('snowglobe.environment.time.monotonic')
+    def test_start_all_dependency_failed(self, mocked_monotonic, mocked_print, mocked_config):
+        mocked_monotonic.return_value = 0
+        mocked_print.return_value = None
+        configs = {'APP': {'depends_on': [{'name': 'DB'}]}, 'DB': {}, 'OTHER': {}}
+        mocked_config.return_value.get_config.side_effect = configs.get
+
+        def start_container(name, env):
+            if name == 'DB':
+                raise RuntimeError('FAILED')
+
+        env = environment.Environment()
+        env.start_container = Mock(side_effect=start_container)
+
+        res = env.start_all(['APP', 'OTHER'], 2)
+
+        self.assertFalse(res)
+        env.start_container.assert_has_calls([call('DB', {}), call('OTHER', {})], any_order=True)
+        self.assertEqual(env.start_container.call_count, 2)
+        mocked_print.assert_called_with(
+            'NAME    RESULT   TIME   ERROR\n'
+            'DB      failed   0.0s   FAILED\n'
+            'OTHER   ok       0.0s\n'
+            'APP     failed   0.0s   Dependency: DB failed'
+        )
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_run(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
-        mocked_config_object.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'create': {}}
+        mocked_config_object.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'create': {}, 'start': '-i'}
         mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
         env = environment.Environment()
         env.runtime.inspect = Mock()
         env.runtime.inspect.side_effect = RuntimeError
         env.runtime.create = Mock()
+        env.runtime.start = Mock()
 
-        env.create('NAME')
+        env.run('start', 'NAME')
 
-        mocked_config_object.get_config.assert_called_with('NAME')
-        env.runtime.inspect.assert_called_with('NAME')
-        mocked_print.assert_called_with('Creating container: NAME')
-        env.runtime.create.assert_called_with('NAME', 'IMAGE', {})
+        mocked_config_object.get_config.assert_called_once_with('NAME')
+        env.runtime.inspect.assert_called_once_with('NAME')
+        mocked_print.assert_has_calls([call('Creating container: NAME'), call('Starting container: NAME')])
+        env.runtime.create.assert_called_with('NAME', 'IMAGE', {}, store=env.store)
+        env.runtime.start.assert_called_with('NAME', '-i', replace=False)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_run_replace_last_step(self, mocked_print, mocked_config):
+        execs = [{'name': 'EXEC-NAME', 'command': 'EXEC-COMMAND', 'options': '-it'}]
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'create': {},
+                                                              'execs': execs}
+        env = environment.Environment()
+        env.runtime.inspect = Mock()
+        env.runtime.inspect.side_effect = RuntimeError
+        env.runtime.create = Mock()
+        env.runtime.exec = Mock()
+
+        env.exec('NAME', 'EXEC-NAME', replace=True)
+
+        env.runtime.create.assert_called_with('NAME', 'IMAGE', {}, store=env.store)
+        env.runtime.exec.assert_called_with('NAME', 'EXEC-NAME', execs, replace=True)
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_create_container_exists(self, mocked_print, mocked_config):
+    def test_run_container_exists(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
         mocked_config_object.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'create': {}}
         mocked_config.return_value = mocked_config_object
-        mocked_print.return_value = None
         env = environment.Environment()
         env.runtime.inspect = Mock()
-        env.runtime.inspect.return_value = {}
+        env.runtime.inspect.return_value = {'State': {'Running': False}}
         env.runtime.create = Mock()
 
         with self.assertRaises(RuntimeError):
-            env.create('NAME')
+            env.run('create', 'NAME')
 
-        mocked_config_object.get_config.assert_called_with('NAME')
-        env.runtime.inspect.assert_called_with('NAME')
+        env.runtime.create.assert_not_called()
+
+    @patch('snowglobe.environment.config.Config')
+    def test_container_state(self, mocked_config):
+        from snowglobe import runtime
+        env = environment.Environment()
+        env.runtime.inspect = Mock(side_effect=RuntimeError('Container: NAME not found'))
+
+        self.assertIsNone(env.container_state('NAME'))
+
+        env.runtime.inspect.side_effect = runtime.DockerTimeout('docker inspect did not finish within 30s')
+
+        with self.assertRaises(runtime.DockerTimeout):
+            env.container_state('NAME')
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_start_container_does_not_exist(self, mocked_print, mocked_config):
+    def test_run_dry_run(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
-        mocked_config_object.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'start': '-i'}
+        mocked_config_object.get_config.return_value = {'name': 'NAME'}
         mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
-        env = environment.Environment()
+        env = environment.Environment(dry_run=True)
         env.runtime.inspect = Mock()
-        env.runtime.inspect.side_effect = RuntimeError
-        env.create = Mock()
-        env.runtime.start = Mock()
+        env.runtime.inspect.return_value = {'State': {'Running': True}}
+        env.apply = Mock()
 
-        env.start('NAME')
+        env.run('reset', 'NAME')
 
-        mocked_config_object.get_config.assert_called_with('NAME')
-        env.runtime.inspect.assert_called_with('NAME')
-        env.create.assert_called_with('NAME')
-        mocked_print.assert_called_with('Starting container: NAME')
-        env.runtime.start.assert_called_with('NAME', '-i')
+        env.apply.assert_not_called()
+        mocked_print.assert_has_calls([
+            call('Plan for reset: NAME'),
+            call('  stop NAME\n  remove NAME\n  create NAME'),
+        ])
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_start_container_exists(self, mocked_print, mocked_config):
+    def test_run_dry_run_nothing_to_do(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
-        mocked_config_object.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'start': '-i'}
+        mocked_config_object.get_config.return_value = {'name': 'NAME'}
         mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
-        env = environment.Environment()
+        env = environment.Environment(dry_run=True)
         env.runtime.inspect = Mock()
-        env.runtime.inspect.return_value = {}
-        env.runtime.start = Mock()
+        env.runtime.inspect.side_effect = RuntimeError
 
-        env.start('NAME')
+        env.run('stop', 'NAME')
 
-        mocked_config_object.get_config.assert_called_with('NAME')
-        env.runtime.inspect.assert_called_with('NAME')
-        mocked_print.assert_called_with('Starting container: NAME')
-        env.runtime.start.assert_called_with('NAME', '-i')
+        mocked_print.assert_called_with('  nothing to do')
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_exec_container_does_not_exist(self, mocked_print, mocked_config):
+    def test_apply(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
-        mocked_config_object.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'execs': [
-            {
-                'name': 'EXEC-NAME',
-                'command': 'EXEC-COMMAND',
-                'options': '-it',
-            }
-        ]}
         mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
+        execs = [{'name': 'EXEC-NAME', 'command': 'EXEC-COMMAND', 'options': '-it'}]
+        data = {'name': 'NAME', 'image': 'IMAGE', 'create': {}, 'start': '', 'execs': execs,
+                'stop': {'timeout': 2, 'signal': 'SIGKILL'}}
         env = environment.Environment()
-        env.runtime.inspect = Mock()
-        env.runtime.inspect.side_effect = RuntimeError
-        env.create = Mock()
         env.runtime.exec = Mock()
+        env.runtime.stop = Mock()
+        env.runtime.restart = Mock()
+        env.runtime.remove = Mock()
 
-        env.exec('NAME', 'EXEC-NAME')
+        env.apply(('write_config', 'NAME'), data)
+        env.apply(('exec', 'NAME', 'EXEC-NAME'), data)
+        env.apply(('stop', 'NAME'), data)
+        env.apply(('restart', 'NAME'), data)
+        env.apply(('remove', 'NAME'), data)
+        env.apply(('force_remove', 'NAME'), data)
+        env.apply(('delete_config', 'NAME'), data)
 
-        mocked_config_object.get_config.assert_called_with('NAME')
-        env.runtime.inspect.assert_called_with('NAME')
-        env.create.assert_called_with('NAME')
-        mocked_print.assert_called_with('Executing container: NAME. Exec name: EXEC-NAME')
-        env.runtime.exec.assert_called_with('NAME', 'EXEC-NAME', [
-            {
-                'name': 'EXEC-NAME',
-                'command': 'EXEC-COMMAND',
-                'options': '-it',
-            }
+        mocked_config_object.set_config.assert_called_with('NAME', data)
+        env.runtime.exec.assert_called_with('NAME', 'EXEC-NAME', execs, replace=False)
+        env.runtime.stop.assert_called_with('NAME', timeout=2, signal='SIGKILL')
+        env.runtime.restart.assert_called_with('NAME', timeout=2, signal='SIGKILL')
+        env.runtime.remove.assert_has_calls([call('NAME'), call('NAME', force=True)])
+        mocked_config_object.del_config.assert_called_with('NAME')
+        mocked_print.assert_has_calls([
+            call('Executing container: NAME. Exec name: EXEC-NAME'),
+            call('Stopping container: NAME'),
+            call('Restarting container: NAME'),
+            call('Deleting container: NAME'),
+            call('Killing and deleting container: NAME'),
         ])
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_exec_container_exists(self, mocked_print, mocked_config):
-        mocked_config_object = Mock()
-        mocked_config_object.get_config.return_value = {'name': 'NAME', 'image': 'IMAGE', 'execs': [
-            {
-                'name': 'EXEC-NAME',
-                'command': 'EXEC-COMMAND',
-                'options': '-it',
-            }
-        ]}
-        mocked_config.return_value = mocked_config_object
-        mocked_print.return_value = None
+    @patch('snowglobe.environment.time.monotonic')
+    def test_pull(self, mocked_monotonic, mocked_print, mocked_config):
+        mocked_monotonic.return_value = 0
+        mocked_config.return_value.get_config.side_effect = lambda name: {
+            'NAME-1': {'image': 'IMAGE-1'}, 'NAME-2': {'image': 'IMAGE-2'}, 'NAME-3': {'image': 'IMAGE-1'},
+        }[name]
         env = environment.Environment()
-        env.runtime.inspect = Mock()
-        env.runtime.inspect.return_value = {}
-        env.runtime.exec = Mock()
+        env.runtime = Mock()
 
-        env.exec('NAME', 'EXEC-NAME')
+        def pull(image):
+            if image == 'IMAGE-2':
+                raise RuntimeError('FAILED')
 
-        mocked_config_object.get_config.assert_called_with('NAME')
-        env.runtime.inspect.assert_called_with('NAME')
-        mocked_print.assert_called_with('Executing container: NAME. Exec name: EXEC-NAME')
-        env.runtime.exec.assert_called_with('NAME', 'EXEC-NAME', [
-            {
-                'name': 'EXEC-NAME',
-                'command': 'EXEC-COMMAND',
-                'options': '-it',
-            }
+        env.runtime.pull.side_effect = pull
+
+        res = env.pull(['NAME-1', 'NAME-2', 'NAME-3'], 2)
+
+        self.assertFalse(res)
+        env.runtime.pull.assert_has_calls([call('IMAGE-1'), call('IMAGE-2')], any_order=True)
+        self.assertEqual(env.runtime.pull.call_count, 2)
+        mocked_print.assert_called_with(
+            'IMAGE     ENVIRONMENTS     RESULT   TIME   ERROR\n'
+            'IMAGE-1   NAME-1, NAME-3   ok       0.0s\n'
+            'IMAGE-2   NAME-2           failed   0.0s   FAILED'
+        )
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_pull_dry_run(self, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'image': 'IMAGE'}
+        env = environment.Environment(dry_run=True)
+        env.runtime = Mock()
+
+        res = env.pull(['NAME-1', 'NAME-2'], 4)
+
+        self.assertTrue(res)
+        env.runtime.pull.assert_not_called()
+        mocked_print.assert_called_with('  pull image IMAGE')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    @patch('snowglobe.environment.time.monotonic')
+    def test_exec_all(self, mocked_monotonic, mocked_print, mocked_config):
+        mocked_monotonic.return_value = 0
+        mocked_config.return_value.get_config.side_effect = lambda name: {'name': name, 'execs': []}
+        env = environment.Environment()
+
+        def exec_stream(name, exec_name, execs, output):
+            if name == 'MISSING':
+                raise RuntimeError('Exec name: EXEC-NAME not found')
+            output('LINE')
+            return 0 if name == 'NAME-1' else 2
+
+        env.runtime.exec_stream = Mock()
+        env.runtime.exec_stream.side_effect = exec_stream
+
+        res = env.exec_all(['NAME-1', 'NAME-2', 'MISSING'], 'EXEC-NAME', 1)
+
+        self.assertFalse(res)
+        mocked_print.assert_has_calls([call('NAME-1  | LINE', flush=True), call('NAME-2  | LINE', flush=True)])
+        mocked_print.assert_called_with(
+            'NAME      RESULT   EXIT   TIME   ERROR\n'
+            'NAME-1    ok       0      0.0s\n'
+            'NAME-2    failed   2      0.0s\n'
+            'MISSING   failed          0.0s   Exec name: EXEC-NAME not found'
+        )
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    @patch('snowglobe.environment.time.monotonic')
+    def test_reconcile(self, mocked_monotonic, mocked_print, mocked_config):
+        mocked_monotonic.return_value = 0
+        new = {'name': 'NEW', 'image': 'IMAGE', 'create': {}}
+        same = {'name': 'SAME', 'image': 'IMAGE', 'create': {}}
+        mocked_config.return_value.confs = {'NEW', 'SAME'}
+        mocked_config.return_value.get_config.side_effect = {'NEW': new, 'SAME': same}.get
+        env = environment.Environment()
+        env.runtime.containers = Mock()
+        env.runtime.containers.return_value = {
+            'SAME': {'running': True, 'labels': {config.SPEC_LABEL: config.spec_hash('IMAGE', {})}},
+            'ORPHAN': {'running': False, 'labels': {config.MANAGED_LABEL: 'true', config.STORE_LABEL: env.store}},
+            'OTHER-STORE': {'running': True, 'labels': {config.MANAGED_LABEL: 'true', config.STORE_LABEL: 'OTHER'}},
+        }
+        env.apply = Mock()
+        env.apply.side_effect = [None, RuntimeError('FAILED')]
+
+        res = env.reconcile(jobs=1)
+
+        self.assertFalse(res)
+        env.runtime.containers.assert_called_once_with()
+        env.apply.assert_has_calls([call(('create', 'NEW'), new), call(('remove', 'ORPHAN'), {'name': 'ORPHAN'})])
+        mocked_print.assert_called_with(
+            'NAME     RESULT   TIME   ERROR\n'
+            'NEW      ok       0.0s\n'
+            'ORPHAN   failed   0.0s   FAILED'
+        )
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_reconcile_directory_dry_run(self, mocked_print, mocked_config):
+        mocked_config_object = mocked_config.return_value
+        mocked_config_object.confs = {'SAME', 'OLD'}
+        mocked_config_object.get_config.return_value = {'name': 'SAME', 'image': 'IMAGE', 'create': {}}
+        mocked_config_object.load_directory.return_value = {
+            'NEW': {'name': 'NEW', 'image': 'IMAGE', 'create': {}},
+            'SAME': {'name': 'SAME', 'image': 'IMAGE', 'create': {}},
+        }
+        env = environment.Environment(dry_run=True)
+        env.runtime.containers = Mock()
+        env.runtime.containers.return_value = {
+            'SAME': {'running': True, 'labels': {config.SPEC_LABEL: config.spec_hash('IMAGE', {})}},
+        }
+        env.apply = Mock()
+
+        self.assertTrue(env.reconcile('DIRECTORY'))
+
+        mocked_config_object.load_directory.assert_called_with('DIRECTORY')
+        env.apply.assert_not_called()
+        mocked_print.assert_has_calls([
+            call('Plan for apply:'),
+            call('  write config NEW\n  delete config OLD\n  create NEW'),
         ])
 
+    @patch('snowglobe.environment.config.Config')
+    def test_reconcile_directory_dependency_cycle(self, mocked_config):
+        mocked_config.return_value.load_directory.return_value = {
+            'APP': {'name': 'APP', 'image': 'IMAGE', 'create': {}, 'depends_on': [{'name': 'DB'}]},
+            'DB': {'name': 'DB', 'image': 'IMAGE', 'create': {}, 'depends_on': [{'name': 'APP'}]},
+        }
+        env = environment.Environment()
+        env.runtime.containers = Mock()
+        env.apply = Mock()
+
+        with self.assertRaisesRegex(RuntimeError, 'Dependency cycle'):
+            env.reconcile('DIRECTORY')
+
+        env.runtime.containers.assert_not_called()
+        env.apply.assert_not_called()
+
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_stop(self, mocked_print, mocked_config):
+    def test_reconcile_nothing_to_do(self, mocked_print, mocked_config):
+        mocked_config.return_value.confs = {'SAME'}
+        mocked_config.return_value.get_config.return_value = {'name': 'SAME', 'image': 'IMAGE', 'create': {}}
+        env = environment.Environment()
+        env.runtime.containers = Mock()
+        env.runtime.containers.return_value = {
+            'SAME': {'running': False, 'labels': {config.SPEC_LABEL: config.spec_hash('IMAGE', {})}},
+        }
+        env.apply = Mock()
+
+        self.assertTrue(env.reconcile())
+
+        env.apply.assert_not_called()
+        mocked_print.assert_called_with('Nothing to do')
+
+    @patch('snowglobe.environment.config.Config')
+    def test_commands(self, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME', 'execs': []}
+        env = environment.Environment()
+        env.run = Mock()
+
+        env.create('NAME')
+        env.start_container('NAME')
+        env.exec('NAME', 'EXEC-NAME')
+        env.stop('NAME')
+        env.delete('NAME')
+
+        env.run.assert_has_calls([
+            call('create', 'NAME'),
+            call('start', 'NAME', env=None, replace=False),
+            call('exec', 'NAME', ('EXEC-NAME',), env={'name': 'NAME', 'execs': []}, replace=False),
+            call('stop', 'NAME'),
+            call('delete', 'NAME'),
+        ])
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.session.execute')
+    def test_exec_session(self, mocked_execute, mocked_config):
+        execs = [{'name': 'EXEC-NAME', 'command': 'COMMAND ARG', 'options': '-u root', 'session': True}]
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME', 'execs': execs}
+        mocked_execute.return_value = 3
+        env = environment.Environment()
+        env.run = Mock()
+
+        res = env.exec('NAME', 'EXEC-NAME')
+
+        self.assertEqual(res, 3)
+        mocked_execute.assert_called_with('NAME', ['-u', 'root'], ['COMMAND', 'ARG'])
+        env.run.assert_not_called()
+
+        mocked_execute.return_value = None
+        env.exec('NAME', 'EXEC-NAME')
+
+        env.run.assert_called_once()
+
+    @patch('snowglobe.environment.config.Config')
+    def test_start_dependencies(self, mocked_config):
+        configs = {
+            'NAME': {'depends_on': [{'name': 'CACHE'}, {'name': 'DB', 'condition': 'healthy', 'timeout': 30}]},
+            'CACHE': {'depends_on': [{'name': 'DB'}]},
+            'DB': {},
+        }
         mocked_config_object = Mock()
-        mocked_config_object.get_config.return_value = {'name': 'NAME'}
+        mocked_config_object.get_config.side_effect = configs.get
         mocked_config.return_value = mocked_config_object
+        env = environment.Environment()
+        env.start_container = Mock()
+        env.wait_healthy = Mock()
+
+        env.start('NAME')
+
+        env.start_container.assert_has_calls([call('DB', {}), call('CACHE', configs['CACHE']),
+                                              call('NAME', configs['NAME'], False)])
+        env.wait_healthy.assert_called_once_with('DB', 30)
+
+    def health_events(self, env, lines):
+        """
+        Lets the runtime of an environment follow the given health event lines. The stream blocks after the last line
+        until the test ends, like docker events does.
+        """
+        blocked = threading.Event()
+        self.addCleanup(blocked.set)
+        stream = MagicMock()
+        stream.__enter__.return_value = itertools.chain(lines, iter(blocked.wait, True))
+        env.runtime.health_events = Mock(return_value=stream)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_wait_healthy(self, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME'}
         mocked_print.return_value = None
         env = environment.Environment()
-        env.runtime.stop = Mock()
+        env.runtime.inspect = Mock(return_value={'State': {'Running': True, 'Health': {'Status': 'starting'}}})
+        self.health_events(env, ['{"Action": "health_status: unhealthy"}', '{"Action": "health_status: healthy"}'])
 
-        env.stop('NAME')
+        env.wait_healthy('NAME', 10)
 
-        mocked_config_object.get_config.assert_called_with('NAME')
-        mocked_print.assert_called_with('Stopping container: NAME')
-        env.runtime.stop.assert_called_with('NAME')
+        mocked_print.assert_called_with('Waiting for container: NAME to be healthy')
+        env.runtime.health_events.assert_called_once_with('NAME', ANY)
+        env.runtime.inspect.assert_called_once_with('NAME')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_wait_healthy_already_healthy(self, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME'}
+        env = environment.Environment()
+        env.runtime.inspect = Mock(return_value={'State': {'Running': True, 'Health': {'Status': 'healthy'}}})
+        self.health_events(env, [])
+
+        env.wait_healthy('NAME', 10)
 
     @patch('snowglobe.environment.config.Config')
     @patch('snowglobe.environment.print')
-    def test_delete(self, mocked_print, mocked_config):
+    def test_wait_healthy_container_stopped(self, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME'}
+        env = environment.Environment()
+        env.runtime.inspect = Mock(return_value={'State': {'Running': True, 'Health': {'Status': 'starting'}}})
+        self.health_events(env, ['{"Action": "die"}'])
+
+        with self.assertRaisesRegex(RuntimeError, 'Container: NAME stopped before it was healthy'):
+            env.wait_healthy('NAME', 10)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_wait_healthy_timeout(self, mocked_print, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME'}
+        env = environment.Environment()
+        env.runtime.inspect = Mock(return_value={'State': {'Running': True, 'Health': {'Status': 'starting'}}})
+        self.health_events(env, ['{"Action": "health_status: unhealthy"}'])
+
+        with self.assertRaisesRegex(RuntimeError, 'Container: NAME not healthy after 0.05 seconds'):
+            env.wait_healthy('NAME', 0.05)
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_wait_healthy_no_healthcheck(self, mocked_print, mocked_config):
         mocked_config_object = Mock()
         mocked_config_object.get_config.return_value = {'name': 'NAME'}
         mocked_config.return_value = mocked_config_object
         mocked_print.return_value = None
         env = environment.Environment()
-        env.runtime.remove = Mock()
+        env.runtime.inspect = Mock()
+        env.runtime.inspect.return_value = {'State': {'Running': True}}
+        self.health_events(env, [])
 
-        env.delete('NAME')
+        with self.assertRaises(RuntimeError):
+            env.wait_healthy('NAME', 10)
 
-        mocked_config_object.get_config.assert_called_with('NAME')
-        mocked_print.assert_called_with('Deleting container: NAME')
-        env.runtime.remove.assert_called_with('NAME')
+
+    @patch('snowglobe.environment.config.Config')
+    def test_start_wait(self, mocked_config):
+        mocked_config.return_value.get_config.return_value = {'name': 'NAME'}
+        env = environment.Environment()
+        env.start_container = Mock()
+        env.wait_ready = Mock()
+
+        env.start('NAME', replace=True, wait=True, timeout=30)
+
+        env.start_container.assert_called_once_with('NAME', {'name': 'NAME'}, False)
+        env.wait_ready.assert_called_once_with('NAME', {'name': 'NAME'}, 30, ANY)
+
+    @patch('snowglobe.environment.config.Config')
+    def test_start_dependency_ready(self, mocked_config):
+        configs = {'NAME': {'depends_on': [{'name': 'DB', 'condition': 'ready', 'timeout': 30}]}, 'DB': {}}
+        mocked_config.return_value.get_config.side_effect = configs.get
+        env = environment.Environment()
+        env.start_container = Mock()
+        env.wait_ready = Mock()
+
+        env.start('NAME')
+
+        env.wait_ready.assert_called_once_with('DB', {}, 30)
+
+    @patch('snowglobe.ready.Waiter')
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    @patch('snowglobe.environment.time.monotonic')
+    def test_wait_ready(self, mocked_monotonic, mocked_print, mocked_config, mocked_waiter):
+        mocked_monotonic.return_value = 12.5
+        data = {'name': 'NAME', 'ready': {'log': 'listening', 'timeout': 20}}
+        env = environment.Environment()
+        env.runtime = Mock()
+        env.runtime.inspect.return_value = {'State': {'Running': True, 'StartedAt': 'STARTED-AT'}}
+
+        env.wait_ready('NAME', data, started=10)
+
+        mocked_waiter.assert_called_once_with(env.runtime, data)
+        mocked_waiter.return_value.wait.assert_called_once_with('STARTED-AT', 20)
+        mocked_print.assert_called_with('Container: NAME ready in 2.5s')
+
+    @patch('snowglobe.environment.config.Config')
+    @patch('snowglobe.environment.print')
+    def test_wait_ready_stopped(self, mocked_print, mocked_config):
+        env = environment.Environment()
+        env.runtime = Mock()
+        env.runtime.inspect.return_value = {'State': {'Running': False, 'StartedAt': 'STARTED-AT'}}
+
+        with self.assertRaisesRegex(RuntimeError, 'stopped before it was ready'):
+            env.wait_ready('NAME', {'name': 'NAME', 'ready': {'port': 80}})
 
 
 if __name__ == '__main__':
@@ -1,7 +1,8 @@
 import unittest
 from unittest.mock import Mock, patch
 import json
-from snowglobe import __main__
+import os
+from snowglobe import __main__, config
 
 
 class TestArgParser(unittest.TestCase):
@@ -23,6 +24,22 @@ class TestArgParser(unittest.TestCase):
         res = __main__.parse_args(['list'])
 
         self.assertEqual(res.command, 'list')
+        self.assertEqual(res.runtime, 'cli')
+
+    def test_parse_args_runtime(self):
+        res = __main__.parse_args(['--runtime', 'api', 'list'])
+
+        self.assertEqual(res.runtime, 'api')
+
+    def test_parse_args_dry_run(self):
+        res = __main__.parse_args(['--dry-run', 'reset', 'NAME'])
+
+        self.assertTrue(res.dry_run)
+
+    def test_parse_args_status(self):
+        res = __main__.parse_args(['status'])
+
+        self.assertEqual(res.command, 'status')
 
     def test_parse_args_template(self):
         res = __main__.parse_args(['template'])
@@ -45,32 +62,159 @@ class TestArgParser(unittest.TestCase):
         res = __main__.parse_args(['remove', 'NAME'])
 
         self.assertEqual(res.command, 'remove')
-        self.assertEqual(res.name, 'NAME')
+        self.assertEqual(res.names, ['NAME'])
 
     def test_parse_args_reset(self):
         res = __main__.parse_args(['reset', 'NAME'])
 
         self.assertEqual(res.command, 'reset')
-        self.assertEqual(res.name, 'NAME')
+        self.assertEqual(res.names, ['NAME'])
 
     def test_parse_args_start(self):
         res = __main__.parse_args(['start', 'NAME'])
 
         self.assertEqual(res.command, 'start')
-        self.assertEqual(res.name, 'NAME')
+        self.assertEqual(res.names, ['NAME'])
 
     def test_parse_args_exec(self):
         res = __main__.parse_args(['exec', 'NAME', 'EXEC-NAME'])
 
         self.assertEqual(res.command, 'exec')
-        self.assertEqual(res.name, 'NAME')
+        self.assertEqual(res.names, ['NAME'])
+        self.assertEqual(res.exec_name, 'EXEC-NAME')
+
+    def test_parse_args_exec_many(self):
+        res = __main__.parse_args(['exec', 'NAME-1', 'NAME-2', 'EXEC-NAME', '--jobs', '2'])
+
+        self.assertEqual(res.names, ['NAME-1', 'NAME-2'])
         self.assertEqual(res.exec_name, 'EXEC-NAME')
+        self.assertEqual(res.jobs, 2)
+        self.assertTrue(__main__.parse_args(['exec', '--all', 'EXEC-NAME']).all)
 
     def test_parse_args_stop(self):
         res = __main__.parse_args(['stop', 'NAME'])
 
         self.assertEqual(res.command, 'stop')
+        self.assertEqual(res.names, ['NAME'])
+
+    def test_parse_args_reset_force(self):
+        res = __main__.parse_args(['reset', '--force', 'NAME'])
+
+        self.assertTrue(res.force)
+
+    def test_parse_args_store(self):
+        res = __main__.parse_args(['--store', 'sqlite', 'list', '--image', 'IMAGE'])
+
+        self.assertEqual(res.store, 'sqlite')
+        self.assertEqual(res.image, 'IMAGE')
+
+    def test_parse_args_apply(self):
+        res = __main__.parse_args(['apply', 'DIRECTORY', '--jobs', '8'])
+
+        self.assertEqual(res.command, 'apply')
+        self.assertEqual(res.directory, 'DIRECTORY')
+        self.assertEqual(res.jobs, 8)
+        self.assertIsNone(__main__.parse_args(['apply']).directory)
+
+    def test_parse_args_start_wait(self):
+        res = __main__.parse_args(['start', 'NAME', '--wait', '--timeout', '30'])
+
+        self.assertTrue(res.wait)
+        self.assertEqual(res.timeout, 30)
+        self.assertIsNone(__main__.parse_args(['start', 'NAME']).timeout)
+
+    def test_parse_args_pull(self):
+        res = __main__.parse_args(['pull', '--all', '--jobs', '8'])
+
+        self.assertEqual(res.command, 'pull')
+        self.assertTrue(res.all)
+        self.assertEqual(res.jobs, 8)
+        self.assertEqual(__main__.parse_args(['pull', 'NAME']).names, ['NAME'])
+
+    def test_parse_args_pool(self):
+        res = __main__.parse_args(['pool', 'NAME', '--size', '3'])
+
+        self.assertEqual(res.command, 'pool')
         self.assertEqual(res.name, 'NAME')
+        self.assertEqual(res.size, 3)
+        self.assertIsNone(__main__.parse_args(['pool', 'NAME']).size)
+
+    def test_parse_args_snapshot(self):
+        res = __main__.parse_args(['snapshot', 'NAME', 'TAG'])
+
+        self.assertEqual(res.command, 'snapshot')
+        self.assertEqual(res.name, 'NAME')
+        self.assertEqual(res.tag, 'TAG')
+        self.assertIsNone(__main__.parse_args(['snapshot', 'NAME']).tag)
+
+    def test_parse_args_snapshots(self):
+        res = __main__.parse_args(['snapshots', '--prune', '--keep', '2'])
+
+        self.assertEqual(res.command, 'snapshots')
+        self.assertIsNone(res.name)
+        self.assertTrue(res.prune)
+        self.assertEqual(res.keep, 2)
+
+    def test_parse_args_reset_from_snapshot(self):
+        res = __main__.parse_args(['reset', 'NAME', '--from-snapshot', 'TAG'])
+
+        self.assertEqual(res.snapshot, 'TAG')
+        self.assertIsNone(__main__.parse_args(['reset', 'NAME']).snapshot)
+
+    def test_parse_args_import(self):
+        res = __main__.parse_args(['import', 'DIRECTORY'])
+
+        self.assertEqual(res.command, 'import')
+        self.assertEqual(res.directory, 'DIRECTORY')
+
+    def test_parse_args_daemon(self):
+        res = __main__.parse_args(['daemon'])
+
+        self.assertEqual(res.command, 'daemon')
+
+    def test_parse_args_top(self):
+        res = __main__.parse_args(['top', '--window', '10', '--count', '2'])
+
+        self.assertEqual(res.command, 'top')
+        self.assertEqual(res.window, 10)
+        self.assertEqual(res.count, 2)
+        with self.assertRaises(SystemExit):
+            __main__.parse_args(['top', '--count', '0'])
+
+    def test_parse_args_session(self):
+        res = __main__.parse_args(['session', 'NAME', '--idle-timeout', '30'])
+
+        self.assertEqual(res.command, 'session')
+        self.assertEqual(res.name, 'NAME')
+        self.assertEqual(res.idle_timeout, 30)
+
+    def test_parse_args_many_names(self):
+        res = __main__.parse_args(['start', 'NAME-1', 'NAME-2', '--jobs', '2'])
+
+        self.assertEqual(res.names, ['NAME-1', 'NAME-2'])
+        self.assertEqual(res.jobs, 2)
+        self.assertFalse(res.all)
+
+    def test_parse_args_all(self):
+        res = __main__.parse_args(['stop', '--all'])
+
+        self.assertEqual(res.names, [])
+        self.assertEqual(res.jobs, 4)
+        self.assertTrue(res.all)
+
+    @patch('snowglobe.__main__.argparse.ArgumentParser.exit')
+    def test_parse_args_names_and_all(self, mocked_exit):
+        mocked_exit.side_effect = SystemExit
+
+        with self.assertRaises(SystemExit):
+            __main__.parse_args(['stop', 'NAME', '--all'])
+
+    @patch('snowglobe.__main__.argparse.ArgumentParser.exit')
+    def test_parse_args_no_names(self, mocked_exit):
+        mocked_exit.side_effect = SystemExit
+
+        with self.assertRaises(SystemExit):
+            __main__.parse_args(['stop'])
 
 
 class TestMain(unittest.TestCase):
@@ -90,12 +234,58 @@ class TestMain(unittest.TestCase):
 
     @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'list'])
     @patch('snowglobe.__main__.environment.Environment')
+    @patch('snowglobe.__main__.daemon.query', Mock(return_value=None))
     def test_main_list(self, mocked_environment):
         mocked_environment_object = Mock()
         mocked_environment.return_value = mocked_environment_object
         res = __main__.main()
 
-        mocked_environment_object.list.assert_called_with()
+        mocked_environment.assert_called_with('cli', False, 'json')
+        mocked_environment_object.list.assert_called_with(None)
+        self.assertEqual(res, 0)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'status'])
+    @patch('snowglobe.__main__.environment.Environment')
+    @patch('snowglobe.__main__.daemon.query', Mock(return_value=None))
+    def test_main_status(self, mocked_environment):
+        mocked_environment_object = Mock()
+        mocked_environment.return_value = mocked_environment_object
+        res = __main__.main()
+
+        mocked_environment_object.status.assert_called_with()
+        self.assertEqual(res, 0)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'status'])
+    @patch('snowglobe.__main__.environment.Environment')
+    @patch('snowglobe.__main__.daemon.query')
+    @patch('snowglobe.__main__.print')
+    def test_main_status_from_daemon(self, mocked_print, mocked_query, mocked_environment):
+        mocked_query.return_value = 'OUTPUT\n'
+        res = __main__.main()
+
+        mocked_query.assert_called_with('status', None, None, config.store_location('json'))
+        mocked_print.assert_called_with('OUTPUT\n', end='')
+        mocked_environment.assert_not_called()
+        self.assertEqual(res, 0)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'export', 'DIRECTORY'])
+    @patch('snowglobe.__main__.environment.Environment')
+    def test_main_export(self, mocked_environment):
+        mocked_environment_object = Mock()
+        mocked_environment.return_value = mocked_environment_object
+        res = __main__.main()
+
+        mocked_environment_object.export_configs.assert_called_with('DIRECTORY')
+        self.assertEqual(res, 0)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', '--trace', 'FILE', 'template'])
+    @patch('snowglobe.__main__.environment.Environment')
+    @patch('snowglobe.__main__.trace')
+    def test_main_trace(self, mocked_trace, mocked_environment):
+        res = __main__.main()
+
+        mocked_trace.start.assert_called_with()
+        mocked_trace.save.assert_called_with('FILE', 'snowglobe template')
         self.assertEqual(res, 0)
 
     @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'template'])
@@ -110,6 +300,7 @@ class TestMain(unittest.TestCase):
 
     @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'inspect', 'NAME'])
     @patch('snowglobe.__main__.environment.Environment')
+    @patch('snowglobe.__main__.daemon.query', Mock(return_value=None))
     def test_main_inspect(self, mocked_environment):
         mocked_environment_object = Mock()
         mocked_environment.return_value = mocked_environment_object
@@ -175,7 +366,7 @@ class TestMain(unittest.TestCase):
         res = __main__.main()
 
         mocked_open.assert_called_with('FILE', 'r')
-        mocked_environment_object.setup.assert_called_with('NAME', {'name': 'NAME'})
+        mocked_environment_object.setup.assert_called_with('NAME', {'name': 'NAME'}, os.getcwd())
         self.assertEqual(res, 0)
 
     @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'remove', 'NAME'])
@@ -195,9 +386,17 @@ class TestMain(unittest.TestCase):
         mocked_environment.return_value = mocked_environment_object
         res = __main__.main()
 
-        mocked_environment_object.reset.assert_called_with('NAME')
+        mocked_environment_object.reset.assert_called_with('NAME', False, None)
         self.assertEqual(res, 0)
 
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'reset', 'NAME'])
+    @patch('snowglobe.__main__.environment.Environment')
+    def test_main_reset_interrupted(self, mocked_environment):
+        mocked_environment.return_value.reset.side_effect = KeyboardInterrupt
+        res = __main__.main()
+
+        self.assertEqual(res, 130)
+
     @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'start', 'NAME'])
     @patch('snowglobe.__main__.environment.Environment')
     def test_main_start(self, mocked_environment):
@@ -205,17 +404,64 @@ class TestMain(unittest.TestCase):
         mocked_environment.return_value = mocked_environment_object
         res = __main__.main()
 
-        mocked_environment_object.start.assert_called_with('NAME')
+        mocked_environment_object.start.assert_called_with('NAME', replace=True)
         self.assertEqual(res, 0)
 
     @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'exec', 'NAME', 'EXEC-NAME'])
     @patch('snowglobe.__main__.environment.Environment')
     def test_main_exec(self, mocked_environment):
         mocked_environment_object = Mock()
+        mocked_environment_object.exec.return_value = None
+        mocked_environment.return_value = mocked_environment_object
+        res = __main__.main()
+
+        mocked_environment_object.exec.assert_called_with('NAME', 'EXEC-NAME', replace=True)
+        self.assertEqual(res, 0)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'exec', '--all', 'EXEC-NAME'])
+    @patch('snowglobe.__main__.environment.Environment')
+    def test_main_exec_all(self, mocked_environment):
+        mocked_environment_object = Mock()
+        mocked_environment_object.config.confs = {'NAME-2', 'NAME-1'}
+        mocked_environment_object.exec_all.return_value = False
+        mocked_environment.return_value = mocked_environment_object
+        res = __main__.main()
+
+        mocked_environment_object.exec_all.assert_called_with(['NAME-1', 'NAME-2'], 'EXEC-NAME', 4)
+        self.assertEqual(res, -1)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'start', 'NAME', '--wait'])
+    @patch('snowglobe.__main__.environment.Environment')
+    def test_main_start_wait(self, mocked_environment):
+        mocked_environment_object = Mock()
+        mocked_environment.return_value = mocked_environment_object
+        res = __main__.main()
+
+        mocked_environment_object.start.assert_called_with('NAME', wait=True, timeout=None)
+        self.assertEqual(res, 0)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'start', '--all', '--wait', '--timeout', '10'])
+    @patch('snowglobe.__main__.environment.Environment')
+    def test_main_start_wait_all(self, mocked_environment):
+        mocked_environment_object = Mock()
+        mocked_environment_object.config.confs = {'NAME-1'}
+        mocked_environment_object.batch.return_value = True
+        mocked_environment.return_value = mocked_environment_object
+        res = __main__.main()
+
+        mocked_environment_object.batch.assert_called_with('start', ['NAME-1'], 4, wait=True, timeout=10)
+        self.assertEqual(res, 0)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'pull', '--all'])
+    @patch('snowglobe.__main__.environment.Environment')
+    def test_main_pull(self, mocked_environment):
+        mocked_environment_object = Mock()
+        mocked_environment_object.config.confs = {'NAME-2', 'NAME-1'}
+        mocked_environment_object.pull.return_value = True
         mocked_environment.return_value = mocked_environment_object
         res = __main__.main()
 
-        mocked_environment_object.exec.assert_called_with('NAME', 'EXEC-NAME')
+        mocked_environment_object.pull.assert_called_with(['NAME-1', 'NAME-2'], 4)
         self.assertEqual(res, 0)
 
     @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'stop', 'NAME'])
@@ -228,6 +474,41 @@ class TestMain(unittest.TestCase):
         mocked_environment_object.stop.assert_called_with('NAME')
         self.assertEqual(res, 0)
 
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'stop', 'NAME-1', 'NAME-2', '--jobs', '2'])
+    @patch('snowglobe.__main__.environment.Environment')
+    def test_main_batch(self, mocked_environment):
+        mocked_environment_object = Mock()
+        mocked_environment_object.batch.return_value = True
+        mocked_environment.return_value = mocked_environment_object
+        res = __main__.main()
+
+        mocked_environment_object.batch.assert_called_with('stop', ['NAME-1', 'NAME-2'], 2)
+        self.assertEqual(res, 0)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'start', '--all'])
+    @patch('snowglobe.__main__.environment.Environment')
+    def test_main_batch_all_failed(self, mocked_environment):
+        mocked_environment_object = Mock()
+        mocked_environment_object.config.confs = {'NAME-2', 'NAME-1'}
+        mocked_environment_object.batch.return_value = False
+        mocked_environment.return_value = mocked_environment_object
+        res = __main__.main()
+
+        mocked_environment_object.batch.assert_called_with('start', ['NAME-1', 'NAME-2'], 4)
+        self.assertEqual(res, -1)
+
+    @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'stop', 'NAME'])
+    @patch('snowglobe.__main__.environment.Environment')
+    @patch('snowglobe.__main__.print')
+    def test_main_docker_timeout(self, mocked_print, mocked_environment):
+        from snowglobe import runtime
+        mocked_environment.return_value.stop.side_effect = runtime.DockerTimeout('docker stop did not finish in 40s')
+
+        res = __main__.main()
+
+        mocked_print.assert_called_with('Docker timeout: docker stop did not finish in 40s.')
+        self.assertEqual(res, -1)
+
     @patch('snowglobe.__main__.sys.argv', ['PROGRAM', 'list'])
     @patch('snowglobe.__main__.environment.Environment')
     @patch('snowglobe.__main__.print')
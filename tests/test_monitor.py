@@ -0,0 +1,54 @@
+import unittest
+from snowglobe import monitor
+
+
+class TestHistory(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.history = monitor.History(window=1, interval=20)
+
+    def tearDown(self):
+        pass
+
+    def test_summary(self):
+        self.history.add(0, 1.0, 100, 1000)
+        self.history.add(20, 3.0, 300, 1000)
+
+        res = self.history.summary(20)
+
+        self.assertEqual(res, {'cpu': 3.0, 'cpu_average': 2.0, 'cpu_peak': 3.0, 'memory': 300, 'memory_average': 200,
+                               'memory_peak': 300, 'limit': 1000})
+
+    def test_summary_without_samples(self):
+        self.assertIsNone(self.history.summary(0))
+
+    def test_ring_buffer_is_bounded(self):
+        for second in range(0, 200, 20):
+            self.history.add(second, second, second)
+
+        self.assertEqual(self.history.size, 3)
+        self.assertEqual(len(self.history.cpu), 3)
+        self.assertEqual(self.history.samples(180), [(140, 140, 140), (160, 160, 160), (180, 180, 180)])
+
+    def test_frames_closer_than_interval_are_dropped(self):
+        for second in range(0, 60, 5):
+            self.history.add(second, second, second)
+
+        self.assertEqual(self.history.samples(55), [(0, 0, 0), (20, 20, 20), (40, 40, 40)])
+
+    def test_samples_outside_window(self):
+        self.history.add(0, 1.0, 100)
+        self.history.add(50, 2.0, 200)
+
+        self.assertEqual(self.history.samples(100), [(50, 2.0, 200)])
+
+
+if __name__ == '__main__':
+    unittest.main()
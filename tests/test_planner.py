@@ -0,0 +1,168 @@
+import unittest
+from snowglobe import planner, config
+
+
+RUNNING = {'State': {'Running': True}}
+STOPPED = {'State': {'Running': False}}
+
+
+class TestPlanner(unittest.TestCase):
+    def test_plan_setup(self):
+        res = planner.plan('setup', 'NAME', None)
+
+        self.assertEqual(res, [('write_config', 'NAME'), ('create', 'NAME')])
+
+    def test_plan_setup_container_exists(self):
+        with self.assertRaises(RuntimeError):
+            planner.plan('setup', 'NAME', STOPPED)
+
+    def test_plan_create_container_exists(self):
+        with self.assertRaises(RuntimeError):
+            planner.plan('create', 'NAME', STOPPED)
+
+    def test_plan_start(self):
+        self.assertEqual(planner.plan('start', 'NAME', None), [('create', 'NAME'), ('start', 'NAME')])
+        self.assertEqual(planner.plan('start', 'NAME', STOPPED), [('start', 'NAME')])
+
+    def test_plan_exec(self):
+        self.assertEqual(planner.plan('exec', 'NAME', None, 'EXEC-NAME'),
+                         [('create', 'NAME'), ('exec', 'NAME', 'EXEC-NAME')])
+        self.assertEqual(planner.plan('exec', 'NAME', RUNNING, 'EXEC-NAME'), [('exec', 'NAME', 'EXEC-NAME')])
+
+    def test_plan_stop(self):
+        self.assertEqual(planner.plan('stop', 'NAME', None), [])
+        self.assertEqual(planner.plan('stop', 'NAME', STOPPED), [])
+        self.assertEqual(planner.plan('stop', 'NAME', RUNNING), [('stop', 'NAME')])
+
+    def test_plan_delete(self):
+        self.assertEqual(planner.plan('delete', 'NAME', None), [])
+        self.assertEqual(planner.plan('delete', 'NAME', RUNNING), [('remove', 'NAME')])
+
+    def test_plan_reset(self):
+        self.assertEqual(planner.plan('reset', 'NAME', None), [('create', 'NAME')])
+        self.assertEqual(planner.plan('reset', 'NAME', STOPPED), [('remove', 'NAME'), ('create', 'NAME')])
+        self.assertEqual(planner.plan('reset', 'NAME', RUNNING),
+                         [('stop', 'NAME'), ('remove', 'NAME'), ('create', 'NAME')])
+
+    def test_plan_reset_kill(self):
+        self.assertEqual(planner.plan('reset', 'NAME', RUNNING, kill=True),
+                         [('force_remove', 'NAME'), ('create', 'NAME')])
+        self.assertEqual(planner.plan('remove', 'NAME', STOPPED, kill=True),
+                         [('remove', 'NAME'), ('delete_config', 'NAME')])
+
+    def test_plan_start_spec_changed(self):
+        state = dict(RUNNING, Config={'Labels': {config.SPEC_LABEL: 'OLD-SPEC'}})
+
+        res = planner.plan('start', 'NAME', state, spec='SPEC')
+
+        self.assertEqual(res, [('stop', 'NAME'), ('remove', 'NAME'), ('create', 'NAME'), ('start', 'NAME')])
+
+    def test_plan_start_without_spec_label(self):
+        self.assertEqual(planner.plan('start', 'NAME', STOPPED, spec='SPEC'), [('start', 'NAME')])
+
+    def test_plan_reset_spec_unchanged(self):
+        running = dict(RUNNING, Config={'Labels': {config.SPEC_LABEL: 'SPEC'}})
+        stopped = dict(STOPPED, Config={'Labels': {config.SPEC_LABEL: 'SPEC'}})
+
+        self.assertEqual(planner.plan('reset', 'NAME', running, spec='SPEC'), [('restart', 'NAME')])
+        self.assertEqual(planner.plan('reset', 'NAME', stopped, spec='SPEC'), [])
+        self.assertEqual(planner.plan('reset', 'NAME', running, spec='SPEC', force=True),
+                         [('stop', 'NAME'), ('remove', 'NAME'), ('create', 'NAME')])
+        self.assertEqual(planner.plan('reset', 'NAME', running, spec='NEW-SPEC'),
+                         [('stop', 'NAME'), ('remove', 'NAME'), ('create', 'NAME')])
+
+    def test_plan_reset_from_image(self):
+        running = dict(RUNNING, Config={'Labels': {config.SPEC_LABEL: 'SPEC'}})
+
+        self.assertEqual(planner.plan('reset', 'NAME', running, spec='SPEC', image='IMAGE'),
+                         [('stop', 'NAME'), ('remove', 'NAME'), ('create', 'NAME', 'IMAGE')])
+        self.assertEqual(planner.plan('reset', 'NAME', None, image='IMAGE'), [('create', 'NAME', 'IMAGE')])
+
+    def test_plan_reset_spare(self):
+        self.assertEqual(planner.plan('reset', 'NAME', RUNNING, spare='SPARE'),
+                         [('stop', 'NAME'), ('remove', 'NAME'), ('swap', 'NAME', 'SPARE')])
+        running = dict(RUNNING, Config={'Labels': {config.SPEC_LABEL: 'SPEC'}})
+        self.assertEqual(planner.plan('reset', 'NAME', running, spec='SPEC', spare='SPARE'), [('restart', 'NAME')])
+
+    def test_plan_remove(self):
+        self.assertEqual(planner.plan('remove', 'NAME', None), [('delete_config', 'NAME')])
+        self.assertEqual(planner.plan('remove', 'NAME', RUNNING),
+                         [('stop', 'NAME'), ('remove', 'NAME'), ('delete_config', 'NAME')])
+
+    def test_plan_unknown_command(self):
+        with self.assertRaises(RuntimeError):
+            planner.plan('COMMAND', 'NAME', None)
+
+    def test_reconcile(self):
+        envs = {name: {'name': name, 'image': 'IMAGE', 'create': {}} for name in ['NEW', 'SAME', 'CHANGED', 'OLD']}
+        spec = config.spec_hash('IMAGE', {})
+        containers = {
+            'SAME': {'running': True, 'labels': {config.MANAGED_LABEL: 'true', config.SPEC_LABEL: spec}},
+            'CHANGED': {'running': True, 'labels': {config.MANAGED_LABEL: 'true', config.SPEC_LABEL: 'OLD-SPEC'}},
+            'OLD': {'running': False, 'labels': {}},
+            'ORPHAN': {'running': True, 'labels': {config.MANAGED_LABEL: 'true', config.SPEC_LABEL: spec,
+                                                   config.STORE_LABEL: 'STORE'}},
+            'OTHER': {'running': True, 'labels': {}},
+            'SAME-spare-1': {'running': False, 'labels': {config.MANAGED_LABEL: 'true', config.POOL_LABEL: 'SAME',
+                                                          config.STORE_LABEL: 'STORE'}},
+            'ORPHAN-spare-1': {'running': False, 'labels': {config.MANAGED_LABEL: 'true', config.POOL_LABEL: 'ORPHAN',
+                                                            config.STORE_LABEL: 'STORE'}},
+        }
+
+        res = planner.reconcile(envs, containers, store='STORE')
+
+        self.assertEqual(res, {
+            'CHANGED': [('stop', 'CHANGED'), ('remove', 'CHANGED'), ('create', 'CHANGED'), ('start', 'CHANGED')],
+            'NEW': [('create', 'NEW')],
+            'OLD': [('remove', 'OLD'), ('create', 'OLD')],
+            'ORPHAN': [('stop', 'ORPHAN'), ('remove', 'ORPHAN')],
+            'ORPHAN-spare-1': [('remove', 'ORPHAN-spare-1')],
+        })
+
+    def test_reconcile_kill(self):
+        envs = {'CHANGED': {'name': 'CHANGED', 'image': 'IMAGE', 'create': {}, 'stop': {'force': True}}}
+        containers = {'CHANGED': {'running': True, 'labels': {config.SPEC_LABEL: 'OLD-SPEC'}}}
+
+        res = planner.reconcile(envs, containers, store='STORE')
+
+        self.assertEqual(res, {'CHANGED': [('force_remove', 'CHANGED'), ('create', 'CHANGED'), ('start', 'CHANGED')]})
+
+    def test_reconcile_other_store(self):
+        containers = {
+            'OTHER-USER': {'running': True, 'labels': {config.MANAGED_LABEL: 'true', config.STORE_LABEL: 'OTHER'}},
+            'UNLABELLED': {'running': True, 'labels': {config.MANAGED_LABEL: 'true'}},
+        }
+
+        res = planner.reconcile({}, containers, store='STORE')
+
+        self.assertEqual(res, {})
+
+    def test_reconcile_specs(self):
+        envs = {'NAME': {'name': 'NAME', 'image': 'IMAGE', 'create': {}}}
+        containers = {'NAME': {'running': False, 'labels': {config.SPEC_LABEL: config.spec_hash('IMAGE', {})}}}
+
+        res = planner.reconcile(envs, containers, {'NAME': 'BUILD-SPEC'})
+
+        self.assertEqual(res, {'NAME': [('remove', 'NAME'), ('create', 'NAME')]})
+
+    def test_teardown(self):
+        self.assertEqual(planner.teardown('NAME', None), [])
+        self.assertEqual(planner.teardown('NAME', STOPPED), [('remove', 'NAME')])
+        self.assertEqual(planner.teardown('NAME', RUNNING), [('stop', 'NAME'), ('remove', 'NAME')])
+        self.assertEqual(planner.teardown('NAME', RUNNING, kill=True), [('force_remove', 'NAME')])
+
+    def test_kills(self):
+        self.assertFalse(planner.kills({}))
+        self.assertFalse(planner.kills({'stop': {'timeout': 10}}))
+        self.assertTrue(planner.kills({'stop': {'force': True}}))
+        self.assertTrue(planner.kills({'stop': {'timeout': 0}}))
+
+    def test_describe(self):
+        self.assertEqual(planner.describe(('delete_config', 'NAME')), 'delete config NAME')
+        self.assertEqual(planner.describe(('force_remove', 'NAME')), 'force remove NAME')
+        self.assertEqual(planner.describe(('exec', 'NAME', 'EXEC-NAME')), 'exec NAME EXEC-NAME')
+        self.assertEqual(planner.describe(('create', 'NAME', 'IMAGE')), 'create NAME from IMAGE')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+from unittest.mock import Mock, patch
+import threading
+import socket
+import queue
+from snowglobe import ready
+
+
+class FakeStream:
+    """
+    Stands in for a docker log stream. Yields the lines put into it until it ends or is closed.
+    """
+    def __init__(self, lines=(), end=False):
+        self.lines = queue.Queue()
+        for line in lines:
+            self.lines.put(line)
+        if end:
+            self.lines.put(None)
+        self.closed = False
+
+    def __iter__(self):
+        while True:
+            line = self.lines.get()
+            if line is None:
+                return
+            yield line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.closed = True
+        self.lines.put(None)
+
+
+class TestReady(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.runtime = Mock()
+        self.env = {'name': 'NAME', 'create': {'ports': [{'containerPort': 80, 'hostPort': 8080}]},
+                    'execs': [{'name': 'CHECK', 'command': 'CHECK-COMMAND'}]}
+
+    def tearDown(self):
+        pass
+
+    def server(self, close: bool):
+        """
+        Starts a server on a free port that keeps connections open, or closes them at once like the docker proxy
+        does when nothing listens in the container.
+        """
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        self.addCleanup(listener.close)
+        connections = []
+
+        def accept():
+            while True:
+                try:
+                    connection, _ = listener.accept()
+                except OSError:
+                    return
+                if close:
+                    connection.close()
+                else:
+                    connections.append(connection)
+
+        threading.Thread(target=accept, daemon=True).start()
+        self.addCleanup(lambda: [connection.close() for connection in connections])
+        return listener.getsockname()[1]
+
+    def test_log(self):
+        stream = FakeStream(['starting', 'server listening on 80'])
+        self.runtime.logs.return_value = stream
+
+        ready.Waiter(self.runtime, dict(self.env, ready={'log': 'listening on \\d+'})).wait('STARTED-AT', 5)
+
+        self.runtime.logs.assert_called_once_with('NAME', 'STARTED-AT')
+        self.assertTrue(stream.closed)
+
+    def test_container_stopped(self):
+        self.runtime.logs.return_value = FakeStream(['starting', 'failed'], end=True)
+
+        with self.assertRaisesRegex(RuntimeError, 'Container: NAME stopped before it was ready'):
+            ready.Waiter(self.runtime, dict(self.env, ready={'log': 'listening'})).wait('STARTED-AT', 5)
+
+    def test_timeout(self):
+        self.runtime.logs.return_value = FakeStream()
+
+        with self.assertRaisesRegex(RuntimeError, 'Container: NAME not ready after 0.05 seconds'):
+            ready.Waiter(self.runtime, dict(self.env, ready={'log': 'listening'})).wait('STARTED-AT', 0.05)
+
+    @patch('snowglobe.ready.PROBE_DELAY', 0.001)
+    def test_exec(self):
+        self.runtime.logs.return_value = FakeStream()
+        self.runtime.exec_stream.side_effect = [1, 1, 0]
+
+        ready.Waiter(self.runtime, dict(self.env, ready={'exec': 'CHECK'})).wait('STARTED-AT', 5)
+
+        self.assertEqual(self.runtime.exec_stream.call_count, 3)
+        self.assertEqual(self.runtime.exec_stream.call_args[0][:3], ('NAME', 'CHECK', self.env['execs']))
+
+    def test_exec_unknown_profile(self):
+        self.runtime.logs.return_value = FakeStream()
+        self.runtime.exec_stream.side_effect = RuntimeError('Exec name: MISSING not found')
+
+        with self.assertRaisesRegex(RuntimeError, 'MISSING'):
+            ready.Waiter(self.runtime, dict(self.env, ready={'exec': 'MISSING'})).wait('STARTED-AT', 5)
+
+    def test_port_and_log(self):
+        port = self.server(close=False)
+        self.env['create']['ports'][0]['hostPort'] = port
+        stream = FakeStream()
+        self.runtime.logs.return_value = stream
+        waiter = ready.Waiter(self.runtime, dict(self.env, ready={'port': 80, 'log': 'listening'}))
+        threading.Timer(0.1, stream.lines.put, args=('listening',)).start()
+
+        waiter.wait('STARTED-AT', 5)
+
+        self.assertEqual(waiter.pending, set())
+
+    def test_port_open(self):
+        self.assertTrue(ready.port_open('127.0.0.1', self.server(close=False)))
+        self.assertFalse(ready.port_open('127.0.0.1', self.server(close=True)))
+
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        listener.close()
+        self.assertFalse(ready.port_open('127.0.0.1', port))
+
+    def test_published_port(self):
+        self.assertEqual(ready.published_port(self.env, 80), ('127.0.0.1', 8080))
+        with self.assertRaisesRegex(RuntimeError, 'Port: 443 of environment: NAME is not published'):
+            ready.published_port(self.env, 443)
+
+    def test_no_checks(self):
+        ready.Waiter(self.runtime, self.env).wait('STARTED-AT', 5)
+
+        self.runtime.logs.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 from unittest.mock import Mock, patch
 import subprocess
-from snowglobe import runtime
+import io
+from datetime import datetime, timezone
+from snowglobe import runtime, config
 
 
 class TestRuntime(unittest.TestCase):
@@ -17,7 +19,7 @@ class TestRuntime(unittest.TestCase):
         pass
 
     def tearDown(self):
-        pass
+        runtime.BREAKER.success()
 
     @patch('snowglobe.runtime.subprocess.run')
     def test_inspect_json_decode_error(self, mocked_run):
@@ -31,7 +33,8 @@ class TestRuntime(unittest.TestCase):
         mocked_run.assert_called_with(['docker', 'container', 'inspect', 'NAME'],
                                       stdin=subprocess.PIPE,
                                       stdout=subprocess.PIPE,
-                                      stderr=subprocess.PIPE)
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
 
     @patch('snowglobe.runtime.subprocess.run')
     def test_inspect_container_not_found(self, mocked_run):
@@ -45,7 +48,8 @@ class TestRuntime(unittest.TestCase):
         mocked_run.assert_called_with(['docker', 'container', 'inspect', 'NAME'],
                                       stdin=subprocess.PIPE,
                                       stdout=subprocess.PIPE,
-                                      stderr=subprocess.PIPE)
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
 
     @patch('snowglobe.runtime.subprocess.run')
     def test_inspect(self, mocked_run):
@@ -58,9 +62,310 @@ class TestRuntime(unittest.TestCase):
         mocked_run.assert_called_with(['docker', 'container', 'inspect', 'NAME'],
                                       stdin=subprocess.PIPE,
                                       stdout=subprocess.PIPE,
-                                      stderr=subprocess.PIPE)
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
         self.assertEqual(res, {})
 
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_containers(self, mocked_run):
+        mocked_run_response = Mock()
+        mocked_run_response.returncode = 0
+        mocked_run_response.stdout.decode.return_value = (
+            'NAME-1\trunning\ttrue\tSPEC\n'
+            'NAME-2\texited\t\t\n'
+        )
+        mocked_run.return_value = mocked_run_response
+
+        res = runtime.Runtime.containers()
+
+        mocked_run.assert_called_with(['docker', 'container', 'ls', '--all', '--no-trunc', '--format',
+                                       runtime.CONTAINERS_FORMAT],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
+        self.assertEqual(res, {
+            'NAME-1': {'running': True, 'labels': {config.MANAGED_LABEL: 'true', config.SPEC_LABEL: 'SPEC'}},
+            'NAME-2': {'running': False, 'labels': {}},
+        })
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_states(self, mocked_run):
+        mocked_run.return_value.returncode = 1
+        mocked_run.return_value.stdout.decode.return_value = (
+            '/NAME-1\trunning\t2020-01-01T10:00:00Z\tsha256:ID\t{"80/tcp":null}\n'
+        )
+        mocked_run.return_value.stderr.decode.return_value = 'Error: No such container: NAME-2\n'
+
+        res = runtime.Runtime.states(['NAME-1', 'NAME-2'])
+
+        self.assertEqual(mocked_run.call_args[0][0][-2:], ['NAME-1', 'NAME-2'])
+        self.assertEqual(res, {'NAME-1': {'state': 'running', 'started_at': '2020-01-01T10:00:00Z',
+                                          'image': 'sha256:ID', 'ports': {'80/tcp': None}}})
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_states_error(self, mocked_run):
+        mocked_run.return_value.returncode = 1
+        mocked_run.return_value.stdout.decode.return_value = ''
+        mocked_run.return_value.stderr.decode.return_value = (
+            'Error: No such container: NAME-2\n'
+            'permission denied while trying to connect to the Docker daemon socket\n'
+        )
+
+        with self.assertRaisesRegex(RuntimeError, 'Containers can not be inspected: (?s:.*)permission denied'):
+            runtime.Runtime.states(['NAME-1', 'NAME-2'])
+
+    @patch('snowglobe.runtime.subprocess.run')
+    @patch('snowglobe.runtime.datetime')
+    def test_status(self, mocked_datetime, mocked_run):
+        mocked_datetime.now.return_value = datetime(2020, 1, 1, 10, 5, 30, tzinfo=timezone.utc)
+        mocked_datetime.strptime = datetime.strptime
+        mocked_run_response = Mock()
+        mocked_run_response.returncode = 0
+        mocked_run_response.stdout.decode.return_value = (
+            '/NAME-1\trunning\t2020-01-01T10:00:00.123456789Z\tsha256:ID\t'
+            '{"80/tcp":[{"HostIp":"0.0.0.0","HostPort":"8080"}],"443/tcp":null}\n'
+            '/NAME-2\texited\t2020-01-01T09:00:00Z\tsha256:ID\t{}\n'
+        )
+        mocked_run.return_value = mocked_run_response
+
+        res = runtime.Runtime.status(['NAME-1', 'NAME-2', 'NAME-3'])
+
+        mocked_run.assert_called_with(['docker', 'container', 'inspect', '--format', runtime.STATUS_FORMAT,
+                                       'NAME-1', 'NAME-2', 'NAME-3'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
+        self.assertEqual(res, {
+            'NAME-1': {'state': 'running', 'uptime': '5 minutes', 'image': 'sha256:ID',
+                       'ports': '0.0.0.0:8080->80/tcp, 443/tcp'},
+            'NAME-2': {'state': 'exited', 'uptime': '', 'image': 'sha256:ID', 'ports': ''},
+        })
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_create_labels(self, mocked_run):
+        runtime.Runtime.create('NAME', 'IMAGE', {'command': []}, spec='SPEC', labels={config.POOL_LABEL: 'ENV'})
+
+        cmd = mocked_run.call_args[0][0]
+        self.assertIn(f'{config.SPEC_LABEL}=SPEC', cmd)
+        self.assertIn(f'{config.POOL_LABEL}=ENV', cmd)
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_rename(self, mocked_run):
+        mocked_run.return_value.returncode = 0
+
+        runtime.Runtime.rename('NAME-spare-1', 'NAME')
+
+        mocked_run.assert_called_with(['docker', 'container', 'rename', 'NAME-spare-1', 'NAME'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_commit(self, mocked_run):
+        mocked_run.return_value.returncode = 0
+
+        runtime.Runtime.commit('NAME', 'snowglobe/name:TAG', 'ENV')
+
+        mocked_run.assert_called_with(['docker', 'container', 'commit', '--change',
+                                       f'LABEL {config.SNAPSHOT_LABEL}=ENV', 'NAME', 'snowglobe/name:TAG'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=600)
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_commit_error(self, mocked_run):
+        mocked_run.return_value.returncode = 1
+        mocked_run.return_value.stderr = b'Error response from daemon: No such container: NAME\n'
+
+        with self.assertRaises(RuntimeError):
+            runtime.Runtime.commit('NAME', 'snowglobe/name:TAG', 'ENV')
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_snapshots(self, mocked_run):
+        mocked_run.return_value.returncode = 0
+        mocked_run.return_value.stdout = b'snowglobe/name:TAG\t2020-01-01 10:00:00 +0000 UTC\t1.2GB\n'
+
+        res = runtime.Runtime.snapshots('ENV')
+
+        mocked_run.assert_called_with(['docker', 'image', 'ls', '--filter', f'label={config.SNAPSHOT_LABEL}=ENV',
+                                       '--format', runtime.SNAPSHOTS_FORMAT],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
+        self.assertEqual(res, [{'image': 'snowglobe/name:TAG', 'created': '2020-01-01 10:00:00', 'size': '1.2GB'}])
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_remove_image(self, mocked_run):
+        mocked_run.return_value.returncode = 0
+
+        runtime.Runtime.remove_image('snowglobe/name:TAG')
+
+        mocked_run.assert_called_with(['docker', 'image', 'rm', 'snowglobe/name:TAG'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_has_image(self, mocked_run):
+        mocked_run.return_value.returncode = 1
+
+        res = runtime.Runtime.has_image('IMAGE')
+
+        self.assertFalse(res)
+        mocked_run.assert_called_with(['docker', 'image', 'inspect', '--format', '{{.Id}}', 'IMAGE'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_image_labels(self, mocked_run):
+        mocked_run.return_value.returncode = 0
+        mocked_run.return_value.stdout = b'{"snowglobe.build-hash":"HASH"}\n'
+
+        res = runtime.Runtime.image_labels('IMAGE')
+
+        self.assertEqual(res, {'snowglobe.build-hash': 'HASH'})
+        mocked_run.assert_called_with(['docker', 'image', 'inspect', '--format', '{{json .Config.Labels}}', 'IMAGE'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=30)
+
+        mocked_run.return_value.stdout = b'null\n'
+        self.assertEqual(runtime.Runtime.image_labels('IMAGE'), {})
+        mocked_run.return_value.returncode = 1
+        self.assertIsNone(runtime.Runtime.image_labels('IMAGE'))
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_build(self, mocked_run):
+        mocked_run.return_value.returncode = 0
+
+        runtime.Runtime.build('IMAGE', '/CONTEXT', '/CONTEXT/Dockerfile.dev', {'VERSION': '1'},
+                              {'snowglobe.build-hash': 'HASH'})
+
+        mocked_run.assert_called_with(['docker', 'image', 'build', '--quiet', '--tag', 'IMAGE',
+                                       '--file', '/CONTEXT/Dockerfile.dev', '--build-arg', 'VERSION=1',
+                                       '--label', 'snowglobe.build-hash=HASH', '/CONTEXT'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=1800)
+
+        mocked_run.return_value.returncode = 1
+        mocked_run.return_value.stderr = b'failed to solve'
+        with self.assertRaisesRegex(RuntimeError, 'can not be built: failed to solve'):
+            runtime.Runtime.build('IMAGE', '/CONTEXT')
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_pull(self, mocked_run):
+        mocked_run.return_value.returncode = 0
+
+        runtime.Runtime.pull('IMAGE')
+
+        mocked_run.assert_called_with(['docker', 'image', 'pull', '--quiet', 'IMAGE'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      timeout=1800)
+
+        mocked_run.return_value.returncode = 1
+        mocked_run.return_value.stderr = b'manifest unknown'
+        with self.assertRaisesRegex(RuntimeError, 'manifest unknown'):
+            runtime.Runtime.pull('IMAGE')
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_timeout(self, mocked_run):
+        mocked_run.side_effect = subprocess.TimeoutExpired(['docker'], 600)
+
+        with self.assertRaises(runtime.DockerTimeout) as context:
+            runtime.Runtime.create('NAME', 'IMAGE', {'command': []})
+
+        self.assertNotIsInstance(context.exception, runtime.RetriesExhausted)
+        self.assertEqual(mocked_run.call_count, 1)
+
+    @patch('snowglobe.runtime.time.sleep')
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_retry(self, mocked_run, mocked_sleep):
+        response = Mock(returncode=0, stdout=b'[{"Name": "/NAME"}]')
+        mocked_run.side_effect = [subprocess.TimeoutExpired(['docker'], 30), response]
+
+        res = runtime.Runtime.inspect('NAME')
+
+        self.assertEqual(res, {'Name': '/NAME'})
+        self.assertEqual(mocked_run.call_count, 2)
+        mocked_sleep.assert_called_once()
+        self.assertEqual(runtime.BREAKER.failures, 0)
+
+    @patch('snowglobe.runtime.time.sleep', Mock())
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_retries_exhausted_open_breaker(self, mocked_run):
+        mocked_run.side_effect = subprocess.TimeoutExpired(['docker'], 30)
+
+        with self.assertRaises(runtime.RetriesExhausted):
+            runtime.Runtime.remove('NAME')
+        with self.assertRaises(runtime.DockerUnavailable):
+            runtime.Runtime.stop('NAME')
+
+        self.assertEqual(mocked_run.call_count, runtime.RETRIES + 1)
+
+    @patch('snowglobe.runtime.time.monotonic')
+    def test_circuit_breaker(self, mocked_monotonic):
+        breaker = runtime.CircuitBreaker(threshold=2, cooldown=30)
+        mocked_monotonic.return_value = 100
+
+        breaker.failure()
+        breaker.check()
+        breaker.failure()
+        with self.assertRaises(runtime.DockerUnavailable):
+            breaker.check()
+
+        mocked_monotonic.return_value = 131
+        breaker.check()
+        breaker.success()
+
+        self.assertIsNone(breaker.opened)
+        self.assertEqual(breaker.failures, 0)
+
+    @patch.dict('snowglobe.runtime.os.environ', {'SNOWGLOBE_TIMEOUTS': 'inspect=5, default=60,INVALID'})
+    def test_deadline(self):
+        self.assertEqual(runtime.deadline('inspect'), 5)
+        self.assertEqual(runtime.deadline('rm'), 60)
+        self.assertEqual(runtime.deadline('create'), 600)
+        self.assertEqual(runtime.deadline('stop', runtime.stop_grace(None)), 70)
+
+    def test_backoff(self):
+        self.assertLessEqual(runtime.backoff(0), runtime.RETRY_DELAY)
+        for attempt in range(10):
+            self.assertLessEqual(runtime.backoff(attempt), runtime.RETRY_MAX_DELAY)
+
+    def test_human_size(self):
+        self.assertEqual(runtime.human_size(512), '512B')
+        self.assertEqual(runtime.human_size(7800000), '7.8MB')
+        self.assertEqual(runtime.human_size(1234567890), '1.235GB')
+
+    def test_parse_size(self):
+        self.assertEqual(runtime.parse_size('512B'), 512)
+        self.assertEqual(runtime.parse_size('1.5KiB'), 1536)
+        self.assertEqual(runtime.parse_size(' 7.8MB'), 7800000)
+        with self.assertRaises(ValueError):
+            runtime.parse_size('12XB')
+
+    def test_human_duration(self):
+        self.assertEqual(runtime.human_duration(0.5), 'Less than a second')
+        self.assertEqual(runtime.human_duration(59), '59 seconds')
+        self.assertEqual(runtime.human_duration(90), 'About a minute')
+        self.assertEqual(runtime.human_duration(3000), '50 minutes')
+        self.assertEqual(runtime.human_duration(3600), 'About an hour')
+        self.assertEqual(runtime.human_duration(5 * 3600), '5 hours')
+        self.assertEqual(runtime.human_duration(3 * 24 * 3600), '3 days')
+
     @patch('snowglobe.runtime.subprocess.run')
     def test_create(self, mocked_run):
 
@@ -92,14 +397,18 @@ class TestRuntime(unittest.TestCase):
             'options': '-it --hostname HOSTNAME',
         }
 
-        runtime.Runtime.create('NAME', 'IMAGE', create)
+        runtime.Runtime.create('NAME', 'IMAGE', create, store='STORE')
 
         mocked_run.assert_called_with(['docker', 'container', 'create', '--entrypoint', 'ENTRYPOINT', '-e',
                                        'KEY=VALUE', '-p', '8080:8080/tcp', '-p', '120.0.0.1:80:80/udp', '-v',
-                                       '/PATH/ON/HOST:/PATH/ON/CONTAINER:rw', '-it', '--hostname', 'HOSTNAME',
-                                       '--name', 'NAME', 'IMAGE'],
+                                       '/PATH/ON/HOST:/PATH/ON/CONTAINER:rw', '--label',
+                                       f'{config.MANAGED_LABEL}=true', '--label',
+                                       f'{config.SPEC_LABEL}={config.spec_hash("IMAGE", create)}', '--label',
+                                       f'{config.STORE_LABEL}=STORE', '-it',
+                                       '--hostname', 'HOSTNAME', '--name', 'NAME', 'IMAGE'],
                                       stdin=subprocess.PIPE,
-                                      stdout=subprocess.PIPE)
+                                      stdout=subprocess.PIPE,
+                                      timeout=600)
 
     @patch('snowglobe.runtime.subprocess.run')
     def test_start(self, mocked_run):
@@ -107,6 +416,12 @@ class TestRuntime(unittest.TestCase):
         runtime.Runtime.start('NAME', '-i')
         mocked_run.assert_called_with(['docker', 'container', 'start', '-i', 'NAME'])
 
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_start_detached(self, mocked_run):
+        runtime.Runtime.start('NAME', '')
+
+        mocked_run.assert_called_with(['docker', 'container', 'start', 'NAME'], timeout=120)
+
     def test_exec_exec_name_not_found(self):
         with self.assertRaises(RuntimeError):
             runtime.Runtime.exec('NAME', 'EXEC-NAME', [])
@@ -122,13 +437,122 @@ class TestRuntime(unittest.TestCase):
         ])
         mocked_run.assert_called_with(['docker', 'container', 'exec', '-it', 'NAME', 'EXEC_COMMAND'])
 
+    @patch('snowglobe.runtime.os.execvp')
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_exec_replace_interactive(self, mocked_run, mocked_execvp):
+        runtime.Runtime.exec('NAME', 'EXEC-NAME', [
+            {
+                'name': 'EXEC-NAME',
+                'command': 'EXEC_COMMAND',
+                'options': '-it',
+            }
+        ], replace=True)
+
+        mocked_execvp.assert_called_with('docker', ['docker', 'container', 'exec', '-it', 'NAME', 'EXEC_COMMAND'])
+        mocked_run.assert_not_called()
+
+    @patch('snowglobe.runtime.os.execvp')
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_exec_replace_not_interactive(self, mocked_run, mocked_execvp):
+        runtime.Runtime.exec('NAME', 'EXEC-NAME', [
+            {
+                'name': 'EXEC-NAME',
+                'command': 'EXEC_COMMAND',
+                'options': '-d',
+            }
+        ], replace=True)
+
+        mocked_execvp.assert_not_called()
+        mocked_run.assert_called_with(['docker', 'container', 'exec', '-d', 'NAME', 'EXEC_COMMAND'])
+
+    @patch('snowglobe.runtime.os.execvp')
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_start_replace_attached(self, mocked_run, mocked_execvp):
+        runtime.Runtime.start('NAME', '-ai', replace=True)
+
+        mocked_execvp.assert_called_with('docker', ['docker', 'container', 'start', '-ai', 'NAME'])
+
+    def test_attaches(self):
+        self.assertTrue(runtime.attaches(['-it']))
+        self.assertTrue(runtime.attaches(['--interactive', '--tty']))
+        self.assertTrue(runtime.attaches(['-a']))
+        self.assertFalse(runtime.attaches(['-t']))
+        self.assertFalse(runtime.attaches(['-dit']))
+        self.assertFalse(runtime.attaches(['--interactive=false']))
+        self.assertFalse(runtime.attaches(['-u', 'root']))
+
+    def test_without_terminal(self):
+        self.assertEqual(runtime.without_terminal(['-it', '-u', 'root']), ['-u', 'root'])
+        self.assertEqual(runtime.without_terminal(['--interactive', '--tty=true', '-w', '/']), ['-w', '/'])
+        self.assertEqual(runtime.without_terminal(['-dit']), ['-d'])
+
+    @patch('snowglobe.runtime.subprocess.Popen')
+    def test_exec_stream(self, mocked_popen):
+        process = mocked_popen.return_value
+        process.stdout = io.BytesIO(b'LINE-1\nLINE-2')
+        process.wait.return_value = 3
+        lines = []
+
+        res = runtime.Runtime.exec_stream('NAME', 'EXEC-NAME', [{'name': 'EXEC-NAME', 'command': 'COMMAND ARG',
+                                                                   'options': '-it -u root'}], lines.append)
+
+        mocked_popen.assert_called_with(['docker', 'container', 'exec', '-u', 'root', 'NAME', 'COMMAND', 'ARG'],
+                                        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(lines, ['LINE-1', 'LINE-2'])
+        self.assertEqual(res, 3)
+
+    @patch('snowglobe.runtime.subprocess.Popen')
+    def test_logs(self, mocked_popen):
+        process = mocked_popen.return_value
+        process.stdout = io.BytesIO(b'LINE-1\nLINE-2\n')
+        process.poll.return_value = None
+
+        with runtime.Runtime.logs('NAME', '2020-01-01T00:00:00Z') as stream:
+            res = list(stream)
+
+        mocked_popen.assert_called_with(['docker', 'container', 'logs', '--follow', '--since', '2020-01-01T00:00:00Z',
+                                         'NAME'], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT)
+        self.assertEqual(res, ['LINE-1', 'LINE-2'])
+        process.kill.assert_called_once_with()
+        process.wait.assert_called_once_with()
+
+    @patch('snowglobe.runtime.subprocess.Popen')
+    def test_health_events(self, mocked_popen):
+        process = mocked_popen.return_value
+        process.stdout = io.BytesIO(b'{"Action": "health_status: healthy"}\n')
+        process.poll.return_value = None
+
+        with runtime.Runtime.health_events('NAME', '1577836800.000') as stream:
+            res = list(stream)
+
+        mocked_popen.assert_called_with(['docker', 'events', '--format', '{{json .}}', '--since', '1577836800.000',
+                                         '--filter', 'type=container', '--filter', 'container=NAME', '--filter',
+                                         'event=health_status', '--filter', 'event=die'], stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(res, ['{"Action": "health_status: healthy"}'])
+
+    def test_exec_stream_unknown_profile(self):
+        with self.assertRaises(RuntimeError):
+            runtime.Runtime.exec_stream('NAME', 'EXEC-NAME', [], print)
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_restart(self, mocked_run):
+        runtime.Runtime.restart('NAME')
+
+        mocked_run.assert_called_with(['docker', 'container', 'restart', 'NAME'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      timeout=40)
+
     @patch('snowglobe.runtime.subprocess.run')
     def test_stop(self, mocked_run):
         runtime.Runtime.stop('NAME')
 
         mocked_run.assert_called_with(['docker', 'container', 'stop', 'NAME'],
                                       stdin=subprocess.PIPE,
-                                      stdout=subprocess.PIPE)
+                                      stdout=subprocess.PIPE,
+                                      timeout=40)
 
     @patch('snowglobe.runtime.subprocess.run')
     def test_remove(self, mocked_run):
@@ -136,7 +560,61 @@ class TestRuntime(unittest.TestCase):
 
         mocked_run.assert_called_with(['docker', 'container', 'rm', 'NAME'],
                                       stdin=subprocess.PIPE,
-                                      stdout=subprocess.PIPE)
+                                      stdout=subprocess.PIPE,
+                                      timeout=30)
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_stop_settings(self, mocked_run):
+        runtime.Runtime.stop('NAME', timeout=2, signal='SIGKILL')
+
+        mocked_run.assert_called_with(['docker', 'container', 'stop', '--time', '2', '--signal', 'SIGKILL', 'NAME'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      timeout=32)
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_remove_force(self, mocked_run):
+        runtime.Runtime.remove('NAME', force=True)
+
+        mocked_run.assert_called_with(['docker', 'container', 'rm', '--force', 'NAME'],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      timeout=30)
+
+    @patch('snowglobe.runtime.subprocess.Popen')
+    def test_events(self, mocked_popen):
+        mocked_popen.return_value.stdout = [b'{"Type": "container", "Action": "start"}\n']
+
+        res = list(runtime.Runtime.events())
+
+        mocked_popen.assert_called_with(['docker', 'events', '--format', '{{json .}}', '--filter', 'type=container'],
+                                        stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE)
+        mocked_popen.return_value.kill.assert_called_with()
+        self.assertEqual(res, [{'Type': 'container', 'Action': 'start'}])
+
+    @patch('snowglobe.runtime.subprocess.Popen')
+    def test_stats(self, mocked_popen):
+        mocked_popen.return_value.stdout = [
+            b'\x1b[H\x1b[JNAME-1\t1.50%\t12.5MiB / 1GiB\x1b[K\n',
+            b'NAME-2\t--\t-- / --\x1b[K\n',
+            b'\x1b[H\x1b[JNAME-1\t2.50%\t10MiB / 1GiB\x1b[K\n',
+        ]
+
+        res = list(runtime.Runtime.stats())
+
+        mocked_popen.assert_called_with(['docker', 'stats', '--format', runtime.STATS_FORMAT],
+                                        stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE)
+        mocked_popen.return_value.kill.assert_called_with()
+        self.assertEqual(res, [
+            {'NAME-1': {'cpu': 1.5, 'memory': 13107200, 'limit': 1073741824}},
+            {'NAME-1': {'cpu': 2.5, 'memory': 10485760, 'limit': 1073741824}},
+        ])
+
+    def test_get_runtime(self):
+        self.assertIsInstance(runtime.get_runtime('cli'), runtime.Runtime)
+        self.assertEqual(runtime.get_runtime('api').__class__.__name__, 'ApiRuntime')
 
 
 if __name__ == '__main__':
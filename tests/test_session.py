@@ -0,0 +1,155 @@
+import unittest
+from unittest.mock import Mock, patch
+import tempfile
+import shutil
+import time
+from os import path
+from snowglobe import session
+
+
+class TestAgent(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.agent = session.Agent(['sh', '-c', session.AGENT])
+
+    def tearDown(self):
+        self.agent.close()
+
+    def test_run(self):
+        res = self.agent.run(['echo', 'HELLO WORLD'])
+
+        self.assertEqual(res, {'code': 0, 'stdout': 'HELLO WORLD\n', 'stderr': ''})
+
+    def test_run_exit_code_and_stderr(self):
+        res = self.agent.run(['sh', '-c', 'echo OUT; echo ERR >&2; exit 3'])
+
+        self.assertEqual(res, {'code': 3, 'stdout': 'OUT\n', 'stderr': 'ERR\n'})
+
+    def test_run_quotes_arguments(self):
+        res = self.agent.run(['echo', '$HOME; exit 1'])
+
+        self.assertEqual(res, {'code': 0, 'stdout': '$HOME; exit 1\n', 'stderr': ''})
+
+    def test_run_keeps_agent_alive(self):
+        self.agent.run(['sh', '-c', 'exit 1'])
+        self.agent.run(['cd', '/'])
+        res = self.agent.run(['true'])
+
+        self.assertEqual(res['code'], 0)
+        self.assertIsNone(self.agent.process.poll())
+
+    def test_run_exited_agent(self):
+        self.agent.close()
+        self.agent = session.Agent(['true'])
+        self.agent.process.wait()
+
+        with self.assertRaises((RuntimeError, OSError)):
+            self.agent.run(['true'])
+
+
+class TestBroker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.broker = session.Broker('NAME', idle_timeout=60)
+
+    def tearDown(self):
+        pass
+
+    @patch('snowglobe.session.Agent')
+    def test_answer_reuses_agent(self, mocked_agent):
+        mocked_agent.return_value.run.return_value = {'code': 0, 'stdout': '', 'stderr': ''}
+
+        self.broker.answer({'options': ['-u', 'root'], 'command': ['true']})
+        res = self.broker.answer({'options': ['-u', 'root'], 'command': ['true']})
+
+        self.assertEqual(res, {'code': 0, 'stdout': '', 'stderr': ''})
+        mocked_agent.assert_called_once_with(['docker', 'container', 'exec', '-i', '-u', 'root', 'NAME', 'sh', '-c',
+                                              session.AGENT])
+
+    @patch('snowglobe.session.Agent')
+    def test_answer_drops_failed_agent(self, mocked_agent):
+        mocked_agent.return_value.run.side_effect = RuntimeError('Session agent exited')
+
+        res = self.broker.answer({'options': [], 'command': ['true']})
+
+        self.assertEqual(res, {'error': 'Session agent exited'})
+        mocked_agent.return_value.close.assert_called_once()
+        self.assertEqual(self.broker.agents, {})
+
+    def test_idle(self):
+        self.assertFalse(self.broker.idle())
+
+        self.broker.last_request = time.monotonic() - 120
+
+        self.assertTrue(self.broker.idle())
+
+        self.broker.active = 1
+
+        self.assertFalse(self.broker.idle())
+
+
+class TestExecute(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_query_without_broker(self):
+        with patch.dict('os.environ', {'SNOWGLOBE_SOCKET': path.join(self.temp_dir, 'snowglobe.sock')}):
+            res = session.query('NAME', [], ['true'])
+
+        self.assertIsNone(res)
+
+    @patch('snowglobe.session.query')
+    def test_execute_attaching_options(self, mocked_query):
+        res = session.execute('NAME', ['-it'], ['sh'])
+
+        self.assertIsNone(res)
+        mocked_query.assert_not_called()
+
+    @patch('snowglobe.session.subprocess.Popen')
+    @patch('snowglobe.session.query')
+    def test_execute(self, mocked_query, mocked_popen):
+        mocked_query.return_value = {'code': 2, 'stdout': '', 'stderr': ''}
+
+        res = session.execute('NAME', ['-u', 'root'], ['true'])
+
+        self.assertEqual(res, 2)
+        mocked_query.assert_called_once_with('NAME', ['-u', 'root'], ['true'])
+        mocked_popen.assert_not_called()
+
+    @patch('snowglobe.session.START_TIMEOUT', 0.05)
+    @patch('snowglobe.session.subprocess.Popen')
+    @patch('snowglobe.session.query', Mock(return_value=None))
+    def test_execute_broker_not_starting(self, mocked_popen):
+        res = session.execute('NAME', [], ['true'])
+
+        self.assertIsNone(res)
+        self.assertEqual(mocked_popen.call_args[0][0][-4:], ['session', 'NAME', '--idle-timeout', '600'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import subprocess
+import sys
+import os
+from os import path
+
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Budget in microseconds for the imports of a cold snowglobe command, on top of the bare interpreter start up.
+IMPORT_BUDGET = 50000
+
+# Modules that cheap commands must not import.
+DEFERRED_MODULES = ['cerberus', 'subprocess', 'http.client', 'concurrent.futures', 'sqlite3', 'snowglobe.runtime',
+                    'snowglobe.api', 'snowglobe.sqlite_store']
+
+
+def import_times(args: list) -> dict:
+    """
+    Runs python with -X importtime and returns the self import time of every module.
+    :param args: Python arguments.
+    :return: Import time in microseconds for each module.
+    """
+    cmd = [sys.executable, '-X', 'importtime'] + args
+    # Byte code has to be cached for the runs to measure a normal start up.
+    env = {key: value for key, value in os.environ.items() if key != 'PYTHONDONTWRITEBYTECODE'}
+    response = subprocess.run(cmd, cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE)
+    times = {}
+    for line in response.stderr.decode().splitlines():
+        fields = line[len('import time:'):].split('|')
+        if line.startswith('import time:') and fields[0].strip().isdigit():
+            times[fields[2].strip()] = int(fields[0])
+    return times
+
+
+class TestStartup(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.baseline = import_times(['-c', 'pass'])
+
+    def assert_cold_start(self, args):
+        # The first run compiles the byte code, which is not part of a normal start up.
+        import_times(['-m', 'snowglobe'] + args)
+        times = import_times(['-m', 'snowglobe'] + args)
+        imported = {module: time for module, time in times.items() if module not in self.baseline}
+
+        self.assertIn('snowglobe.environment', imported)
+        for module in DEFERRED_MODULES:
+            self.assertNotIn(module, imported)
+        self.assertLess(sum(imported.values()), IMPORT_BUDGET,
+                        f'Slowest imports: {sorted(imported.items(), key=lambda item: -item[1])[:5]}')
+
+    def test_list_cold_start(self):
+        self.assert_cold_start(['list'])
+
+    def test_template_cold_start(self):
+        self.assert_cold_start(['template'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import shutil
+import json
+from os import path
+from snowglobe import trace, runtime
+
+
+class TestTrace(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        patcher = patch('snowglobe.trace.EVENTS', None)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_span_when_off(self):
+        with trace.span('NAME', 'CATEGORY', KEY='VALUE') as span:
+            span.set(RESULT='VALUE')
+
+        self.assertIs(span, trace.NULL_SPAN)
+        self.assertIsNone(trace.EVENTS)
+
+    def test_span(self):
+        trace.start()
+
+        with trace.span('NAME', 'CATEGORY', KEY='VALUE') as span:
+            span.set(RESULT='VALUE')
+
+        event, = trace.EVENTS
+        self.assertEqual((event['name'], event['cat'], event['ph']), ('NAME', 'CATEGORY', 'X'))
+        self.assertEqual(event['args'], {'KEY': 'VALUE', 'RESULT': 'VALUE'})
+        self.assertGreaterEqual(event['dur'], 0)
+
+    def test_span_error(self):
+        trace.start()
+
+        with self.assertRaises(RuntimeError):
+            with trace.span('NAME', 'CATEGORY'):
+                raise RuntimeError('ERROR')
+
+        self.assertEqual(trace.EVENTS[0]['args'], {'error': 'ERROR'})
+
+    def test_traced(self):
+        @trace.traced('CATEGORY')
+        def function(value):
+            return value
+
+        self.assertEqual(function('VALUE'), 'VALUE')
+        trace.start()
+        self.assertEqual(function('VALUE'), 'VALUE')
+
+        self.assertEqual([event['name'] for event in trace.EVENTS], ['TestTrace.test_traced.<locals>.function'])
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_runtime_call(self, mocked_run):
+        mocked_run.return_value.returncode = 1
+        trace.start()
+
+        runtime.Runtime.stop('NAME')
+
+        event, = trace.EVENTS
+        self.assertEqual(event['name'], 'docker container stop')
+        self.assertEqual(event['args'], {'argv': ['docker', 'container', 'stop', 'NAME'], 'exit_code': 1})
+
+    @patch('snowglobe.runtime.subprocess.run')
+    def test_save(self, mocked_run):
+        mocked_run.return_value.returncode = 0
+        trace_path = path.join(self.directory, 'trace.json')
+        trace.start()
+        runtime.Runtime.remove('NAME')
+
+        trace.save(trace_path, 'snowglobe delete')
+
+        with open(trace_path, 'r') as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual([event['name'] for event in events], ['snowglobe delete', 'docker container rm'])
+        self.assertGreaterEqual(events[0]['dur'], events[1]['dur'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import copy
+from cerberus import Validator
+from snowglobe import validator, config
+
+
+def make_document(**changes):
+    document = copy.deepcopy(config.TEMPLATE)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(document.get(key), dict):
+            document[key].update(value)
+        else:
+            document[key] = value
+    return document
+
+
+DOCUMENTS = [
+    make_document(),
+    {},
+    make_document(image=1, start=None, extra='EXTRA'),
+    make_document(create={'command': [1, 'COMMAND'], 'bogus': True, 'volumes': 'VOLUMES'}),
+    make_document(create={'ports': [{'hostPort': 'PORT'}, 'PORT', {'hostPort': True, 'containerPort': 1.0,
+                                                                   'protocol': 'icmp', 'extra': 1}]}),
+    make_document(create={'envs': {'KEY': 1, 'OTHER': None}, 'entrypoint': None}),
+    make_document(create={'volumes': [{'hostPath': '/HOST', 'containerPath': '/CONTAINER', 'mode': 'wo'}]}),
+    make_document(create=5, execs='EXECS'),
+    make_document(execs=[{}, {'name': 'NAME', 'command': 'COMMAND', 'options': 1}, None]),
+    make_document(depends_on=[{'name': 'DB', 'condition': 5}, {'condition': 'healthy', 'timeout': '1'}]),
+    make_document(depends_on=('DB',)),
+    make_document(create={'command': ('COMMAND',)}),
+    make_document(pool=-1),
+    make_document(pool='1'),
+]
+
+
+class TestValidator(unittest.TestCase):
+    def test_same_errors_as_cerberus(self):
+        for document in DOCUMENTS:
+            cerberus_validator = Validator(config.SCHEMA)
+            cerberus_validator.validate(document)
+
+            res = validator.validate(config.SCHEMA, document)
+
+            self.assertEqual(str(res), str(cerberus_validator.errors))
+
+    def test_valid_document(self):
+        res = validator.validate(config.SCHEMA, make_document())
+
+        self.assertEqual(res, {})
+
+    def test_not_a_document(self):
+        res = validator.validate(config.SCHEMA, [])
+
+        self.assertEqual(res, {'document': ['must be of dict type']})
+
+    def test_nullable(self):
+        res = validator.validate({'KEY': {'type': 'string', 'nullable': True}}, {'KEY': None})
+
+        self.assertEqual(res, {})
+
+    def test_schema_compiled_once(self):
+        schema = {'KEY': {'type': 'string'}}
+
+        validator.validate(schema, {'KEY': 'VALUE'})
+        check = validator.COMPILED[id(schema)][1]
+        validator.validate(schema, {'KEY': 'VALUE'})
+
+        self.assertIs(validator.COMPILED[id(schema)][1], check)
+
+    def test_unsupported_rule(self):
+        with self.assertRaises(RuntimeError):
+            validator.validate({'KEY': {'type': 'string', 'regex': '.*'}}, {})
+
+
+if __name__ == '__main__':
+    unittest.main()